@@ -1,56 +1,279 @@
+import asyncio
 import configparser
 import json
 import random
 import re
+import sqlite3
+import threading
 import time
-from pathlib import Path
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from re import sub
 
 import httpx
+import openai
 import requests
+from requests.adapters import HTTPAdapter
 from openai import OpenAI
 from urllib3 import disable_warnings, exceptions
 
 from api.answer_check import *
+from api.cache import CacheDAO
+from api.fuzzy_index import DEFAULT_INDEX_FILE, FuzzyIndex
 from api.logger import logger
+from api.question_key import KEY_VERSION, make_cache_key, parse_cache_key
 
 # 关闭警告
 disable_warnings(exceptions.InsecureRequestWarning)
 
-class CacheDAO:
+
+class RateLimiter:
     """
-    @Author: SocialSisterYi
-    @Reference: https://github.com/SocialSisterYi/xuexiaoyi-to-xuexitong-tampermonkey-proxy
+    题库请求限流器(令牌桶), 每秒补充rate个令牌, 最多积累burst个, 每次请求消耗一个令牌
+
+    令牌不足时预约之后补充的令牌并在锁外等待, 多个线程或协程共用时按请求顺序依次放行。
+    指定path时令牌桶状态保存在SQLite文件中, 同一台机器上使用同一文件的多个进程共用一份配额。
+
+    Args:
+        rate: 每秒补充的令牌数, 0表示不限制
+        burst: 令牌桶容量, 即空闲后允许连续发出的请求数
+        path: 多进程共用时的SQLite文件路径, 为空则只在当前进程内限流
+        name: 共用文件中区分不同题库的名称
     """
-    DEFAULT_CACHE_FILE = "cache.json"
 
-    def __init__(self, file: str = DEFAULT_CACHE_FILE):
-        self.cache_file = Path(file)
-        if not self.cache_file.is_file():
-            self._write_cache({})
+    def __init__(self, rate: float = 0.0, burst: int = 1, path: str = None, name: str = "default"):
+        self.rate = rate
+        self.burst = max(int(burst), 1)
+        self.path = path
+        self.name = name
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = None
 
-    def _read_cache(self) -> dict:
-        try:
-            with self.cache_file.open("r", encoding="utf8") as fp:
-                return json.load(fp)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+    @classmethod
+    def from_interval(cls, interval: float, **kwargs) -> "RateLimiter":
+        """按旧版的请求间隔(秒)创建, 相邻两次请求的间隔不小于interval且不允许突发"""
+        return cls(1 / interval if interval > 0 else 0.0, 1, **kwargs)
 
-    def _write_cache(self, data: dict) -> None:
+    def _take(self, tokens: float, updated: float, now: float):
+        """补充令牌后取出一个, 返回剩余令牌数与需要等待的时间"""
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate) - 1
+        return tokens, (-tokens / self.rate if tokens < 0 else 0.0)
+
+    def _reserve(self) -> float:
+        """预约一个令牌, 返回需要等待的时间(秒)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            if not self.path:
+                now = time.monotonic()
+                self._tokens, wait = self._take(self._tokens, self._updated, now)
+                self._updated = now
+                return wait
+            return self._reserve_shared()
+
+    def _reserve_shared(self) -> float:
+        # 进程之间使用SQLite的写锁互斥, 时间使用各进程一致的系统时间
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit "
+                "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        self._conn.execute("BEGIN IMMEDIATE")
         try:
-            with self.cache_file.open("w", encoding="utf8") as fp:
-                json.dump(data, fp, ensure_ascii=False, indent=4)
-        except IOError as e:
-            logger.error(f"Failed to write cache: {e}")
+            now = time.time()
+            row = self._conn.execute(
+                "SELECT tokens, updated FROM rate_limit WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens, wait = self._take(*(row or (self.burst, now)), now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rate_limit (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self):
+        """取得一个令牌, 令牌不足时阻塞等待"""
+        wait = self._reserve()
+        if wait > 0:
+            logger.debug(f"题库请求频率受限, 等待 {wait:.2f} 秒")
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire的协程版本, 等待期间不阻塞事件循环"""
+        wait = await asyncio.to_thread(self._reserve) if self.path else self._reserve()
+        if wait > 0:
+            logger.debug(f"题库请求频率受限, 等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    请求题库接口时的异常是否说明接口故障
+
+    超时、连接错误与5xx响应计为故障; 响应无法解析等其他异常视为未查到答案
+    """
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError))
+
+
+class ProviderHealth:
+    """
+    题库接口健康状态, 包括熔断器与最近请求的耗时/错误统计
 
-    def get_cache(self, question: str):
-        data = self._read_cache()
-        return data.get(question)
+    连续失败failure_threshold次后熔断, 熔断期间不再请求该题库; recovery_time秒后进入半开状态,
+    放行一次探测请求, 成功则恢复, 失败则继续熔断。
+    请求超时、连接错误与5xx响应计为失败(见is_provider_failure), 题库未查到答案或响应无法解析不计为失败。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    WINDOW = 100  # 统计最近的请求数
+
+    def __init__(self, name: str = "", failure_threshold: int = 5, recovery_time: float = 60.0):
+        self.name = name
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.recovery_time = recovery_time
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        # (耗时, 是否成功)
+        self._samples = deque(maxlen=self.WINDOW)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否可以发出请求, 半开状态下只放行一个探测请求"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_time:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    @property
+    def available(self) -> bool:
+        """是否未处于熔断状态, 不占用半开状态的探测机会"""
+        with self._lock:
+            return self.state != self.OPEN or time.monotonic() - self._opened_at >= self.recovery_time
+
+    def record(self, latency: float, success: bool):
+        with self._lock:
+            self._samples.append((latency, success))
+            self._total += 1
+            if success:
+                if self.state != self.CLOSED:
+                    logger.info(f"{self.name}已恢复")
+                self.state = self.CLOSED
+                self._failures = 0
+                self._probing = False
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"{self.name}连续{self._failures}次请求失败, 暂停使用{self.recovery_time:.0f}秒")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def latency(self, percentile: float = 0.5):
+        """最近成功请求耗时的百分位数(秒), 没有成功请求时返回None"""
+        with self._lock:
+            latencies = sorted(latency for latency, success in self._samples if success)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * percentile), len(latencies) - 1)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            state, total = self.state, self._total
+        errors = sum(1 for _, success in samples if not success)
+        p50, p95 = self.latency(0.5), self.latency(0.95)
+        return {
+            "state": state,
+            "requests": total,
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+# 批量查询时发送给大模型的系统提示词, 各题型的作答要求与单题查询一致
+BATCH_SYSTEM_PROMPT = (
+    "下面以JSON数组给出多道题目，每道题包含id、type(题型)、title(题目)和options(选项)。请逐题作答：\n"
+    "单选题只能选择一个选项；多选题必须选择两个或以上选项；选择题回答选项的具体内容，去除选项前的字母；\n"
+    "判断题只能回答正确或者错误；填空题和简答题根据语境和相关知识填入合适的内容。\n"
+    "以JSON数组输出所有题目的答案，每个元素包含题目id和答案列表Answer，顺序与题目一致，"
+    "示例回答：[{\"id\": \"1\", \"Answer\": [\"答案\"]}, {\"id\": \"2\", \"Answer\": [\"答案1\", \"答案2\"]}]。"
+    "除此之外不要输出任何多余的内容，也不要使用MD语法。如果你使用了互联网搜索，也请不要返回搜索的结果和参考资料"
+)
+QUESTION_TYPE_NAMES = {
+    "single": "单选题",
+    "multiple": "多选题",
+    "judgement": "判断题",
+    "completion": "填空题",
+}
+
+
+def build_batch_prompt(questions: list) -> str:
+    """将多道题目组装为批量查询的用户消息"""
+    items = []
+    for q in questions:
+        item = {
+            "id": str(q['id']),
+            "type": QUESTION_TYPE_NAMES.get(q['type'], "简答题"),
+            "title": q['title'],
+        }
+        if q['type'] in ("single", "multiple") and q.get('options'):
+            item["options"] = q['options']
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False)
 
-    def add_cache(self, question: str, answer: str) -> None:
-        data = self._read_cache()
-        data[question] = answer
-        self._write_cache(data)
+
+def parse_batch_answers(content: str) -> dict:
+    """
+    解析大模型返回的批量答案
+
+    Returns:
+        题目ID -> 答案(多个答案以换行分隔), 无法解析的题目不包含在结果中
+    """
+    match = re.search(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', content, re.DOTALL)
+    data = json.loads(match.group(1) if match else content.strip())
+    # 兼容{"answers": [...]}这样包了一层的输出
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [])
+    answers = {}
+    for item in data:
+        if not isinstance(item, dict) or "id" not in item:
+            continue
+        answer = item.get("Answer")
+        if isinstance(answer, list):
+            answer = "\n".join(str(a) for a in answer)
+        if isinstance(answer, str) and answer.strip():
+            answers[str(item["id"])] = answer.strip()
+    return answers
 
 
 class Tiku:
@@ -58,12 +281,25 @@ class Tiku:
     DISABLE = False     # 停用标志
     SUBMIT = False      # 提交标志
     COVER_RATE = 0.8    # 覆盖率
+    QUERY_WORKERS = 4   # 章节检测同时查询的题目数
+    BATCH_SIZE = 1      # 每次请求合并查询的题目数, 仅部分题库支持
+    TIMEOUT = 30.0      # 题库接口请求超时时间, 单位秒
+    KEEPALIVE_EXPIRY = 60.0  # 空闲连接的保持时间, 单位秒, 0表示不复用连接
     true_list = []
     false_list = []
     def __init__(self) -> None:
         self._name = None
         self._api = None
         self._conf = None
+        self._cache = None
+        self._fuzzy_index = None
+        self._fuzzy_lock = threading.Lock()
+        # 题库接口的限流器, 同一题库的所有线程共用
+        self.rate_limiter = RateLimiter()
+        # 题库要求的最小请求间隔(秒), 未配置rate_limit时与delay一起决定请求频率
+        self.min_interval = 0.0
+        # 题库接口的熔断器与耗时/错误统计
+        self.health = ProviderHealth()
 
     @property
     def name(self):
@@ -89,6 +325,43 @@ class Tiku:
     def token(self,value):
         self._token = value
 
+    @property
+    def cache(self) -> CacheDAO:
+        # 缓存在首次使用时创建, 同一个题库实例内复用
+        if self._cache is None:
+            conf = self._conf or {}
+            backend = conf.get('cache_backend') or 'sqlite'
+            default_file = CacheDAO.LEGACY_CACHE_FILE if backend == 'json' else CacheDAO.DEFAULT_CACHE_FILE
+            self._cache = CacheDAO(
+                conf.get('cache_file') or default_file,
+                backend,
+                lru_size=int(conf.get('cache_size') or CacheDAO.DEFAULT_LRU_SIZE),
+                flush_interval=float(conf.get('cache_flush_interval') or CacheDAO.DEFAULT_FLUSH_INTERVAL),
+            )
+        return self._cache
+
+    @property
+    def fuzzy_index(self) -> FuzzyIndex:
+        # 相似题目索引在首次使用时创建, 未配置fuzzy_threshold时不使用
+        with self._fuzzy_lock:
+            if self._fuzzy_index is None:
+                conf = self._conf or {}
+                threshold = float(conf.get('fuzzy_threshold') or 0)
+                if threshold <= 0:
+                    return None
+                self._fuzzy_index = FuzzyIndex(conf.get('fuzzy_index_file') or DEFAULT_INDEX_FILE, threshold)
+                self._fuzzy_index.build_in_background(self.cache.backend.items)
+            return self._fuzzy_index
+
+    def flush_cache(self):
+        # 将缓冲的答案写入缓存文件
+        if self._cache is not None:
+            self._cache.flush()
+
+    def cache_stats(self) -> dict:
+        # 缓存命中/未命中/淘汰计数, 用于评估cache_size
+        return self._cache.stats() if self._cache is not None else {}
+
     def init_tiku(self):
         # 仅用于题库初始化, 应该在题库载入后作初始化调用, 随后才可以使用题库
         # 尝试根据配置文件设置提交模式
@@ -100,13 +373,51 @@ class Tiku:
             self.COVER_RATE = float(self._conf['cover_rate'])
             self.true_list = self._conf['true_list'].split(',')
             self.false_list = self._conf['false_list'].split(',')
+            # 设置并发查询数
+            self.QUERY_WORKERS = int(self._conf.get('query_workers') or self.QUERY_WORKERS)
+            self.BATCH_SIZE = int(self._conf.get('batch_size') or self.BATCH_SIZE)
+            # 设置请求超时与连接保持时间
+            self.TIMEOUT = float(self._provider_conf('timeout', self.TIMEOUT))
+            self.KEEPALIVE_EXPIRY = float(self._conf.get('keepalive_expiry') or self.KEEPALIVE_EXPIRY)
             # 调用自定义题库初始化
             self._init_tiku()
-        
+            self.rate_limiter = self._create_rate_limiter()
+            self.health = ProviderHealth(
+                self.name,
+                int(self._provider_conf('failure_threshold', 5)),
+                float(self._provider_conf('recovery_time', 60)),
+            )
+
+    def _provider_conf(self, key: str, default=None):
+        # 读取题库专属配置, 例如AI题库的ai_rate_limit, 未单独配置时使用通用配置
+        return self._conf.get(f"{type(self).__name__.lower()}_{key}") or self._conf.get(key) or default
+
+    def _create_rate_limiter(self) -> RateLimiter:
+        # rate_limit为每分钟请求数; 未配置时沿用旧版的请求间隔, 取delay与题库最小间隔中较大的一个
+        kwargs = dict(path=self._conf.get('rate_limit_db') or None, name=type(self).__name__)
+        rate_limit = float(self._provider_conf('rate_limit', 0))
+        if rate_limit > 0:
+            return RateLimiter(rate_limit / 60, int(self._provider_conf('rate_burst', 1)), **kwargs)
+        interval = max(float(self._conf.get('delay') or 0), self.min_interval)
+        return RateLimiter.from_interval(interval, **kwargs)
+
     def _init_tiku(self):
         # 仅用于题库初始化, 例如配置token, 交由自定义题库完成
         pass
 
+    def health_stats(self) -> dict:
+        # 题库接口的熔断状态与最近请求的错误率/耗时, 用于监控
+        return {self.name: self.health.stats()}
+
+    def close(self):
+        # 程序退出前调用, 写入缓冲的答案并释放题库持有的连接
+        if self.health.stats()["requests"]:
+            logger.info(f"题库接口统计: {self.health_stats()}")
+        self.flush_cache()
+        self.rate_limiter.close()
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.close()
+
     def config_set(self,config):
         self._conf = config
 
@@ -126,33 +437,175 @@ class Tiku:
         if self.DISABLE:
             return None
 
+        # 先过缓存
+        answer = self._query_cache(q_info)
+        if answer:
+            return answer
+        return self._query_remote(q_info)
+
+    def _query_cache(self, q_info: dict):
+        """预处理题目标题并查询缓存, 未命中时返回None"""
         # 预处理, 去除【单选题】这样与标题无关的字段
         logger.debug(f"原始标题：{q_info['title']}")
         q_info['title'] = sub(r'^\d+', '', q_info['title'])
         q_info['title'] = sub(r'（\d+\.\d+分）$', '', q_info['title'])
         logger.debug(f"处理后标题：{q_info['title']}")
 
-        # 先过缓存
-        cache_dao = CacheDAO()
-        answer = cache_dao.get_cache(q_info['title'])
+        key = self._cache_key(q_info)
+        answer = self.cache.get_cache(key)
+        if not answer and self.cache.has_keys_without_prefix(f"{KEY_VERSION}|"):
+            # 旧版缓存以处理后的标题为键, 命中后写入新的缓存键
+            answer = self.cache.get_cache(q_info['title'])
+            if answer:
+                self._add_cache(q_info, answer)
+        if not answer:
+            answer = self._query_fuzzy(key)
         if answer:
             logger.info(f"从缓存中获取答案：{q_info['title']} -> {answer}")
             return answer.strip()
-        else:
-            answer = self._query(q_info)
-            if answer:
-                answer = answer.strip()
-                cache_dao.add_cache(q_info['title'], answer)
-                logger.info(f"从{self.name}获取答案：{q_info['title']} -> {answer}")
-                if check_answer(answer, q_info['type'], self):
-                    return answer
-                else:
-                    logger.info(f"从{self.name}获取到的答案类型与题目类型不符，已舍弃")
-                    return None
-                    
-            logger.error(f"从{self.name}获取答案失败：{q_info['title']}")
+        return None
+
+    @staticmethod
+    def _cache_key(q_info: dict) -> str:
+        """由规范化的标题、题型与选项生成缓存键"""
+        return make_cache_key(q_info['title'], q_info.get('type', ''), q_info.get('options'))
+
+    def _add_cache(self, q_info: dict, answer: str):
+        """写入答案缓存, 并加入相似题目索引"""
+        key = self._cache_key(q_info)
+        self.cache.add_cache(key, answer)
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add(key)
+
+    def _query_fuzzy(self, key: str):
+        """缓存未命中时查找题型与选项一致的相似题目, 使用其缓存的答案"""
+        if self.fuzzy_index is None:
+            return None
+        match = self.fuzzy_index.lookup(key)
+        if match is None:
+            return None
+        similar_key, similarity = match
+        answer = self.cache.get_cache(similar_key)
+        if answer:
+            logger.info(f"使用相似题目的缓存答案(相似度{similarity:.2f})：{parse_cache_key(similar_key)[1]}")
+        return answer
+
+    def _query_remote(self, q_info: dict):
+        """请求题库接口查询单道题目"""
+        answer = self._call_remote(self._query, q_info)
+        if answer:
+            answer = answer.strip()
+            self._add_cache(q_info, answer)
+            logger.info(f"从{self.name}获取答案：{q_info['title']} -> {answer}")
+            if check_answer(answer, q_info['type'], self):
+                return answer
+            else:
+                logger.info(f"从{self.name}获取到的答案类型与题目类型不符，已舍弃")
+                return None
+
+        logger.error(f"从{self.name}获取答案失败：{q_info['title']}")
         return None
     
+    def _call_remote(self, func, *args):
+        """
+        请求题库接口并记录耗时与成败, 出错或熔断期间返回None
+
+        仅限制实际请求题库接口的频率, 缓存命中不受影响
+
+        Raises:
+            PermissionError: 题库token用完等需要用户处理的错误, 不计为接口故障
+        """
+        if not self.health.allow():
+            logger.debug(f"{self.name}暂停使用中, 跳过查询")
+            return None
+        self.rate_limiter.acquire()
+        start = time.monotonic()
+        try:
+            result = func(*args)
+        except PermissionError:
+            self.health.record(time.monotonic() - start, True)
+            raise
+        except Exception as e:
+            failed = is_provider_failure(e)
+            self.health.record(time.monotonic() - start, not failed)
+            if failed:
+                logger.error(f"{self.name}请求失败: {type(e).__name__}: {e}")
+            else:
+                logger.warning(f"{self.name}返回内容无法解析, 视为未查到答案: {type(e).__name__}: {e}")
+            return None
+        self.health.record(time.monotonic() - start, True)
+        return result
+
+    @staticmethod
+    def _raise_for_server_error(res):
+        # 5xx响应计为接口故障, 其他状态码仍由各题库自行处理
+        if res.status_code >= 500:
+            raise requests.HTTPError(f"{res.status_code} {res.reason}", response=res)
+
+    def query_many(self, questions: list, workers: int = None) -> list:
+        """
+        同时查询多道题目, 请求频率受题库限流器限制
+
+        Args:
+            questions: 题目信息列表
+            workers: 同时查询的题目数, 默认为配置中的query_workers
+
+        Returns:
+            与questions顺序一致的答案列表, 未查到的题目为None
+        """
+        if self.DISABLE or not questions:
+            return [None] * len(questions)
+        if self.BATCH_SIZE > 1 and self.supports_batch():
+            return self._query_many_batched(questions, workers)
+        workers = min(workers or self.QUERY_WORKERS, len(questions))
+        if workers <= 1:
+            return [self.query(q) for q in questions]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query") as executor:
+            return list(executor.map(self.query, questions))
+
+    def supports_batch(self) -> bool:
+        """题库是否实现了批量查询接口"""
+        return type(self)._query_batch is not Tiku._query_batch
+
+    def _query_many_batched(self, questions: list, workers: int = None) -> list:
+        """
+        缓存未命中的题目每BATCH_SIZE道合并为一次请求, 批量结果中缺失或不合格的题目单独重新查询
+        """
+        results = [self._query_cache(q) for q in questions]
+        pending = [i for i, answer in enumerate(results) if not answer]
+        batches = [pending[i:i + self.BATCH_SIZE] for i in range(0, len(pending), self.BATCH_SIZE)]
+
+        def run_batch(batch):
+            batch_questions = [questions[i] for i in batch]
+            answers = self._call_remote(self._query_batch, batch_questions) or {}
+            for i, q in zip(batch, batch_questions):
+                answer = (answers.get(str(q['id'])) or "").strip()
+                if answer and check_answer(answer, q['type'], self):
+                    self._add_cache(q, answer)
+                    logger.info(f"从{self.name}批量获取答案：{q['title']} -> {answer}")
+                    results[i] = answer
+                else:
+                    logger.debug(f"批量结果中未找到有效答案, 单独查询：{q['title']}")
+                    results[i] = self._query_remote(q)
+
+        workers = min(workers or self.QUERY_WORKERS, len(batches))
+        if workers <= 1:
+            for batch in batches:
+                run_batch(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query") as executor:
+                list(executor.map(run_batch, batches))
+        return results
+
+    def _query_batch(self, questions: list) -> dict:
+        """
+        批量查询接口, 交由支持的题库实现
+
+        Returns:
+            题目ID -> 答案, 未能给出答案的题目可以缺失; 返回None时逐题单独查询
+        """
+        pass
+
     def _query(self,q_info:dict):
         """
         查询接口, 交由自定义题库实现
@@ -176,7 +629,11 @@ class Tiku:
             self.DISABLE = True
             logger.error("未找到题库配置, 已忽略题库功能")
             return self
-        new_cls = globals()[cls_name]()
+        # 填写多个题库时组合使用
+        if "," in cls_name:
+            new_cls = TikuMulti([name.strip() for name in cls_name.split(",") if name.strip()])
+        else:
+            new_cls = globals()[cls_name]()
         new_cls.config_set(self._conf)
         return new_cls
 
@@ -219,39 +676,54 @@ class TikuYanxi(Tiku):
         self._token = None
         self._token_index = 0   # token队列计数器
         self._times = 100   # 查询次数剩余, 初始化为100, 查询后校对修正
+        # 多线程查询时保护token轮换与剩余次数
+        self._lock = threading.Lock()
 
     def _query(self,q_info:dict):
+        with self._lock:
+            token = self._token
         res = requests.get(
             self.api,
             params={
                 'question':q_info['title'],
-                'token': self._token,
+                'token': token,
                 # 'type':q_info['type'], #修复478题目类型与答案类型不符（不想写后处理了）
                 # 没用，就算有type和options，言溪题库还是可能返回类型不符，问了客服，type仅用于收集
             },
-            verify=False
+            verify=False,
+            timeout=self.TIMEOUT
         )
+        self._raise_for_server_error(res)
         if res.status_code == 200:
             res_json = res.json()
             if not res_json['code']:
                 # 如果是因为TOKEN次数到期, 则更换token
                 if self._times == 0 or '次数不足' in res_json['data']['answer']:
-                    logger.info(f'TOKEN查询次数不足, 将会更换并重新搜题')
-                    self._token_index += 1
-                    self.load_token()
+                    self.rotate_token(token)
                     # 重新查询
                     return self._query(q_info)
                 logger.error(f'{self.name}查询失败:\n\t剩余查询数{res_json["data"].get("times",f"{self._times}(仅参考)")}:\n\t消息:{res_json["message"]}')
                 return None
-            self._times = res_json["data"].get("times",self._times)
+            with self._lock:
+                self._times = res_json["data"].get("times",self._times)
             return res_json['data']['answer'].strip()
         else:
             logger.error(f'{self.name}查询失败:\n{res.text}')
         return None
     
+    def rotate_token(self, used_token):
+        """更换下一个token, 其他线程已经更换过时直接使用新的token"""
+        with self._lock:
+            if self._token != used_token:
+                return
+            logger.info(f'TOKEN查询次数不足, 将会更换并重新搜题')
+            self._token_index += 1
+            self.load_token()
+            self._times = 100
+
     def load_token(self): 
         token_list = self._conf['tokens'].split(',')
-        if self._token_index == len(token_list):
+        if self._token_index >= len(token_list):
             # TOKEN 用完
             logger.error('TOKEN用完, 请自行更换再重启脚本')
             raise PermissionError(f'{self.name} TOKEN 已用完, 请更换')
@@ -274,6 +746,8 @@ class TikuLike(Tiku):
         self._times = -1
         self._search = False
         self._count = 0
+        # 多线程查询时保护剩余次数与查询计数
+        self._lock = threading.Lock()
 
     def _query(self,q_info:dict):
         q_info_map = {"single":"【单选题】","multiple":"【多选题】","completion":"【填空题】","judgement":"【判断题】"}
@@ -291,8 +765,10 @@ class TikuLike(Tiku):
                 'model': self._model if self._model else '',
                 'search': self._search
             },
-            verify=False
+            verify=False,
+            timeout=self.TIMEOUT
         )
+        self._raise_for_server_error(res)
 
         if res.status_code == 200:
             res_json = res.json()
@@ -307,12 +783,13 @@ class TikuLike(Tiku):
 
         ret += str(ans)
 
-        self._times -= 1
-
-        #10次查询后更新实际次数
-        self._count = (self._count+1) % 10
+        with self._lock:
+            self._times -= 1
+            #10次查询后更新实际次数
+            self._count = (self._count+1) % 10
+            need_update = self._count == 0
 
-        if self._count == 0:
+        if need_update:
             self.update_times()
         
         return ret
@@ -323,11 +800,13 @@ class TikuLike(Tiku):
             json={
                 'token': self._token,
             },
-            verify=False
+            verify=False,
+            timeout=self.TIMEOUT
         )
         if res.status_code == 200:
             res_json = res.json()
-            self._times = res_json["data"].get("balance",self._times)
+            with self._lock:
+                self._times = res_json["data"].get("balance",self._times)
             logger.info(f"当前LIKE知识库Token剩余查询次数为: {self._times}")
         else:
             logger.error('TOKEN出现错误，请检查后再试')
@@ -379,8 +858,10 @@ class TikuAdapter(Tiku):
                 'options': [sub(r'^[A-Za-z]\.?、?\s?', '', option) for option in options.split('\n')],
                 'type': type
             },
-            verify=False
+            verify=False,
+            timeout=self.TIMEOUT
         )
+        self._raise_for_server_error(res)
         if res.status_code == 200:
             res_json = res.json()
             # if bool(res_json['plat']):
@@ -404,7 +885,7 @@ class AI(Tiku):
     def __init__(self) -> None:
         super().__init__()
         self.name = 'AI大模型答题'
-        self.last_request_time = None
+        self._client = None
 
     def _query(self, q_info: dict):
         def remove_md_json_wrapper(md_str):
@@ -413,12 +894,7 @@ class AI(Tiku):
             match = re.search(pattern, md_str, re.DOTALL)
             return match.group(1).strip() if match else md_str.strip()
         
-        if self.http_proxy:
-            proxy = self.http_proxy
-            httpx_client = httpx.Client(proxy=proxy)
-            client = OpenAI(http_client=httpx_client, base_url = self.endpoint,api_key = self.key)
-        else:
-            client = OpenAI(base_url = self.endpoint,api_key = self.key)
+        client = self._client
         # 判断题目类型
         if q_info['type'] == "single":
             completion = client.chat.completions.create(
@@ -492,13 +968,6 @@ class AI(Tiku):
             )
 
         try:
-            if self.last_request_time:
-                interval_time = time.time() - self.last_request_time
-                if interval_time < self.min_interval_seconds:
-                    sleep_time = self.min_interval_seconds - interval_time
-                    logger.debug(f"API请求间隔过短, 等待 {sleep_time} 秒")
-                    time.sleep(sleep_time)
-            self.last_request_time = time.time()
             response = json.loads(remove_md_json_wrapper(completion.choices[0].message.content))
             sep = "\n"
             return sep.join(response['Answer']).strip()
@@ -506,18 +975,47 @@ class AI(Tiku):
             logger.error("无法解析大模型输出内容")
             return None
 
+    def _create_client(self) -> OpenAI:
+        # 连接池大小与并发查询数一致, 所有题目复用已建立的连接, 不必每题重新握手
+        httpx_client = httpx.Client(
+            proxy=self.http_proxy or None,
+            timeout=httpx.Timeout(self.TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=self.QUERY_WORKERS,
+                max_keepalive_connections=self.QUERY_WORKERS if self.KEEPALIVE_EXPIRY > 0 else 0,
+                keepalive_expiry=self.KEEPALIVE_EXPIRY,
+            ),
+        )
+        return OpenAI(http_client=httpx_client, base_url = self.endpoint,api_key = self.key, timeout=self.TIMEOUT)
+
+    def _query_batch(self, questions: list) -> dict:
+        completion = self._client.chat.completions.create(
+            model = self.model,
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": build_batch_prompt(questions)},
+            ]
+        )
+        return parse_batch_answers(completion.choices[0].message.content)
+
     def _init_tiku(self):
         self.endpoint = self._conf['endpoint']
         self.key = self._conf['key']
         self.model = self._conf['model']
         self.http_proxy = self._conf['http_proxy']
-        self.min_interval_seconds = int(self._conf['min_interval_seconds'])
+        self.min_interval = float(self._conf.get('min_interval_seconds') or 0)
+        self._client = self._create_client()
+
+    def close(self):
+        super().close()
+        if self._client is not None:
+            self._client.close()
 class SiliconFlow(Tiku):
     """硅基流动大模型答题实现"""
     def __init__(self):
         super().__init__()
         self.name = '硅基流动大模型'
-        self.last_request_time = None
+        self._session = None
 
     def _query(self, q_info: dict):
         def remove_md_json_wrapper(md_str):
@@ -565,21 +1063,14 @@ class SiliconFlow(Tiku):
             "response_format": {"type": "text"}
         }
 
-        # 处理请求间隔
-        if self.last_request_time:
-            interval = time.time() - self.last_request_time
-            if interval < self.min_interval:
-                time.sleep(self.min_interval - interval)
-
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.api_endpoint,
                 headers=headers,
                 json=payload,
-                timeout=30
+                timeout=self.TIMEOUT
             )
-            self.last_request_time = time.time()
-            
+            self._raise_for_server_error(response)
             if response.status_code == 200:
                 result = response.json()
                 content = result['choices'][0]['message']['content']
@@ -588,11 +1079,40 @@ class SiliconFlow(Tiku):
             else:
                 logger.error(f"API请求失败：{response.status_code} {response.text}")
                 return None
-                
+        except requests.RequestException:
+            # 网络错误交由熔断器统计
+            raise
         except Exception as e:
             logger.error(f"硅基流动API异常：{e}")
             return None
 
+    def _query_batch(self, questions: list) -> dict:
+        response = self._session.post(
+            self.api_endpoint,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model_name,
+                "messages": [
+                    {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": build_batch_prompt(questions)},
+                ],
+                "stream": False,
+                "max_tokens": 4096,
+                "temperature": 0.7,
+                "top_p": 0.7,
+                "response_format": {"type": "text"}
+            },
+            timeout=self.TIMEOUT
+        )
+        self._raise_for_server_error(response)
+        if response.status_code != 200:
+            logger.error(f"API请求失败：{response.status_code} {response.text}")
+            return {}
+        return parse_batch_answers(response.json()['choices'][0]['message']['content'])
+
     def _init_tiku(self):
         # 从配置文件读取参数
         self.api_endpoint = self._conf.get('siliconflow_endpoint', 'https://api.siliconflow.cn/v1/chat/completions')
@@ -600,5 +1120,141 @@ class SiliconFlow(Tiku):
 
         self.model_name = self._conf.get('siliconflow_model', 'deepseek-ai/DeepSeek-V3')
 
+        self.min_interval = float(self._conf.get('min_interval_seconds', 3))
+        self._session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        # 连接池大小与并发查询数一致, 所有题目复用已建立的连接
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.QUERY_WORKERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # requests的连接池没有空闲超时, keepalive_expiry为0时每次请求后关闭连接
+        if self.KEEPALIVE_EXPIRY <= 0:
+            session.headers["Connection"] = "close"
+        return session
+
+    def close(self):
+        super().close()
+        if self._session is not None:
+            self._session.close()
+
+
+class TikuMulti(Tiku):
+    """
+    组合多个题库, provider中用英文逗号隔开多个题库名时使用
+
+    chain: 按顺序查询, 前一个题库没有查到有效答案时才查询下一个, 便宜的题库放在前面可以减少大模型调用
+    race: 先查询第一个题库, 超过该题库最近的P95耗时(不超过hedge_delay秒)仍未返回时同时查询下一个,
+          采用最先返回的有效答案; 某个题库未查到答案时立即查询下一个
+
+    熔断中的题库在两种方式下都会被跳过
+    """
+
+    MODES = ("chain", "race")
+
+    def __init__(self, providers: list) -> None:
+        super().__init__()
+        self.providers = [globals()[name]() for name in providers]
+        self.name = "+".join(providers)
+        self.mode = "chain"
+        self.hedge_delay = 2.0
+        self._executor = None
+
+    def _init_tiku(self):
+        self.mode = self._conf.get('multi_mode') or self.mode
+        if self.mode not in self.MODES:
+            logger.warning(f"未知的多题库查询方式: {self.mode}, 已使用chain")
+            self.mode = "chain"
+        self.hedge_delay = float(self._conf.get('hedge_delay') or self.hedge_delay)
+        for provider in self.providers:
+            provider.config_set(self._conf)
+            provider.init_tiku()
+            # 共用同一份答案缓存
+            provider._cache = self.cache
+        if self.mode == "race":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.QUERY_WORKERS * len(self.providers), thread_name_prefix="race"
+            )
+        logger.info(f"已启用多题库: {self.name}, 查询方式: {self.mode}")
+
+    def _create_rate_limiter(self) -> RateLimiter:
+        # 由各题库各自限流
+        return RateLimiter()
+
+    def _fetch(self, provider: Tiku, q_info: dict):
+        """向单个题库查询, 返回通过题型校验的答案, 未查到时返回None"""
+        if provider.DISABLE:
+            return None
+        try:
+            answer = (provider._call_remote(provider._query, q_info) or "").strip()
+        except PermissionError as e:
+            # token用完的题库不再查询, 其余题库继续使用
+            logger.error(f"{e}, 之后不再查询{provider.name}")
+            provider.DISABLE = True
+            return None
+        if not answer:
+            logger.debug(f"{provider.name}未查到答案: {q_info['title']}")
+            return None
+        if not check_answer(answer, q_info['type'], self):
+            logger.info(f"从{provider.name}获取到的答案类型与题目类型不符，已舍弃")
+            return None
+        logger.info(f"从{provider.name}获取答案：{q_info['title']} -> {answer}")
+        return answer
+
+    def _query_remote(self, q_info: dict):
+        if self.mode == "race":
+            answer = self._race(q_info)
+        else:
+            answer = next(filter(None, (self._fetch(p, q_info) for p in self.providers)), None)
+        if answer:
+            self._add_cache(q_info, answer)
+        else:
+            logger.error(f"从{self.name}获取答案失败：{q_info['title']}")
+        return answer
+
+    def _hedge_delay(self, provider: Tiku) -> float:
+        # 按题库最近的P95耗时决定何时查询下一个题库, 不超过配置的hedge_delay
+        p95 = provider.health.latency(0.95)
+        return min(p95, self.hedge_delay) if p95 is not None else self.hedge_delay
+
+    def _race(self, q_info: dict):
+        # 熔断中与已停用的题库不参与竞速
+        providers = iter([p for p in self.providers if p.health.available and not p.DISABLE])
+        pending = set()
+        delay = self.hedge_delay
+
+        def launch():
+            nonlocal delay
+            provider = next(providers, None)
+            if provider is not None:
+                delay = self._hedge_delay(provider)
+                pending.add(self._executor.submit(self._fetch, provider, dict(q_info)))
+            return provider is not None
+
+        has_next = launch()
+        while pending:
+            done, pending = wait(
+                pending, timeout=delay if has_next else None, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.result():
+                    # 其余题库的请求已发出, 结果直接丢弃
+                    return future.result()
+            # 超时或已返回的题库未查到答案, 查询下一个题库
+            if has_next:
+                has_next = launch()
+        return None
+
+    def health_stats(self) -> dict:
+        stats = {}
+        for provider in self.providers:
+            stats.update(provider.health_stats())
+        return stats
 
-        self.min_interval = int(self._conf.get('min_interval_seconds', 3))
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        for provider in self.providers:
+            provider.close()
+        super().close()
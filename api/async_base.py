@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+基于asyncio与httpx.AsyncClient的超星客户端
+
+AsyncChaoxing提供与Chaoxing同名的协程版本接口, 一个事件循环即可同时驱动多个课程的任务,
+视频心跳等待期间不会占用线程。登录仍复用同步实现, 题库查询在线程中执行。
+异步客户端与同步会话共用同一个CookieJar, 回滚次数按协程任务分别记录。
+
+用法示例:
+    chaoxing = AsyncChaoxing(account=account, tiku=tiku)
+    chaoxing.login()
+    async with chaoxing:
+        courses = await chaoxing.get_course_list()
+"""
+import asyncio
+import re
+from typing import Dict, Optional
+
+import httpx
+
+from api.base import Chaoxing, SessionManager, get_timestamp
+from api.decode import (
+    decode_course_list,
+    decode_course_point,
+    decode_course_card,
+    decode_course_folder,
+)
+from api.exceptions import MaxRetryExceeded
+from api.heartbeat import REPORT_TIMEOUT, HeartbeatResult, VideoHeartbeat, get_report_interval
+from api.logger import logger
+from api.process import progress
+
+
+class AsyncChaoxing(Chaoxing):
+    StudyResult = Chaoxing.StudyResult
+
+    def __init__(self, account=None, tiku=None, **kwargs):
+        super().__init__(account=account, tiku=tiku, **kwargs)
+        # 单次请求的超时时间(秒)
+        self.timeout = float(kwargs.get("timeout", REPORT_TIMEOUT))
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def client(self, profile: str = "default") -> httpx.AsyncClient:
+        """
+        获取指定请求头配置的异步客户端, 与同步会话共用同一个CookieJar
+        """
+        _client = self._clients.get(profile)
+        if _client is None:
+            _transport = httpx.AsyncHTTPTransport(
+                verify=False,
+                retries=3,
+                limits=httpx.Limits(max_connections=self.session_manager.pool_maxsize),
+            )
+            _client = httpx.AsyncClient(
+                headers=SessionManager.PROFILES[profile],
+                cookies=self.session_manager.cookies,
+                transport=_transport,
+                follow_redirects=True,
+                timeout=self.timeout,
+            )
+            self._clients[profile] = _client
+        return _client
+
+    async def aclose(self):
+        for _client in self._clients.values():
+            await _client.aclose()
+        self._clients.clear()
+        self.close()
+
+    async def _bounded(self, coro):
+        # 与同步实现的线程池一致, 并发请求数不超过fetch_workers
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.fetch_workers)
+        async with self._semaphore:
+            return await coro
+
+    async def get_course_list(self):
+        _client = self.client()
+        logger.trace("正在读取所有的课程列表...")
+
+        async def fetch_course_list(_folder_id=0, _extra_headers=None):
+            _resp = await self._post_course_list(
+                _client, self.COURSE_LIST_URL, _folder_id, _extra_headers
+            )
+            return decode_course_list(_resp.text)
+
+        async def fetch_course_folder():
+            _interaction_resp = await _client.get(self.INTERACTION_URL)
+            return decode_course_folder(_interaction_resp.text)
+
+        # 根目录课程列表与文件夹列表同时读取
+        _root, course_folder = await asyncio.gather(
+            self._bounded(fetch_course_list(0, self.COURSE_LIST_HEADERS)),
+            self._bounded(fetch_course_folder()),
+        )
+        _folder_results = await asyncio.gather(
+            *(self._bounded(fetch_course_list(folder["id"])) for folder in course_folder)
+        )
+        logger.info("课程列表读取完毕...")
+        return self._merge_course_lists([_root, *_folder_results])
+
+    async def get_course_point(self, _courseid, _clazzid, _cpi):
+        _client = self.client()
+        _url = f"https://mooc2-ans.chaoxing.com/mooc2-ans/mycourse/studentcourse?courseid={_courseid}&clazzid={_clazzid}&cpi={_cpi}&ut=s"
+        logger.trace("开始读取课程所有章节...")
+        _resp = await _client.get(_url)
+        logger.info("课程章节读取成功...")
+        return decode_course_point(_resp.text)
+
+    async def get_job_list(self, _clazzid, _courseid, _cpi, _knowledgeid):
+        _client = self.client()
+        job_list = []
+        job_info = {}
+
+        async def fetch_card(_possible_num):
+            _url = f"https://mooc1.chaoxing.com/mooc-ans/knowledge/cards?clazzid={_clazzid}&courseid={_courseid}&knowledgeid={_knowledgeid}&num={_possible_num}&ut=s&cpi={_cpi}&v=20160407-3&mooc2=1"
+            logger.trace("开始读取章节所有任务点...")
+            _resp = await _client.get(_url)
+            return decode_course_card(_resp.text)
+
+        # 先读取num=0, 章节未开放时直接返回, 不再请求其余卡片页
+        _job_list, _job_info = await self._bounded(fetch_card("0"))
+        if _job_info.get("notOpen", False):
+            logger.info("该章节未开放")
+            return [], _job_info
+        job_list += _job_list
+        job_info.update(_job_info)
+
+        # 其余卡片页并发读取, 按num顺序合并结果
+        for _job_list, _job_info in await asyncio.gather(
+            *(self._bounded(fetch_card(_possible_num)) for _possible_num in ["1", "2"])
+        ):
+            if _job_info.get("notOpen", False):
+                logger.info("该章节未开放")
+                return [], _job_info
+            job_list += _job_list
+            job_info.update(_job_info)
+        logger.info("章节任务点读取成功...")
+        return job_list, job_info
+
+    async def video_progress_log(
+        self,
+        _client,
+        _course,
+        _job,
+        _job_info,
+        _dtoken,
+        _duration,
+        _playingTime,
+        _type: str = "Video",
+    ):
+        for _possible_rt in ["0.9", "1"]:
+            _url = self._video_log_url(
+                _course, _job, _dtoken, _duration, _playingTime, _possible_rt, _type
+            )
+            resp = await _client.get(_url, timeout=REPORT_TIMEOUT)
+            if resp.status_code == 200:
+                return resp.json(), 200
+            # 如果出现403无权限报错, 则继续尝试不同的rt参数
+        # 若出现两个rt参数都返回403的情况, 则跳过当前任务
+        logger.warning("出现403报错, 尝试修复无效, 正在跳过当前任务点...")
+        return {"isPassed": False}, 403
+
+    async def study_video(
+        self, _course, _job, _job_info, _speed: float = 1.0, _type: str = "Video"
+    ) -> StudyResult:
+        _client = self.client("video" if _type == "Video" else "audio")
+        _info_url = f"https://mooc1.chaoxing.com/ananas/status/{_job['objectid']}?k={self.get_fid()}&flag=normal"
+        _video_info = (await _client.get(_info_url, timeout=REPORT_TIMEOUT)).json()
+        if _video_info["status"] != "success":
+            return self.StudyResult.ERROR
+
+        _dtoken = _video_info["dtoken"]
+        _duration = _video_info["duration"]
+        logger.info(f"开始任务: {_job['name']}, 总时长: {_duration}秒")
+        _progress_id = progress.start(_job["name"], int(_duration), 0, _speed)
+        # 心跳上报在当前协程中进行, 等待期间让出事件循环
+        _heartbeat = VideoHeartbeat(
+            lambda _playingTime: self.video_progress_log(
+                _client, _course, _job, _job_info, _dtoken, _duration, _playingTime, _type
+            ),
+            _duration,
+            interval=get_report_interval(_job_info),
+            speed=_speed,
+            on_progress=lambda _playingTime: progress.advance(_progress_id, _playingTime),
+        )
+        try:
+            _result = await asyncio.wait_for(_heartbeat.run_async(), _heartbeat.max_wait())
+        except asyncio.TimeoutError:
+            logger.warning(f"任务 {_job['name']} 的进度上报超时, 跳过当前任务点")
+            _result = None
+        finally:
+            progress.finish(_progress_id)
+        if _result == HeartbeatResult.FORBIDDEN:
+            return self.StudyResult.FORBIDDEN
+        if _result != HeartbeatResult.PASSED:
+            return self.StudyResult.ERROR
+        logger.info(f"任务完成: {_job['name']}")
+        return self.StudyResult.SUCCESS
+
+    async def study_document(self, _course, _job) -> StudyResult:
+        _client = self.client()
+        _url = f"https://mooc1.chaoxing.com/ananas/job/document?jobid={_job['jobid']}&knowledgeid={re.findall(r'nodeId_(.*?)-', _job['otherinfo'])[0]}&courseid={_course['courseId']}&clazzid={_course['clazzId']}&jtoken={_job['jtoken']}&_dc={get_timestamp()}"
+        _resp = await _client.get(_url)
+        if _resp.status_code != 200:
+            return self.StudyResult.ERROR
+        return self.StudyResult.SUCCESS
+
+    async def fetch_work(self, _course, _job, _job_info, max_retries: int = 3, delay: int = 1):
+        """
+        读取并解析章节检测页面
+
+        Returns:
+            (页面源码, 题目信息)
+
+        Raises:
+            MaxRetryExceeded: 超过最大重试次数
+            PermissionError: 教师未创建完成该测验
+        """
+        _client = self.client()
+        retries = 0
+        while retries < max_retries:
+            try:
+                _resp = await _client.get(
+                    self.WORK_URL,
+                    headers=self.WORK_HEADERS,
+                    params=self._work_params(_course, _job, _job_info),
+                )
+                questions = self._decode_work_page(_resp)
+                if questions:
+                    return _resp.text, questions
+
+                logger.warning(f"无效响应 (Code: {_resp.status_code}), 重试中... ({retries+1}/{max_retries})")
+
+            except httpx.HTTPError as e:
+                logger.warning(f"请求失败: {str(e)[:50]}, 重试中... ({retries+1}/{max_retries})")
+            retries += 1
+            await asyncio.sleep(delay * (2 ** retries))
+        raise MaxRetryExceeded(f"超过最大重试次数 ({max_retries})")
+
+    async def study_work(self, _course, _job, _job_info) -> StudyResult:
+        if self.tiku.DISABLE or not self.tiku:
+            return self.StudyResult.SUCCESS
+
+        try:
+            _html, questions = await self.fetch_work(_course, _job, _job_info)
+        except Exception as e:
+            logger.error(f"请求失败: {e}")
+            return self.StudyResult.ERROR
+
+        # 题库查询是同步实现, 放到线程中执行, 避免阻塞事件循环
+        found_answers = await asyncio.to_thread(self._answer_questions, questions, _html)
+        questions = self._build_work_form(questions, found_answers)
+
+        # 提交前将本次答题得到的答案写入缓存
+        await asyncio.to_thread(self.tiku.flush_cache)
+        logger.debug(f"答案缓存统计: {self.tiku.cache_stats()}")
+        logger.debug(f"题库接口状态: {self.tiku.health_stats()}")
+
+        res = await self.client().post(
+            self.WORK_SUBMIT_URL,
+            data=questions,
+            headers=self.WORK_SUBMIT_HEADERS,
+        )
+        return self._check_work_submit(res, questions["pyFlag"])
+
+    async def strdy_read(self, _course, _job, _job_info) -> StudyResult:
+        """
+        阅读任务学习, 仅完成任务点, 并不增长时长
+        """
+        _resp = await self.client().get(
+            "https://mooc1.chaoxing.com/ananas/job/readv2",
+            params={
+                "jobid": _job["jobid"],
+                "knowledgeid": _job_info["knowledgeid"],
+                "jtoken": _job["jtoken"],
+                "courseid": _course["courseId"],
+                "clazzid": _course["clazzId"],
+            },
+        )
+        if _resp.status_code != 200:
+            logger.error(f"阅读任务学习失败 -> [{_resp.status_code}]{_resp.text}")
+            return self.StudyResult.ERROR
+        _resp_json = _resp.json()
+        logger.info(f"阅读任务学习 -> {_resp_json['msg']}")
+        return self.StudyResult.SUCCESS
+
+    async def study_emptypage(self, _course, _chapterId):
+        _resp = await self.client().get(
+            "https://mooc1.chaoxing.com/mooc-ans/mycourse/studentstudyAjax",
+            params={
+                "courseId": _course["courseId"],
+                "clazzid": _course["clazzId"],
+                "chapterId": _chapterId['id'],
+                "cpi": 0,
+                "verificationcode": "",
+                "mooc2": 1,
+                "microTopicId": 0,
+                "editorPreview": 0,
+            },
+        )
+        if _resp.status_code != 200:
+            logger.error(f"空页面任务失败 -> [{_resp.status_code}]{_chapterId['title']}")
+            return self.StudyResult.ERROR
+        logger.info(f"空页面任务完成 -> {_chapterId['title']}")
+        return self.StudyResult.SUCCESS
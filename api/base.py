@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from enum import Enum
 from hashlib import md5
 
@@ -16,7 +19,8 @@ from api.decode import (
     decode_course_folder,
     decode_questions_info,
 )
-from api.process import show_progress
+from api.heartbeat import REPORT_TIMEOUT, HeartbeatResult, VideoHeartbeat, get_report_interval
+from api.process import progress
 from api.exceptions import MaxRetryExceeded
 
 
@@ -28,19 +32,57 @@ def get_random_seconds():
     return random.randint(30, 90)
 
 
-def init_session(isVideo: bool = False, isAudio: bool = False):
-    _session = requests.session()
-    _session.verify = False
-    _session.mount("http://", HTTPAdapter(max_retries=3))
-    _session.mount("https://", HTTPAdapter(max_retries=3))
-    if isVideo:
-        _session.headers = gc.VIDEO_HEADERS
-    elif isAudio:
-        _session.headers = gc.AUDIO_HEADERS
-    else:
-        _session.headers = gc.HEADERS
-    _session.cookies.update(use_cookies())
-    return _session
+class SessionManager:
+    """
+    会话管理器, 为每种请求头配置(default/video/audio)维护一个长期复用的会话,
+    同一主机的连接保持keep-alive, Cookie只在创建和刷新时从文件读取一次
+    """
+
+    PROFILES = {
+        "default": gc.HEADERS,
+        "video": gc.VIDEO_HEADERS,
+        "audio": gc.AUDIO_HEADERS,
+    }
+
+    def __init__(self, pool_maxsize: int = 16, cookies_path: str = None):
+        self.pool_maxsize = pool_maxsize
+        # Cookie文件路径, 留空使用默认的cookies.txt
+        self.cookies_path = cookies_path
+        # 所有会话共用同一个CookieJar, 刷新Cookie后立即对所有会话生效
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.reload_cookies()
+
+    def get(self, profile: str = "default") -> requests.Session:
+        """
+        获取指定请求头配置的会话, 单次请求需要的额外请求头通过headers参数传入即可
+        """
+        with self._lock:
+            _session = self._sessions.get(profile)
+            if _session is None:
+                _session = requests.session()
+                _session.verify = False
+                _adapter = HTTPAdapter(max_retries=3, pool_maxsize=self.pool_maxsize)
+                _session.mount("http://", _adapter)
+                _session.mount("https://", _adapter)
+                _session.headers.update(self.PROFILES[profile])
+                _session.cookies = self.cookies
+                self._sessions[profile] = _session
+            return _session
+
+    def reload_cookies(self):
+        """从Cookie文件重新加载Cookie, 登录后调用"""
+        _cookies = use_cookies(self.cookies_path)
+        self.cookies.clear()
+        if _cookies:
+            self.cookies.update(_cookies)
+
+    def close(self):
+        with self._lock:
+            for _session in self._sessions.values():
+                _session.close()
+            self._sessions.clear()
 
 
 class Account:
@@ -74,7 +116,26 @@ class Chaoxing:
         self.cipher = AESCipher()
         self.tiku = tiku
         self.kwargs = kwargs
-        self.rollback_times = 0
+        # 回滚次数按线程/协程任务分别记录, 多个课程并发学习时互不影响
+        self._rollback_times = ContextVar(f"rollback_times_{id(self)}", default=0)
+        self.session_manager = SessionManager(cookies_path=kwargs.get("cookies_path"))
+        # 账号身份信息, 首次使用时从Cookie读取, 刷新Cookie后失效
+        self._uid = None
+        self._fid = None
+        # 用于并发读取页面的线程池, 首次使用时创建
+        self.fetch_workers = max(1, int(kwargs.get("fetch_workers", 4)))
+        # 学习当前章节时向后预取的章节数, 0表示不预取
+        self.prefetch_depth = max(0, int(kwargs.get("prefetch_depth", 0)))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def rollback_times(self) -> int:
+        return self._rollback_times.get()
+
+    @rollback_times.setter
+    def rollback_times(self, value: int):
+        self._rollback_times.set(value)
 
     def login(self):
         _session = requests.session()
@@ -94,63 +155,115 @@ class Chaoxing:
         logger.trace("正在尝试登录...")
         resp = _session.post(_url, headers=gc.HEADERS, data=_data)
         if resp and resp.json()["status"] == True:
-            save_cookies(_session)
+            save_cookies(_session, self.session_manager.cookies_path)
+            self.refresh_cookies()
             logger.info("登录成功...")
             return {"status": True, "msg": "登录成功"}
         else:
             return {"status": False, "msg": str(resp.json()["msg2"])}
 
+    def refresh_cookies(self):
+        """重新加载Cookie, 并清除缓存的账号身份信息"""
+        self.session_manager.reload_cookies()
+        self._uid = None
+        self._fid = None
+
     def get_fid(self):
-        _session = init_session()
-        return _session.cookies.get("fid")
+        if self._fid is None:
+            self._fid = self.session_manager.cookies.get("fid")
+        return self._fid
 
     def get_uid(self):
-        _session = init_session()
-        return _session.cookies.get("_uid")
+        if self._uid is None:
+            self._uid = self.session_manager.cookies.get("_uid")
+        return self._uid
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.fetch_workers, thread_name_prefix="fetch"
+                )
+            return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session_manager.close()
+
+    COURSE_LIST_URL = "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/courselistdata"
+    INTERACTION_URL = "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/interaction"
+    # 接口突然抽风, 增加headers
+    COURSE_LIST_HEADERS = {
+        "Host": "mooc2-ans.chaoxing.com",
+        "sec-ch-ua-platform": '"Windows"',
+        "X-Requested-With": "XMLHttpRequest",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
+        "Accept": "text/html, */*; q=0.01",
+        "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "sec-ch-ua-mobile": "?0",
+        "Origin": "https://mooc2-ans.chaoxing.com",
+        "Sec-Fetch-Site": "same-origin",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Dest": "empty",
+        "Referer": "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/interaction?moocDomain=https://mooc1-1.chaoxing.com/mooc-ans",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
+    }
+
+    @staticmethod
+    def _post_course_list(_session, _url, _folder_id=0, _headers=None):
+        _data = {
+            "courseType": 1,
+            "courseFolderId": _folder_id,
+            "query": "",
+            "superstarClass": 0,
+        }
+        return _session.post(_url, headers=_headers, data=_data)
+
+    @staticmethod
+    def _merge_course_lists(_results):
+        # 按文件夹顺序合并, 同一课程只保留第一次出现的记录
+        course_list = []
+        _seen = set()
+        for _courses in _results:
+            for course in _courses:
+                if course["courseId"] in _seen:
+                    continue
+                _seen.add(course["courseId"])
+                course_list.append(course)
+        return course_list
 
     def get_course_list(self):
-        _session = init_session()
-        _url = "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/courselistdata"
-        _data = {"courseType": 1, "courseFolderId": 0, "query": "", "superstarClass": 0}
+        _session = self.session_manager.get()
+        _url = self.COURSE_LIST_URL
         logger.trace("正在读取所有的课程列表...")
-        # 接口突然抽风, 增加headers
-        _headers = {
-            "Host": "mooc2-ans.chaoxing.com",
-            "sec-ch-ua-platform": '"Windows"',
-            "X-Requested-With": "XMLHttpRequest",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
-            "Accept": "text/html, */*; q=0.01",
-            "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "sec-ch-ua-mobile": "?0",
-            "Origin": "https://mooc2-ans.chaoxing.com",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Dest": "empty",
-            "Referer": "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/interaction?moocDomain=https://mooc1-1.chaoxing.com/mooc-ans",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
-        }
-        _resp = _session.post(_url, headers=_headers, data=_data)
-        # logger.trace(f"原始课程列表内容:\n{_resp.text}")
+
+        def fetch_course_list(_folder_id=0, _extra_headers=None):
+            # 请求与解码都在线程池中完成
+            _resp = self._post_course_list(_session, _url, _folder_id, _extra_headers)
+            # logger.trace(f"原始课程列表内容:\n{_resp.text}")
+            return decode_course_list(_resp.text)
+
+        def fetch_course_folder():
+            _interaction_resp = _session.get(self.INTERACTION_URL)
+            return decode_course_folder(_interaction_resp.text)
+
+        # 根目录课程列表与文件夹列表同时读取
+        _root_future = self.executor.submit(fetch_course_list, 0, self.COURSE_LIST_HEADERS)
+        course_folder = self.executor.submit(fetch_course_folder).result()
+        _folder_futures = [
+            self.executor.submit(fetch_course_list, folder["id"])
+            for folder in course_folder
+        ]
+        _results = [_root_future.result()] + [_future.result() for _future in _folder_futures]
         logger.info("课程列表读取完毕...")
-        course_list = decode_course_list(_resp.text)
-
-        _interaction_url = "https://mooc2-ans.chaoxing.com/mooc2-ans/visit/interaction"
-        _interaction_resp = _session.get(_interaction_url)
-        course_folder = decode_course_folder(_interaction_resp.text)
-        for folder in course_folder:
-            _data = {
-                "courseType": 1,
-                "courseFolderId": folder["id"],
-                "query": "",
-                "superstarClass": 0,
-            }
-            _resp = _session.post(_url, data=_data)
-            course_list += decode_course_list(_resp.text)
-        return course_list
+
+        return self._merge_course_lists(_results)
 
     def get_course_point(self, _courseid, _clazzid, _cpi):
-        _session = init_session()
+        _session = self.session_manager.get()
         _url = f"https://mooc2-ans.chaoxing.com/mooc2-ans/mycourse/studentcourse?courseid={_courseid}&clazzid={_clazzid}&cpi={_cpi}&ut=s"
         logger.trace("开始读取课程所有章节...")
         _resp = _session.get(_url)
@@ -159,26 +272,37 @@ class Chaoxing:
         return decode_course_point(_resp.text)
 
     def get_job_list(self, _clazzid, _courseid, _cpi, _knowledgeid):
-        _session = init_session()
+        _session = self.session_manager.get()
         job_list = []
         job_info = {}
-        for _possible_num in [
-            "0",
-            "1",
-            "2",
-        ]:  # 学习界面任务卡片数, 很少有3个的, 但是对于章节解锁任务点少一个都不行, 可以从API /mooc-ans/mycourse/studentstudyAjax获取值, 或者干脆直接加, 但二者都会造成额外的请求
+
+        def fetch_card(_possible_num):
             _url = f"https://mooc1.chaoxing.com/mooc-ans/knowledge/cards?clazzid={_clazzid}&courseid={_courseid}&knowledgeid={_knowledgeid}&num={_possible_num}&ut=s&cpi={_cpi}&v=20160407-3&mooc2=1"
             logger.trace("开始读取章节所有任务点...")
             _resp = _session.get(_url)
-            _job_list, _job_info = decode_course_card(_resp.text)
+            return decode_course_card(_resp.text)
+
+        # 学习界面任务卡片数, 很少有3个的, 但是对于章节解锁任务点少一个都不行, 可以从API /mooc-ans/mycourse/studentstudyAjax获取值, 或者干脆直接加, 但二者都会造成额外的请求
+        # 先读取num=0, 章节未开放时直接返回, 不再请求其余卡片页
+        _job_list, _job_info = fetch_card("0")
+        if _job_info.get("notOpen", False):
+            logger.info("该章节未开放")
+            return [], _job_info
+        job_list += _job_list
+        job_info.update(_job_info)
+
+        # 其余卡片页并发读取, 按num顺序合并结果
+        _futures = [
+            self.executor.submit(fetch_card, _possible_num)
+            for _possible_num in ["1", "2"]
+        ]
+        for _future in _futures:
+            _job_list, _job_info = _future.result()
             if _job_info.get("notOpen", False):
-                # 直接返回, 节省一次请求
                 logger.info("该章节未开放")
                 return [], _job_info
             job_list += _job_list
             job_info.update(_job_info)
-            # if _job_list and len(_job_list) != 0:
-            #     break
         # logger.trace(f"原始任务点列表内容:\n{_resp.text}")
         logger.info("章节任务点读取成功...")
         return job_list, job_info
@@ -188,6 +312,35 @@ class Chaoxing:
             f"[{clazzId}][{userid}][{jobid}][{objectId}][{playingTime * 1000}][d_yHJ!$pdA~5][{duration * 1000}][0_{duration}]".encode()
         ).hexdigest()
 
+    def _video_log_url(
+        self, _course, _job, _dtoken, _duration, _playingTime, _rt, _type: str = "Video"
+    ) -> str:
+        if "courseId" in _job["otherinfo"]:
+            _mid_text = f"otherInfo={_job['otherinfo']}&"
+        else:
+            _mid_text = f"otherInfo={_job['otherinfo']}&courseId={_course['courseId']}&"
+        _uid = self.get_uid()
+        _enc = self.get_enc(_course['clazzId'], _job['jobid'], _job['objectid'], _playingTime, _duration, _uid)
+        return (
+            f"https://mooc1.chaoxing.com/mooc-ans/multimedia/log/a/"
+            f"{_course['cpi']}/"
+            f"{_dtoken}?"
+            f"clazzId={_course['clazzId']}&"
+            f"playingTime={_playingTime}&"
+            f"duration={_duration}&"
+            f"clipTime=0_{_duration}&"
+            f"objectId={_job['objectid']}&"
+            f"{_mid_text}"
+            f"jobid={_job['jobid']}&"
+            f"userid={_uid}&"
+            f"isdrag=3&"
+            f"view=pc&"
+            f"enc={_enc}&"
+            f"rt={_rt}&"
+            f"dtype={_type}&"
+            f"_t={get_timestamp()}"
+        )
+
     def video_progress_log(
         self,
         _session,
@@ -199,32 +352,12 @@ class Chaoxing:
         _playingTime,
         _type: str = "Video",
     ):
-        if "courseId" in _job["otherinfo"]:
-            _mid_text = f"otherInfo={_job['otherinfo']}&"
-        else:
-            _mid_text = f"otherInfo={_job['otherinfo']}&courseId={_course['courseId']}&"
         _success = False
         for _possible_rt in ["0.9", "1"]:
-            _url = (
-                f"https://mooc1.chaoxing.com/mooc-ans/multimedia/log/a/"
-                f"{_course['cpi']}/"
-                f"{_dtoken}?"
-                f"clazzId={_course['clazzId']}&"
-                f"playingTime={_playingTime}&"
-                f"duration={_duration}&"
-                f"clipTime=0_{_duration}&"
-                f"objectId={_job['objectid']}&"
-                f"{_mid_text}"
-                f"jobid={_job['jobid']}&"
-                f"userid={self.get_uid()}&"
-                f"isdrag=3&"
-                f"view=pc&"
-                f"enc={self.get_enc(_course['clazzId'], _job['jobid'], _job['objectid'], _playingTime, _duration, self.get_uid())}&"
-                f"rt={_possible_rt}&"
-                f"dtype={_type}&"
-                f"_t={get_timestamp()}"
+            _url = self._video_log_url(
+                _course, _job, _dtoken, _duration, _playingTime, _possible_rt, _type
             )
-            resp = _session.get(_url)
+            resp = _session.get(_url, timeout=REPORT_TIMEOUT)
             if resp.status_code == 200:
                 _success = True
                 break  # 如果返回为200正常, 则跳出循环
@@ -240,49 +373,41 @@ class Chaoxing:
         self, _course, _job, _job_info, _speed: float = 1.0, _type: str = "Video"
     ) -> StudyResult:
         if _type == "Video":
-            _session = init_session(isVideo=True)
+            _session = self.session_manager.get("video")
         else:
-            _session = init_session(isAudio=True)
-        _session.headers.update()
+            _session = self.session_manager.get("audio")
         _info_url = f"https://mooc1.chaoxing.com/ananas/status/{_job['objectid']}?k={self.get_fid()}&flag=normal"
-        _video_info = _session.get(_info_url).json()
+        _video_info = _session.get(_info_url, timeout=REPORT_TIMEOUT).json()
         if _video_info["status"] == "success":
             _dtoken = _video_info["dtoken"]
             _duration = _video_info["duration"]
             _crc = _video_info["crc"]
             _key = _video_info["key"]
-            _isPassed = False
-            _isFinished = False
-            _playingTime = 0
             logger.info(f"开始任务: {_job['name']}, 总时长: {_duration}秒")
-            state = 200
-            while not _isFinished:
-                if _isFinished:
-                    _playingTime = _duration
-                _isPassed, state = self.video_progress_log(
-                    _session,
-                    _course,
-                    _job,
-                    _job_info,
-                    _dtoken,
-                    _duration,
-                    _playingTime,
-                    _type,
-                )
-                if not _isPassed or (_isPassed and _isPassed["isPassed"]):
-                    break
-                if _isPassed and not _isPassed["isPassed"] and state == 403:
-                    return self.StudyResult.FORBIDDEN
-                _wait_time = get_random_seconds()
-                if _playingTime + _wait_time >= int(_duration):
-                    _wait_time = int(_duration) - _playingTime
-                    _isPassed, state = self.video_progress_log(_session, _course, _job, _job_info, _dtoken, _duration, _duration, _type)
-                    if _isPassed['isPassed']:
-                        _isFinished = True
-                # 播放进度条
-                show_progress(_job["name"], _playingTime, _wait_time, _duration, _speed)
-                _playingTime += _wait_time
-            print("\r", end="", flush=True)
+            # 进度由渲染线程统一显示, 这里只推送进度事件
+            _progress_id = progress.start(_job["name"], int(_duration), 0, _speed)
+            # 心跳上报由全局调度器驱动, 当前线程只需等待结果
+            _heartbeat = VideoHeartbeat(
+                lambda _playingTime: self.video_progress_log(
+                    _session, _course, _job, _job_info, _dtoken, _duration, _playingTime, _type
+                ),
+                _duration,
+                interval=get_report_interval(_job_info),
+                speed=_speed,
+                on_progress=lambda _playingTime: progress.advance(_progress_id, _playingTime),
+            )
+            try:
+                _heartbeat.start()
+                _result = _heartbeat.wait(_heartbeat.max_wait())
+                if _result is None:
+                    logger.warning(f"任务 {_job['name']} 的进度上报超时, 跳过当前任务点")
+            finally:
+                _heartbeat.cancel()
+                progress.finish(_progress_id)
+            if _result == HeartbeatResult.FORBIDDEN:
+                return self.StudyResult.FORBIDDEN
+            if _result != HeartbeatResult.PASSED:
+                return self.StudyResult.ERROR
             logger.info(f"任务完成: {_job['name']}")
             return self.StudyResult.SUCCESS
         else:
@@ -307,11 +432,11 @@ class Chaoxing:
 
         Note:
             This method requires the following helper functions:
-            - init_session(): To initialize a new session
+            - self.session_manager: To get the shared keep-alive session
             - get_timestamp(): To get current timestamp
             - re module for regular expression matching
         """
-        _session = init_session()
+        _session = self.session_manager.get()
         _url = f"https://mooc1.chaoxing.com/ananas/job/document?jobid={_job['jobid']}&knowledgeid={re.findall(r'nodeId_(.*?)-', _job['otherinfo'])[0]}&courseid={_course['courseId']}&clazzid={_course['clazzId']}&jtoken={_job['jtoken']}&_dc={get_timestamp()}"
         _resp = _session.get(_url)
         if _resp.status_code != 200:
@@ -319,269 +444,174 @@ class Chaoxing:
         else:
             return self.StudyResult.SUCCESS
 
-    def study_work(self, _course, _job, _job_info) -> StudyResult:
-        if self.tiku.DISABLE or not self.tiku:
-            return self.StudyResult.SUCCESS
-        _ORIGIN_HTML_CONTENT = ""  # 用于配合输出网页源码, 帮助修复#391错误
-
-        def random_answer(options: str) -> str:
-            answer = ""
-            if not options:
-                return answer
+    def _random_answer(self, q: dict, _html: str = "") -> str:
+        options = q["options"]
+        answer = ""
+        if not options:
+            return answer
 
-            if q["type"] == "multiple":
-                logger.debug(f"当前选项列表[cut前] -> {options}")
-                _op_list = multi_cut(options)
-                logger.debug(f"当前选项列表[cut后] -> {_op_list}")
+        if q["type"] == "multiple":
+            logger.debug(f"当前选项列表[cut前] -> {options}")
+            _op_list = self._multi_cut(options, _html)
+            logger.debug(f"当前选项列表[cut后] -> {_op_list}")
 
-                if not _op_list:
-                    logger.error(
-                        "选项为空, 未能正确提取题目选项信息! 请反馈并提供以上信息"
-                    )
-                    return answer
+            if not _op_list:
+                logger.error(
+                    "选项为空, 未能正确提取题目选项信息! 请反馈并提供以上信息"
+                )
+                return answer
 
-                available_options = len(_op_list)
-                select_count = 0
+            available_options = len(_op_list)
+            select_count = 0
+    
+            # 根据可用选项数量调整可能选择的选项数
+            if available_options <= 1:
+                select_count = available_options
+            else:
+                max_possible = min(4, available_options)
+                min_possible = min(2, available_options)
         
-                # 根据可用选项数量调整可能选择的选项数
-                if available_options <= 1:
-                    select_count = available_options
-                else:
-                    max_possible = min(4, available_options)
-                    min_possible = min(2, available_options)
-            
-                    weights_map = {
-                        2: [1.0],
-                        3: [0.3, 0.7],
-                        4: [0.1, 0.5, 0.4],
-                        5: [0.1, 0.4, 0.3, 0.2],
-                    }
-            
-                    weights = weights_map.get(max_possible, [0.3, 0.4, 0.3])
-                    possible_counts = list(range(min_possible, max_possible + 1))
-            
-                    weights = weights[:len(possible_counts)]
+                weights_map = {
+                    2: [1.0],
+                    3: [0.3, 0.7],
+                    4: [0.1, 0.5, 0.4],
+                    5: [0.1, 0.4, 0.3, 0.2],
+                }
+        
+                weights = weights_map.get(max_possible, [0.3, 0.4, 0.3])
+                possible_counts = list(range(min_possible, max_possible + 1))
+        
+                weights = weights[:len(possible_counts)]
+        
+                weights_sum = sum(weights)
+                if weights_sum > 0:
+                    weights = [w/weights_sum for w in weights]
             
-                    weights_sum = sum(weights)
-                    if weights_sum > 0:
-                        weights = [w/weights_sum for w in weights]
-                
-                    select_count = random.choices(possible_counts, weights=weights, k=1)[0]
+                select_count = random.choices(possible_counts, weights=weights, k=1)[0]
+
+            selected_options = random.sample(_op_list, select_count) if select_count > 0 else []
+
+            for option in selected_options:
+                answer += option[:1]  # 取首字为答案，例如A或B
+
+            answer = "".join(sorted(answer))
+        elif q["type"] == "single":
+            answer = random.choice(options.split("\n"))[
+                :1
+            ]  # 取首字为答案, 例如A或B
+        # 判断题处理
+        elif q["type"] == "judgement":
+            # answer = self.tiku.jugement_select(_answer)
+            answer = "true" if random.choice([True, False]) else "false"
+        logger.info(f"随机选择 -> {answer}")
+        return answer
+
+    @staticmethod
+    def _multi_cut(answer: str, _html: str = ""):
+        """
+        将多选题答案字符串按特定字符进行切割, 并返回切割后的答案列表
 
-                selected_options = random.sample(_op_list, select_count) if select_count > 0 else []
+        参数:
+        answer(str): 多选题答案字符串.
+        _html(str): 题目页面源码, 仅用于切割失败时输出, 帮助修复#391错误
 
-                for option in selected_options:
-                    answer += option[:1]  # 取首字为答案，例如A或B
+        返回:
+        list[str]: 切割后的答案列表, 如果无法切割, 则返回默认的选项列表None
 
+        注意:
+        如果无法从网页中提取题目信息, 将记录警告日志并返回None
+        """
+        # ',' 在常规被正确划分的, 选项中出现, 导致 multi_cut 无法正确划分选项 #391
+        # IndexError: Cannot choose from an empty sequence #391
+        # 同时为了避免没有考虑到的 case, 应该先按照 '\n' 匹配, 匹配不到再按照其他字符匹配, 切割符见answer_check.cut
+        res = cut(answer)
+        if res is None:
+            logger.warning(
+                f"未能从网页中提取题目信息, 以下为相关信息：\n\t{answer}\n\n{_html}\n"
+            )  # 尝试输出网页内容和选项信息
+            logger.warning("未能正确提取题目选项信息! 请反馈并提供以上信息")
+            return None
+        else:
+            return res
+
+    @staticmethod
+    def _clean_res(res):
+        cleaned_res = []
+        if isinstance(res, str):
+            res = [res]
+        for c in res:
+            cleaned_res.append(re.sub(r'^[A-Za-z]|[.,!?;:，。！？；：]', '', c))
+
+        return cleaned_res
+
+    @staticmethod
+    def _is_subsequence(a, o):
+        iter_o = iter(o)
+        return all(c in iter_o for c in a)
+
+    def _match_answer(self, q: dict, res, _html: str = "") -> str:
+        """根据题库响应结果选择对应的选项, 未能匹配时返回空字符串"""
+        answer = ""
+        if q["type"] == "multiple":
+            # 多选处理
+            options_list = self._multi_cut(q["options"], _html)
+            res_list = self._multi_cut(res, _html)
+            if res_list is not None and options_list is not None:
+                for _a in self._clean_res(res_list):
+                    for o in options_list:
+                        if (
+                                self._is_subsequence(_a, o)  # 去掉各种符号和前面ABCD的答案应当是选项的子序列
+                        ):
+                            answer += o[:1]
+                # 对答案进行排序, 否则会提交失败
                 answer = "".join(sorted(answer))
-            elif q["type"] == "single":
-                answer = random.choice(options.split("\n"))[
-                    :1
-                ]  # 取首字为答案, 例如A或B
-            # 判断题处理
-            elif q["type"] == "judgement":
-                # answer = self.tiku.jugement_select(_answer)
-                answer = "true" if random.choice([True, False]) else "false"
-            logger.info(f"随机选择 -> {answer}")
-            return answer
-
-        def multi_cut(answer: str):
-            """
-            将多选题答案字符串按特定字符进行切割, 并返回切割后的答案列表
-
-            参数:
-            answer(str): 多选题答案字符串.
-
-            返回:
-            list[str]: 切割后的答案列表, 如果无法切割, 则返回默认的选项列表None
-
-            注意:
-            如果无法从网页中提取题目信息, 将记录警告日志并返回None
-            """
-            # cut_char = [',','，','|','\n','\r','\t','#','*','-','_','+','@','~','/','\\','.','&',' ']    # 多选答案切割符
-            # ',' 在常规被正确划分的, 选项中出现, 导致 multi_cut 无法正确划分选项 #391
-            # IndexError: Cannot choose from an empty sequence #391
-            # 同时为了避免没有考虑到的 case, 应该先按照 '\n' 匹配, 匹配不到再按照其他字符匹配
-            cut_char = [
-                "\n",
-                ",",
-                "，",
-                "|",
-                "\r",
-                "\t",
-                "#",
-                "*",
-                "-",
-                "_",
-                "+",
-                "@",
-                "~",
-                "/",
-                "\\",
-                ".",
-                "&",
-                " ",
-                "、",
-            ]  # 多选答案切割符
-            res = cut(answer)
-            if res is None:
-                logger.warning(
-                    f"未能从网页中提取题目信息, 以下为相关信息：\n\t{answer}\n\n{_ORIGIN_HTML_CONTENT}\n"
-                )  # 尝试输出网页内容和选项信息
-                logger.warning("未能正确提取题目选项信息! 请反馈并提供以上信息")
-                return None
-            else:
-                return res
-
-        def clean_res(res):
-            cleaned_res = []
-            if isinstance(res, str):
-                res = [res]
-            for c in res:
-                cleaned_res.append(re.sub(r'^[A-Za-z]|[.,!?;:，。！？；：]', '', c))
-
-            return cleaned_res
-
-        def is_subsequence(a, o):
-            iter_o = iter(o)
-            return all(c in iter_o for c in a)
-
-        def with_retry(max_retries=3, delay=1):
-            def decorator(func):
-                def wrapper(*args, **kwargs):
-                    retries = 0
-                    while retries < max_retries:
-                        try:
-                            _resp = func(*args, **kwargs)
-                            
-                            # 未创建完成该测验则不进行答题，目前遇到的情况是未创建完成等同于没题目
-                            if '教师未创建完成该测验' in _resp.text:
-                                raise PermissionError("教师未创建完成该测验")
-
-                            questions = decode_questions_info(_resp.text)
-                    
-                            if _resp.status_code == 200 and questions.get("questions"):
-                                return (_resp, questions)
-                    
-                            logger.warning(f"无效响应 (Code: {getattr(_resp, 'status_code', 'Unknown')}), 重试中... ({retries+1}/{max_retries})")
-                
-                        except requests.exceptions.RequestException as e:
-                            logger.warning(f"请求失败: {str(e)[:50]}, 重试中... ({retries+1}/{max_retries})")
-                        retries += 1
-                        time.sleep(delay * (2 ** retries))
-                    raise MaxRetryExceeded(f"超过最大重试次数 ({max_retries})")
-                return wrapper
-            return decorator
-
-        # 学习通这里根据参数差异能重定向至两个不同接口, 需要定向至https://mooc1.chaoxing.com/mooc-ans/workHandle/handle
-        _session = init_session()
-        headers = {
-            "Host": "mooc1.chaoxing.com",
-            "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "Upgrade-Insecure-Requests": "1",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-Fetch-Mode": "navigate",
-            "Sec-Fetch-Dest": "iframe",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
-        }
-        cookies = _session.cookies.get_dict()
-
-        _url = "https://mooc1.chaoxing.com/mooc-ans/api/work"
-
-        @with_retry(max_retries=3, delay=1)
-        def fetch_response():
-            return requests.get(
-                    _url,
-                    headers=headers,
-                    cookies=cookies,
-                    verify=False,
-                    params={
-                        "api": "1",
-                        "workId": _job["jobid"].replace("work-", ""),
-                        "jobid": _job["jobid"],
-                        "originJobId": _job["jobid"],
-                        "needRedirect": "true",
-                        "skipHeader": "true",
-                        "knowledgeid": str(_job_info["knowledgeid"]),
-                        "ktoken": _job_info["ktoken"],
-                        "cpi": _job_info["cpi"],
-                        "ut": "s",
-                        "clazzId": _course["clazzId"],
-                        "type": "",
-                        "enc": _job["enc"],
-                        "mooc2": "1",
-                        "courseid": _course["courseId"],
-                    }
-            )
-
-        final_resp = {}
-        questions = {}
+            # else 如果分割失败那么就直接到下面去随机选
+        elif q["type"] == "single":
+            # 单选也进行切割，主要是防止返回的答案有异常字符
+            options_list = self._multi_cut(q["options"], _html)
+            if options_list is not None:
+                t_res = self._clean_res(res)
+                for o in options_list:
+                    if self._is_subsequence(t_res[0], o):
+                        answer = o[:1]
+                        break
+        elif q["type"] == "judgement":
+            answer = "true" if self.tiku.judgement_select(res) else "false"
+        elif q["type"] == "completion":
+            if isinstance(res,list):
+                answer = "".join(answer)
+            elif isinstance(res,str):
+                answer = res
+        else:
+            # 其他类型直接使用答案 （目前仅知有简答题，待补充处理）
+            answer = res
+        return answer
 
-        try:
-            final_resp, questions = fetch_response()
-        except Exception as e:
-            logger.error(f"请求失败: {e}")
-            return self.StudyResult.ERROR
-        
-        _ORIGIN_HTML_CONTENT = final_resp.text  # 用于配合输出网页源码, 帮助修复#391错误
+    def _answer_questions(self, questions: dict, _html: str = "") -> int:
+        """
+        搜题并填充所有题目的答案
 
-        # 搜题
-        total_questions = len(questions["questions"])
+        Returns:
+            题库覆盖的题目数
+        """
         found_answers = 0
         for q in questions["questions"]:
             logger.debug(f"当前题目信息 -> {q}")
-            # 添加搜题延迟 #428 - 默认0s延迟
-            query_delay = self.kwargs.get("query_delay",0)
-            time.sleep(query_delay)
-            res = self.tiku.query(q)
+        # 所有题目同时查询, 请求间隔由题库统一控制 #428
+        results = self.tiku.query_many(questions["questions"])
+        for q, res in zip(questions["questions"], results):
             answer = ""
             if not res:
                 # 随机答题
-                answer = random_answer(q["options"])
+                answer = self._random_answer(q, _html)
                 q[f'answerSource{q["id"]}'] = "random"
             else:
                 # 根据响应结果选择答案
-                if q["type"] == "multiple":
-                    # 多选处理
-                    options_list = multi_cut(q["options"])
-                    res_list = multi_cut(res)
-                    if res_list is not None and options_list is not None:
-                        for _a in clean_res(res_list):
-                            for o in options_list:
-                                if (
-                                        is_subsequence(_a, o)  # 去掉各种符号和前面ABCD的答案应当是选项的子序列
-                                ):
-                                    answer += o[:1]
-                        # 对答案进行排序, 否则会提交失败
-                        answer = "".join(sorted(answer))
-                    # else 如果分割失败那么就直接到下面去随机选
-                elif q["type"] == "single":
-                    # 单选也进行切割，主要是防止返回的答案有异常字符
-                    options_list = multi_cut(q["options"])
-                    if options_list is not None:
-                        t_res = clean_res(res)
-                        for o in options_list:
-                            if is_subsequence(t_res[0], o):
-                                answer = o[:1]
-                                break
-                elif q["type"] == "judgement":
-                    answer = "true" if self.tiku.judgement_select(res) else "false"
-                elif q["type"] == "completion":
-                    if isinstance(res,list):
-                        answer = "".join(answer)
-                    elif isinstance(res,str):
-                        answer = res
-                else:
-                    # 其他类型直接使用答案 （目前仅知有简答题，待补充处理）
-                    answer = res
+                answer = self._match_answer(q, res, _html)
 
                 if not answer:  # 检查 answer 是否为空
                     logger.warning(f"找到答案但答案未能匹配 -> {res}\t随机选择答案")
-                    answer = random_answer(q["options"])  # 如果为空，则随机选择答案
+                    answer = self._random_answer(q, _html)  # 如果为空，则随机选择答案
                     q[f'answerSource{q["id"]}'] = "random"
                 else:
                     logger.info(f"成功获取到答案：{answer}")
@@ -590,6 +620,11 @@ class Chaoxing:
             # 填充答案
             q["answerField"][f'answer{q["id"]}'] = answer
             logger.info(f'{q["title"]} 填写答案为 {answer}')
+        return found_answers
+
+    def _build_work_form(self, questions: dict, found_answers: int) -> dict:
+        """根据提交模式与题库覆盖率组建提交表单, 会移除questions中的题目列表"""
+        total_questions = len(questions["questions"])
         cover_rate = (found_answers / total_questions) * 100
         logger.info(f"章节检测题库覆盖率： {cover_rate:.0f}%")
         # 提交模式  现在与题库绑定,留空直接提交, 1保存但不提交
@@ -620,44 +655,159 @@ class Chaoxing:
                 )
 
         del questions["questions"]
+        return questions
+
+    # 学习通这里根据参数差异能重定向至两个不同接口, 需要定向至https://mooc1.chaoxing.com/mooc-ans/workHandle/handle
+    WORK_URL = "https://mooc1.chaoxing.com/mooc-ans/api/work"
+    WORK_HEADERS = {
+        "Host": "mooc1.chaoxing.com",
+        "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"Windows"',
+        "Upgrade-Insecure-Requests": "1",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "Sec-Fetch-Site": "same-origin",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Dest": "iframe",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
+    }
+    WORK_SUBMIT_URL = "https://mooc1.chaoxing.com/mooc-ans/work/addStudentWorkNew"
+    WORK_SUBMIT_HEADERS = {
+        "Host": "mooc1.chaoxing.com",
+        "sec-ch-ua-platform": '"Windows"',
+        "X-Requested-With": "XMLHttpRequest",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "sec-ch-ua-mobile": "?0",
+        "Origin": "https://mooc1.chaoxing.com",
+        "Sec-Fetch-Site": "same-origin",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Dest": "empty",
+        # "Referer": "https://mooc1.chaoxing.com/mooc-ans/work/doHomeWorkNew?courseId=246831735&workAnswerId=52680423&workId=37778125&api=1&knowledgeid=913820156&classId=107515845&oldWorkId=07647c38d8de4c648a9277c5bed7075a&jobid=work-07647c38d8de4c648a9277c5bed7075a&type=&isphone=false&submit=false&enc=1d826aab06d44a1198fc983ed3d243b1&cpi=338350298&mooc2=1&skipHeader=true&originJobId=work-07647c38d8de4c648a9277c5bed7075a",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
+    }
+
+    @staticmethod
+    def _work_params(_course, _job, _job_info) -> dict:
+        return {
+            "api": "1",
+            "workId": _job["jobid"].replace("work-", ""),
+            "jobid": _job["jobid"],
+            "originJobId": _job["jobid"],
+            "needRedirect": "true",
+            "skipHeader": "true",
+            "knowledgeid": str(_job_info["knowledgeid"]),
+            "ktoken": _job_info["ktoken"],
+            "cpi": _job_info["cpi"],
+            "ut": "s",
+            "clazzId": _course["clazzId"],
+            "type": "",
+            "enc": _job["enc"],
+            "mooc2": "1",
+            "courseid": _course["courseId"],
+        }
 
-        res = _session.post(
-            "https://mooc1.chaoxing.com/mooc-ans/work/addStudentWorkNew",
-            data=questions,
-            headers={
-                "Host": "mooc1.chaoxing.com",
-                "sec-ch-ua-platform": '"Windows"',
-                "X-Requested-With": "XMLHttpRequest",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",
-                "Accept": "application/json, text/javascript, */*; q=0.01",
-                "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
-                "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                "sec-ch-ua-mobile": "?0",
-                "Origin": "https://mooc1.chaoxing.com",
-                "Sec-Fetch-Site": "same-origin",
-                "Sec-Fetch-Mode": "cors",
-                "Sec-Fetch-Dest": "empty",
-                # "Referer": "https://mooc1.chaoxing.com/mooc-ans/work/doHomeWorkNew?courseId=246831735&workAnswerId=52680423&workId=37778125&api=1&knowledgeid=913820156&classId=107515845&oldWorkId=07647c38d8de4c648a9277c5bed7075a&jobid=work-07647c38d8de4c648a9277c5bed7075a&type=&isphone=false&submit=false&enc=1d826aab06d44a1198fc983ed3d243b1&cpi=338350298&mooc2=1&skipHeader=true&originJobId=work-07647c38d8de4c648a9277c5bed7075a",
-                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,ja;q=0.5",
-            },
-        )
+    @staticmethod
+    def _decode_work_page(_resp):
+        """解析章节检测页面, 页面无效时返回None"""
+        # 未创建完成该测验则不进行答题，目前遇到的情况是未创建完成等同于没题目
+        if '教师未创建完成该测验' in _resp.text:
+            raise PermissionError("教师未创建完成该测验")
+
+        questions = decode_questions_info(_resp.text)
+
+        if _resp.status_code == 200 and questions.get("questions"):
+            return questions
+        return None
+
+    def _check_work_submit(self, res, _py_flag: str) -> StudyResult:
+        _action = "提交" if _py_flag == "" else "保存"
         if res.status_code == 200:
             res_json = res.json()
             if res_json["status"]:
-                logger.info(f'{"提交" if questions["pyFlag"] == "" else "保存"}答题成功 -> {res_json["msg"]}')
+                logger.info(f'{_action}答题成功 -> {res_json["msg"]}')
             else:
-                logger.error(f'{"提交" if questions["pyFlag"] == "" else "保存"}答题失败 -> {res_json["msg"]}')
+                logger.error(f'{_action}答题失败 -> {res_json["msg"]}')
                 return self.StudyResult.ERROR
         else:
-            logger.error(f'{"提交" if questions["pyFlag"] == "" else "保存"}答题失败 -> {res.text}')
+            logger.error(f'{_action}答题失败 -> {res.text}')
             return self.StudyResult.ERROR
         return self.StudyResult.SUCCESS
 
+    def fetch_work(self, _course, _job, _job_info, max_retries: int = 3, delay: int = 1):
+        """
+        读取并解析章节检测页面
+
+        Returns:
+            (页面源码, 题目信息)
+
+        Raises:
+            MaxRetryExceeded: 超过最大重试次数
+            PermissionError: 教师未创建完成该测验
+        """
+        _session = self.session_manager.get()
+        retries = 0
+        while retries < max_retries:
+            try:
+                _resp = _session.get(
+                    self.WORK_URL,
+                    headers=self.WORK_HEADERS,
+                    params=self._work_params(_course, _job, _job_info),
+                )
+                questions = self._decode_work_page(_resp)
+                if questions:
+                    return _resp.text, questions
+
+                logger.warning(f"无效响应 (Code: {getattr(_resp, 'status_code', 'Unknown')}), 重试中... ({retries+1}/{max_retries})")
+
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"请求失败: {str(e)[:50]}, 重试中... ({retries+1}/{max_retries})")
+            retries += 1
+            time.sleep(delay * (2 ** retries))
+        raise MaxRetryExceeded(f"超过最大重试次数 ({max_retries})")
+
+    def study_work(self, _course, _job, _job_info, _prefetched: tuple = None) -> StudyResult:
+        """
+        完成章节检测, _prefetched为预取的(页面源码, 题目信息), 提供时不再重新读取页面
+        """
+        if self.tiku.DISABLE or not self.tiku:
+            return self.StudyResult.SUCCESS
+
+        if _prefetched:
+            _html, questions = _prefetched
+        else:
+            try:
+                # _html 用于配合输出网页源码, 帮助修复#391错误
+                _html, questions = self.fetch_work(_course, _job, _job_info)
+            except Exception as e:
+                logger.error(f"请求失败: {e}")
+                return self.StudyResult.ERROR
+
+        # 搜题
+        found_answers = self._answer_questions(questions, _html)
+        questions = self._build_work_form(questions, found_answers)
+
+        # 提交前将本次答题得到的答案写入缓存
+        self.tiku.flush_cache()
+        logger.debug(f"答案缓存统计: {self.tiku.cache_stats()}")
+        logger.debug(f"题库接口状态: {self.tiku.health_stats()}")
+
+        _session = self.session_manager.get()
+        res = _session.post(
+            self.WORK_SUBMIT_URL,
+            data=questions,
+            headers=self.WORK_SUBMIT_HEADERS,
+        )
+        return self._check_work_submit(res, questions["pyFlag"])
+
     def strdy_read(self, _course, _job, _job_info) -> StudyResult:
         """
         阅读任务学习, 仅完成任务点, 并不增长时长
         """
-        _session = init_session()
+        _session = self.session_manager.get()
         _resp = _session.get(
             url="https://mooc1.chaoxing.com/ananas/job/readv2",
             params={
@@ -677,7 +827,7 @@ class Chaoxing:
             return self.StudyResult.SUCCESS
 
     def study_emptypage(self, _course, _chapterId):
-        _session = init_session()
+        _session = self.session_manager.get()
         # &cpi=0&verificationcode=&mooc2=1&microTopicId=0&editorPreview=0
         _resp = _session.get(
             url="https://mooc1.chaoxing.com/mooc-ans/mycourse/studentstudyAjax",
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""
+答案缓存模块
+
+提供题目答案缓存的存储后端(JSON文件/SQLite数据库), 以及题库使用的统一访问对象CacheDAO。
+"""
+import atexit
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from api.exceptions import CacheClosedError
+from api.logger import logger
+
+
+class CacheBackend(ABC):
+    """
+    缓存存储后端基类, 自定义后端需要实现以下接口
+    """
+
+    @abstractmethod
+    def get(self, question: str) -> Optional[str]:
+        pass
+
+    def set(self, question: str, answer: str) -> None:
+        self.set_many([(question, answer)])
+
+    @abstractmethod
+    def set_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def has_keys_without_prefix(self, prefix: str) -> bool:
+        """是否存在不以prefix开头的键, 用于判断是否还有旧版缓存键"""
+        return any(not question.startswith(prefix) for question, _ in self.items())
+
+    def close(self) -> None:
+        pass
+
+
+class JsonCacheBackend(CacheBackend):
+    """
+    旧版JSON文件后端, 每次读写都会完整解析/重写整个文件, 仅适合很小的缓存
+    """
+
+    def __init__(self, file: str = "cache.json"):
+        self.cache_file = Path(file)
+        self._lock = threading.Lock()
+        if not self.cache_file.is_file():
+            self._write_cache({})
+
+    def _read_cache(self) -> dict:
+        try:
+            with self.cache_file.open("r", encoding="utf8") as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_cache(self, data: dict) -> None:
+        try:
+            with self.cache_file.open("w", encoding="utf8") as fp:
+                json.dump(data, fp, ensure_ascii=False, indent=4)
+        except IOError as e:
+            logger.error(f"Failed to write cache: {e}")
+
+    def get(self, question: str) -> Optional[str]:
+        return self._read_cache().get(question)
+
+    def set_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        with self._lock:
+            data = self._read_cache()
+            data.update(items)
+            self._write_cache(data)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        return iter(self._read_cache().items())
+
+    def __len__(self) -> int:
+        return len(self._read_cache())
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    SQLite后端, 使用WAL模式与主键索引, 查询开销不随缓存规模增长
+    """
+
+    def __init__(self, file: str = "cache.db"):
+        self.cache_file = Path(file)
+        self._lock = threading.Lock()
+        # 连接会在多个线程间共享, 由self._lock保证串行访问
+        self._conn = sqlite3.connect(
+            str(self.cache_file), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "question TEXT PRIMARY KEY, answer TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+
+    def get(self, question: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM cache WHERE question = ?", (question,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            # 批量写入放在同一个事务中, 只提交一次
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (question, answer) VALUES (?, ?)",
+                    items,
+                )
+
+    def items(self, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """按主键分页读取, 每页单独加锁, 遍历大缓存时不会一次读入内存, 也不会长时间占用连接"""
+        rows = []
+        while True:
+            with self._lock:
+                if rows:
+                    rows = self._conn.execute(
+                        "SELECT question, answer FROM cache WHERE question > ? ORDER BY question LIMIT ?",
+                        (rows[-1][0], page_size),
+                    ).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT question, answer FROM cache ORDER BY question LIMIT ?", (page_size,)
+                    ).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def has_keys_without_prefix(self, prefix: str) -> bool:
+        """结果记录在meta表中, 只有首次检查需要扫描缓存表"""
+        meta_key = f"unprefixed:{prefix}"
+        flag = self.get_meta(meta_key)
+        if flag is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT 1 FROM cache WHERE substr(question, 1, ?) != ? LIMIT 1",
+                    (len(prefix), prefix),
+                ).fetchone()
+            flag = "1" if row else "0"
+            self.set_meta(meta_key, flag)
+        return flag == "1"
+
+    def import_json(self, json_file: str) -> int:
+        """
+        一次性导入旧版cache.json, 已导入过的文件不会重复导入
+
+        Args:
+            json_file: 旧版JSON缓存文件路径
+
+        Returns:
+            本次导入的条目数
+        """
+        json_path = Path(json_file)
+        if not json_path.is_file():
+            return 0
+        meta_key = f"imported:{json_path.resolve()}"
+        if self.get_meta(meta_key):
+            return 0
+
+        try:
+            with json_path.open("r", encoding="utf8") as fp:
+                data: Dict[str, str] = json.load(fp)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"导入旧缓存文件失败: {json_path} - {e}")
+            return 0
+
+        # 已存在的答案优先, 旧文件中的条目不覆盖新数据
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO cache (question, answer) VALUES (?, ?)",
+                    (
+                        (q, a)
+                        for q, a in data.items()
+                        if isinstance(q, str) and isinstance(a, str)
+                    ),
+                )
+        self.set_meta(meta_key, str(len(data)))
+        # 导入的条目可能是旧版缓存键, 清除已记录的检查结果
+        with self._lock:
+            self._conn.execute("DELETE FROM meta WHERE key LIKE 'unprefixed:%'")
+        logger.info(f"已从 {json_path} 导入 {len(data)} 条缓存答案")
+        return len(data)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LRUCache:
+    """
+    线程安全的有界LRU缓存, 记录命中/未命中/淘汰次数用于评估容量
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+class CacheDAO:
+    """
+    @Author: SocialSisterYi
+    @Reference: https://github.com/SocialSisterYi/xuexiaoyi-to-xuexitong-tampermonkey-proxy
+    """
+    DEFAULT_CACHE_FILE = "cache.db"
+    LEGACY_CACHE_FILE = "cache.json"
+    DEFAULT_LRU_SIZE = 4096
+    DEFAULT_FLUSH_INTERVAL = 30.0
+    BACKENDS = {
+        "sqlite": SqliteCacheBackend,
+        "json": JsonCacheBackend,
+    }
+
+    def __init__(
+        self,
+        file: str = DEFAULT_CACHE_FILE,
+        backend: Optional[str] = None,
+        lru_size: int = DEFAULT_LRU_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        # 未指定后端时根据文件后缀判断, 兼容直接传入cache.json的旧用法
+        if not backend:
+            backend = "json" if str(file).endswith(".json") else "sqlite"
+        if backend not in self.BACKENDS:
+            raise ValueError(f"未知的缓存后端: {backend}")
+        self.backend: CacheBackend = self.BACKENDS[backend](file)
+        if isinstance(self.backend, SqliteCacheBackend):
+            self.backend.import_json(self.LEGACY_CACHE_FILE)
+
+        # 内存LRU层, 以及尚未写入后端的答案缓冲区
+        self.lru = LRUCache(lru_size)
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, str] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._prefix_checks: Dict[str, bool] = {}
+        # 进程退出时写回缓冲区, 避免丢失答案
+        atexit.register(self.close)
+
+    def get_cache(self, question: str) -> Optional[str]:
+        answer = self.lru.get(question)
+        if answer is not None:
+            return answer
+        with self._pending_lock:
+            answer = self._pending.get(question)
+        if answer is None:
+            answer = self.backend.get(question)
+        if answer is not None:
+            self.lru.put(question, answer)
+        return answer
+
+    def has_keys_without_prefix(self, prefix: str) -> bool:
+        """是否存在不以prefix开头的缓存键, 每个实例只检查一次"""
+        if prefix not in self._prefix_checks:
+            self._prefix_checks[prefix] = self.backend.has_keys_without_prefix(prefix)
+        return self._prefix_checks[prefix]
+
+    def add_cache(self, question: str, answer: str) -> None:
+        self.add_cache_many([(question, answer)])
+
+    def add_cache_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        Raises:
+            CacheClosedError: 缓存已关闭, 后端不再可写
+        """
+        with self._pending_lock:
+            # 与close共用锁, 关闭前加入的答案都会在close中写入后端
+            if self._closed:
+                raise CacheClosedError("答案缓存已关闭, 无法写入")
+            for question, answer in items:
+                self.lru.put(question, answer)
+                self._pending[question] = answer
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flush_thread()
+
+    def _ensure_flush_thread(self) -> None:
+        if self._flush_thread is not None or self._closed:
+            return
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="cache-flush", daemon=True
+        )
+        self._flush_thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        将缓冲区中的答案写入后端
+
+        Returns:
+            本次写入的条目数
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return 0
+                items = list(self._pending.items())
+            try:
+                self.backend.set_many(items)
+            except Exception as e:
+                logger.error(f"写入答案缓存失败: {e}")
+                return 0
+            with self._pending_lock:
+                # 只移除已写入且期间未被更新的条目
+                for question, answer in items:
+                    if self._pending.get(question) == answer:
+                        del self._pending[question]
+        logger.debug(f"已写入 {len(items)} 条缓存答案")
+        return len(items)
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.lru.stats()
+        with self._pending_lock:
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def close(self) -> None:
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stop_event.set()
+        self.flush()
+        logger.debug(f"答案缓存统计: {self.stats()}")
+        # 持有写入锁关闭后端, 避免与写入线程中的flush交错
+        with self._flush_lock:
+            self.backend.close()
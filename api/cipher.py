@@ -1,5 +1,9 @@
 # -*- coding:utf-8 -*-
 import base64
+import hashlib
+import hmac
+import os
+
 import pyaes
 from api.config import GlobalConst as gc
 
@@ -51,3 +55,39 @@ class AESCipher:
     #     for b in split_to_data_blocks(ciphertext):
     #         ptext = ptext + cbc.decrypt(b)
     #     return pkcs7_unpadding(ptext.decode())
+
+
+class CredentialCipher:
+    """
+    用配置的密钥加密保存的账号密码, 每次加密使用随机IV, 并附带HMAC校验
+
+    密文格式为 base64(IV + 密文 + HMAC-SHA256(IV + 密文))
+    """
+
+    def __init__(self, secret: str):
+        if not secret:
+            raise ValueError("未配置加密密钥")
+        master = hashlib.sha256(secret.encode("utf8")).digest()
+        self.key = hmac.new(master, b"encrypt", hashlib.sha256).digest()
+        self.mac_key = hmac.new(master, b"mac", hashlib.sha256).digest()
+
+    def encrypt(self, plaintext: str) -> str:
+        iv = os.urandom(16)
+        cbc = pyaes.AESModeOfOperationCBC(self.key, iv)
+        ciphertext = b"".join(
+            cbc.encrypt(b) for b in split_to_data_blocks(pkcs7_padding(plaintext.encode("utf-8")))
+        )
+        mac = hmac.new(self.mac_key, iv + ciphertext, hashlib.sha256).digest()
+        return base64.b64encode(iv + ciphertext + mac).decode("utf8")
+
+    def decrypt(self, token: str) -> str:
+        """密钥不匹配或密文被修改时抛出ValueError"""
+        data = base64.b64decode(token)
+        iv, ciphertext, mac = data[:16], data[16:-32], data[-32:]
+        if not ciphertext or len(ciphertext) % 16:
+            raise ValueError("密文格式错误")
+        if not hmac.compare_digest(mac, hmac.new(self.mac_key, iv + ciphertext, hashlib.sha256).digest()):
+            raise ValueError("密文校验失败, 请检查加密密钥")
+        cbc = pyaes.AESModeOfOperationCBC(self.key, iv)
+        plaintext = b"".join(cbc.decrypt(b) for b in split_to_data_blocks(ciphertext))
+        return plaintext[: -plaintext[-1]].decode("utf-8")
@@ -17,3 +17,7 @@ class GlobalConst:
         "Host": "mooc1.chaoxing.com",
     }
     THRESHOLD = 3
+    # 终端进度显示的最短刷新间隔, 单位秒
+    PROGRESS_REFRESH_INTERVAL = 0.5
+    # 非终端环境(如Docker日志)下, 同一任务的进度日志最短间隔, 单位秒
+    PROGRESS_LOG_INTERVAL = 60
@@ -4,13 +4,15 @@ import pickle
 from api.config import GlobalConst as gc
 
 
-def save_cookies(_session):
-    with open(gc.COOKIES_PATH, "wb") as f:
+def save_cookies(_session, path: str = None):
+    """保存会话Cookie, 多账号运行时通过path为每个账号指定独立的Cookie文件"""
+    with open(path or gc.COOKIES_PATH, "wb") as f:
         pickle.dump(_session.cookies, f)
 
 
-def use_cookies():
-    if os.path.exists(gc.COOKIES_PATH):
-        with open(gc.COOKIES_PATH, "rb") as f:
+def use_cookies(path: str = None):
+    path = path or gc.COOKIES_PATH
+    if os.path.exists(path):
+        with open(path, "rb") as f:
             _cookies = pickle.load(f)
         return _cookies
@@ -7,11 +7,15 @@
 import base64
 import hashlib
 import json
+import mmap
 import os
+import struct
 import sys
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, IO, Optional, Union
+from typing import Dict, IO, Optional, Tuple, Union
 
 from fontTools.ttLib.tables._g_l_y_f import Glyph, table__g_l_y_f
 from fontTools.ttLib.ttFont import TTFont
@@ -51,29 +55,99 @@ def resource_path(relative_path: str) -> str:
 class FontHashDAO:
     """
     字体哈希数据访问对象，负责管理字体哈希映射表
+
+    映射表使用预编译的二进制格式(见build_font_table)：按MD5摘要排序的定长记录，
+    每条记录为16字节摘要加4字节Unicode码位，通过内存映射读取并二分查找。
     """
 
-    def __init__(self, file_path: str = "resource/font_map_table.json"):
+    MAGIC = b"CXFT"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHI")  # 魔数, 版本, 保留, 记录数
+    RECORD = struct.Struct("<16sI")  # MD5摘要, Unicode码位
+
+    def __init__(self, file_path: str = "resource/font_map_table.bin"):
         """
         初始化字体哈希数据访问对象
 
         Args:
-            file_path: 字体映射表JSON文件路径，相对于资源目录
-        
+            file_path: 二进制字体映射表路径，相对于资源目录
+
         Raises:
-            FileNotFoundError: 当字体映射表文件不存在时
-            json.JSONDecodeError: 当字体映射表JSON格式错误时
+            FontDecodeError: 当字体映射表不存在或格式错误时
         """
-        self.char_map: Dict[str, str] = {}  # unicode -> hash
-        self.hash_map: Dict[str, str] = {}  # hash -> unicode
-        
         full_path = resource_path(file_path)
         try:
-            with open(full_path, "r", encoding="utf-8") as fp:
-                self.char_map = json.load(fp)
-                self.hash_map = {hash_val: char for char, hash_val in self.char_map.items()}
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open(full_path, "rb") as fp:
+                self._buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
             raise FontDecodeError(f"加载字体映射表失败: {full_path} - {e}") from e
+        self._count = self._check_header(self._buf, full_path)
+
+    @classmethod
+    def from_json(cls, file_path: str = "resource/font_map_table.json") -> "FontHashDAO":
+        """
+        直接从JSON映射表构建，用于二进制映射表缺失时的回退
+
+        Args:
+            file_path: 字体映射表JSON文件路径，相对于资源目录
+        """
+        dao = cls.__new__(cls)
+        dao._buf = build_font_table(resource_path(file_path))
+        dao._count = cls._check_header(dao._buf, file_path)
+        return dao
+
+    @classmethod
+    def empty(cls) -> "FontHashDAO":
+        """构建不包含任何记录的映射表"""
+        dao = cls.__new__(cls)
+        dao._buf = cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, 0)
+        dao._count = 0
+        return dao
+
+    @classmethod
+    def _check_header(cls, buf, path: str) -> int:
+        if len(buf) < cls.HEADER.size:
+            raise FontDecodeError(f"字体映射表格式错误: {path}")
+        magic, version, _, count = cls.HEADER.unpack_from(buf, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise FontDecodeError(f"字体映射表格式错误: {path}")
+        if len(buf) < cls.HEADER.size + count * cls.RECORD.size:
+            raise FontDecodeError(f"字体映射表数据不完整: {path}")
+        return count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def find_codepoint(self, font_hash: str) -> Optional[int]:
+        """
+        通过字体哈希值查找对应的Unicode码位
+
+        Args:
+            font_hash: 字体哈希值(32位十六进制MD5)
+
+        Returns:
+            对应的Unicode码位，如果未找到则返回None
+        """
+        try:
+            digest = bytes.fromhex(font_hash)
+        except ValueError:
+            return None
+
+        buf = self._buf
+        header_size = self.HEADER.size
+        record_size = self.RECORD.size
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = header_size + mid * record_size
+            current = buf[offset:offset + 16]
+            if current < digest:
+                lo = mid + 1
+            elif current > digest:
+                hi = mid
+            else:
+                return self.RECORD.unpack_from(buf, offset)[1]
+        return None
 
     def find_char(self, font_hash: str) -> Optional[str]:
         """
@@ -83,13 +157,14 @@ class FontHashDAO:
             font_hash: 字体哈希值
 
         Returns:
-            对应的Unicode字符编码，如果未找到则返回None
+            对应的Unicode字符编码 (如 "uni4E00")，如果未找到则返回None
         """
-        return self.hash_map.get(font_hash)
+        codepoint = self.find_codepoint(font_hash)
+        return f"uni{codepoint:X}" if codepoint is not None else None
 
     def find_hash(self, char: str) -> Optional[str]:
         """
-        通过Unicode字符编码查找对应的字体哈希值
+        通过Unicode字符编码查找对应的字体哈希值，需要遍历整个映射表，仅用于调试
 
         Args:
             char: Unicode字符编码 (如 "uni4E00")
@@ -97,17 +172,82 @@ class FontHashDAO:
         Returns:
             对应的字体哈希值，如果未找到则返回None
         """
-        return self.char_map.get(char)
+        try:
+            codepoint = int(char[3:], 16)
+        except (ValueError, IndexError):
+            return None
+        for i in range(self._count):
+            digest, current = self.RECORD.unpack_from(
+                self._buf, self.HEADER.size + i * self.RECORD.size
+            )
+            if current == codepoint:
+                return digest.hex()
+        return None
 
 
-# 初始化字体哈希DAO单例
-try:
-    fonthash_dao = FontHashDAO()
-except Exception as e:
-    logger.warning(f"初始化字体哈希数据失败 - {e}")
-    fonthash_dao = FontHashDAO.__new__(FontHashDAO)
-    fonthash_dao.char_map = {}
-    fonthash_dao.hash_map = {}
+def build_font_table(json_path: str) -> bytes:
+    """
+    将JSON字体映射表编译为FontHashDAO使用的二进制格式
+
+    与原先从JSON构建反向字典的行为保持一致：同一哈希对应多个字形时以最后一个为准，
+    只保留"uniXXXX"形式的字形，其余字形无法还原为字符，直接丢弃。
+
+    Args:
+        json_path: 字体映射表JSON文件路径
+
+    Returns:
+        二进制映射表内容
+    """
+    try:
+        with open(json_path, "r", encoding="utf-8") as fp:
+            char_map: Dict[str, str] = json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        raise FontDecodeError(f"加载字体映射表失败: {json_path} - {e}") from e
+
+    hash_map = {hash_val: char for char, hash_val in char_map.items()}
+    records = []
+    for hash_val, char in hash_map.items():
+        if not char.startswith("uni"):
+            continue
+        try:
+            digest, codepoint = bytes.fromhex(hash_val), int(char[3:], 16)
+        except ValueError:
+            continue
+        if len(digest) == 16 and codepoint <= sys.maxunicode:
+            records.append((digest, codepoint))
+    records.sort()
+
+    out = bytearray(FontHashDAO.HEADER.pack(FontHashDAO.MAGIC, FontHashDAO.VERSION, 0, len(records)))
+    for digest, codepoint in records:
+        out += FontHashDAO.RECORD.pack(digest, codepoint)
+    return bytes(out)
+
+
+_fonthash_dao: Optional[FontHashDAO] = None
+_fonthash_lock = threading.Lock()
+
+
+def get_fonthash_dao() -> FontHashDAO:
+    """
+    获取字体哈希DAO单例，首次调用时才加载映射表
+
+    Returns:
+        字体哈希DAO
+    """
+    global _fonthash_dao
+    if _fonthash_dao is None:
+        with _fonthash_lock:
+            if _fonthash_dao is None:
+                try:
+                    _fonthash_dao = FontHashDAO()
+                except FontDecodeError as e:
+                    logger.warning(f"{e}, 尝试从JSON映射表加载")
+                    try:
+                        _fonthash_dao = FontHashDAO.from_json()
+                    except Exception as e:
+                        logger.warning(f"初始化字体哈希数据失败 - {e}")
+                        _fonthash_dao = FontHashDAO.empty()
+    return _fonthash_dao
 
 
 def hash_glyph(glyph: Glyph) -> str:
@@ -174,40 +314,147 @@ def font2map(font_data: Union[IO, Path, str]) -> Dict[str, str]:
     return font_hashmap
 
 
+def build_translate_table(dst_fontmap: Dict[str, str]) -> Dict[int, int]:
+    """
+    根据目标字体的字形哈希映射表构建str.translate使用的转换表，并合并康熙部首替换
+    
+    Args:
+        dst_fontmap: 目标字体的字形哈希映射表
+    
+    Returns:
+        加密字符码位到原始字符码位的转换表
+    """
+    fonthash_dao = get_fonthash_dao()
+    # 未被加密的字符同样需要替换康熙部首
+    table: Dict[int, int] = dict(KX_RADICALS_TAB)
+
+    for char_code, dst_hash in dst_fontmap.items():
+        # 只处理 "uni4E00" 形式的字形名称
+        try:
+            encrypted_ord = int(char_code[3:], 16)
+        except ValueError:
+            continue
+        if not char_code.startswith("uni") or char_code != f"uni{encrypted_ord:X}":
+            continue
+
+        # 通过哈希值找回原始字符, 解密后的字符再做一次康熙部首替换
+        original_codepoint = fonthash_dao.find_codepoint(dst_hash)
+        if original_codepoint is not None:
+            table[encrypted_ord] = KX_RADICALS_TAB.get(original_codepoint, original_codepoint)
+
+    return table
+
+
 def decrypt(dst_fontmap: Dict[str, str], encrypted_text: str) -> str:
     """
     解密超星学习通加密字体的文本
+
+    同一字体需要解密多段文本时，应使用build_translate_table构建一次转换表后直接调用translate
     
     Args:
         dst_fontmap: 目标字体的字形哈希映射表
         encrypted_text: 加密的文本
     
     Returns:
-        解密后的文本
+        解密后的文本，无法解密的字符保留原字符
     """
-    result = []
-    
-    for char in encrypted_text:
-        # 构造Unicode字符名称 (如 "uni4E00")
-        char_code = f"uni{ord(char):X}"
-        
-        # 查找字符在目标字体中的哈希值
-        if char_code in dst_fontmap:
-            dst_hash = dst_fontmap[char_code]
-            # 通过哈希值找回原始字符
-            original_char_code = fonthash_dao.find_char(dst_hash)
-            if original_char_code:
-                # 将Unicode编码转换为字符
-                try:
-                    original_char = chr(int(original_char_code[3:], 16))
-                    result.append(original_char)
-                    continue
-                except (ValueError, IndexError):
-                    pass
-        
-        # 如果无法解密，则保留原字符
-        result.append(char)
-    
-    # 替换解密后的康熙部首
-    decrypted_text = "".join(result).translate(KX_RADICALS_TAB)
-    return decrypted_text
+    return encrypted_text.translate(build_translate_table(dst_fontmap))
+
+
+class FontMapCache:
+    """
+    按字体数据摘要缓存字体解析结果
+
+    平台反复使用少量加密字体，已解析过的字体只需计算一次摘要和一次查表，
+    无需再次解码TTF并逐个计算字形哈希。内存中保存字形映射表与转换表，
+    设置缓存目录后字形映射表还会写入磁盘，供之后的运行复用。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, maxsize: int = 64):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录，为None时只缓存在内存中
+            maxsize: 内存中最多缓存的字体数
+        """
+        self.cache_dir: Optional[Path] = None
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, Tuple[Dict[str, str], Dict[int, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir: Optional[str]) -> None:
+        """设置磁盘缓存目录"""
+        if not cache_dir:
+            self.cache_dir = None
+            return
+        self.cache_dir = Path(cache_dir)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"创建字体缓存目录失败, 仅使用内存缓存 - {e}")
+            self.cache_dir = None
+
+    @staticmethod
+    def digest(font_base64: str) -> str:
+        """计算Base64字体数据的摘要，作为缓存键"""
+        return hashlib.sha1(font_base64.encode()).hexdigest()
+
+    def get(self, font_base64: str) -> Tuple[Dict[str, str], Dict[int, int]]:
+        """
+        获取字体的字形映射表与转换表，未缓存时解析字体
+
+        Args:
+            font_base64: Base64编码的字体数据(不含data URL前缀)
+
+        Returns:
+            (字形哈希映射表, 转换表)
+
+        Raises:
+            FontDecodeError: 当无法解析字体数据时
+        """
+        key = self.digest(font_base64)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        font_map = self._load_from_disk(key)
+        if font_map is None:
+            font_map = font2map("data:application/font-ttf;charset=utf-8;base64," + font_base64)
+            self._save_to_disk(key, font_map)
+        entry = (font_map, build_translate_table(font_map))
+
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _load_from_disk(self, key: str) -> Optional[Dict[str, str]]:
+        if not self.cache_dir:
+            return None
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with path.open("r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.debug(f"读取字体缓存失败: {path} - {e}")
+            return None
+
+    def _save_to_disk(self, key: str, font_map: Dict[str, str]) -> None:
+        if not self.cache_dir:
+            return
+        path = self.cache_dir / f"{key}.json"
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as fp:
+                json.dump(font_map, fp)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"写入字体缓存失败: {path} - {e}")
+
+
+# 字体解析结果缓存单例
+font_map_cache = FontMapCache()
@@ -13,6 +13,38 @@ from api.logger import logger
 from api.font_decoder import FontDecoder
 
 
+# 可选的页面解析后端: bs4(BeautifulSoup, 默认) 或 lxml(lxml.etree + XPath, 见api.decode_lxml)
+PARSER_BACKENDS = ("bs4", "lxml")
+_parser_backend = "bs4"
+
+
+def set_parser_backend(backend: str) -> None:
+    """
+    设置页面解析后端
+    
+    Args:
+        backend: 解析后端名称, bs4 或 lxml
+        
+    Raises:
+        ValueError: 当解析后端名称未知时
+    """
+    global _parser_backend
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"未知的解析后端: {backend}, 可选项: {', '.join(PARSER_BACKENDS)}")
+    _parser_backend = backend
+
+
+def get_parser_backend() -> str:
+    """返回当前使用的页面解析后端"""
+    return _parser_backend
+
+
+def _lxml_backend():
+    # 延迟导入, api.decode_lxml 依赖本模块中的公共函数
+    from api import decode_lxml
+    return decode_lxml
+
+
 def decode_course_list(html_text: str) -> List[Dict[str, str]]:
     """
     解析课程列表页面，提取课程信息
@@ -23,6 +55,8 @@ def decode_course_list(html_text: str) -> List[Dict[str, str]]:
     Returns:
         课程信息列表，每个课程包含id、title、teacher等信息
     """
+    if _parser_backend == "lxml":
+        return _lxml_backend().decode_course_list(html_text)
     logger.trace("开始解码课程列表...")
     soup = BeautifulSoup(html_text, "lxml")
     raw_courses = soup.select("div.course")
@@ -59,6 +93,8 @@ def decode_course_folder(html_text: str) -> List[Dict[str, str]]:
     Returns:
         课程文件夹信息列表
     """
+    if _parser_backend == "lxml":
+        return _lxml_backend().decode_course_folder(html_text)
     logger.trace("开始解码二级课程列表...")
     soup = BeautifulSoup(html_text, "lxml")
     raw_courses = soup.select("ul.file-list>li")
@@ -87,6 +123,8 @@ def decode_course_point(html_text: str) -> Dict[str, Any]:
     Returns:
         章节信息字典，包含是否锁定状态和章节点列表
     """
+    if _parser_backend == "lxml":
+        return _lxml_backend().decode_course_point(html_text)
     logger.trace("开始解码章节列表...")
     soup = BeautifulSoup(html_text, "lxml")
     course_point = {
@@ -329,15 +367,17 @@ def decode_questions_info(html_content: str) -> Dict[str, Any]:
     Returns:
         包含表单数据和问题列表的字典
     """
+    if _parser_backend == "lxml":
+        return _lxml_backend().decode_questions_info(html_content)
     soup = BeautifulSoup(html_content, "lxml")
     form_data = _extract_form_data(soup)
     
-    # 检查是否存在字体加密
-    has_font_encryption = bool(soup.find("style", id="cxSecretStyle"))
+    # 检查是否存在字体加密, 直接使用已解析的样式标签, 避免再次解析页面
+    style_tag = soup.find("style", id="cxSecretStyle")
     font_decoder = None
     
-    if has_font_encryption:
-        font_decoder = FontDecoder(html_content)
+    if style_tag:
+        font_decoder = FontDecoder(style_text=style_tag.text)
     else:
         logger.warning("未找到字体文件，可能是未加密的题目不进行解密")
     
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+超星学习通数据解析模块的lxml实现
+
+直接基于lxml.etree与预编译的XPath表达式解析页面，返回结果与api.decode中
+基于BeautifulSoup的实现保持一致。通过api.decode.set_parser_backend("lxml")启用。
+"""
+import re
+from typing import List, Dict, Any
+
+from lxml import etree
+
+from api.decode import _get_question_type
+from api.font_decoder import FontDecoder
+from api.logger import logger
+
+
+def _has_class(name: str) -> str:
+    """生成匹配class属性中某个类名的XPath谓词, 与CSS类选择器语义一致"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 课程列表
+_COURSES = etree.XPath(f"//div[{_has_class('course')}]")
+_NOT_OPEN_TIP = etree.XPath(f".//a[{_has_class('not-open-tip')}] | .//div[{_has_class('not-open-tip')}]")
+_CLAZZ_ID = etree.XPath(f"(.//input[{_has_class('clazzId')}])[1]")
+_COURSE_ID = etree.XPath(f"(.//input[{_has_class('courseId')}])[1]")
+_FIRST_LINK = etree.XPath("(.//a)[1]")
+_COURSE_NAME = etree.XPath(f"(.//span[{_has_class('course-name')}])[1]")
+_COURSE_DESC = etree.XPath(f"(.//p[{_has_class('margint10')}])[1]")
+_COURSE_TEACHER = etree.XPath(f"(.//p[{_has_class('color3')}])[1]")
+
+# 二级课程列表
+_FOLDERS = etree.XPath(f"//ul[{_has_class('file-list')}]/li")
+_RENAME_INPUT = etree.XPath(f"(.//input[{_has_class('rename-input')}])[1]")
+
+# 章节列表
+_CHAPTER_UNITS = etree.XPath(f"//div[{_has_class('chapter_unit')}]")
+_CHAPTER_ITEMS = etree.XPath(".//li")
+_FIRST_DIV = etree.XPath("(.//div)[1]")
+_CLICK_TITLE = etree.XPath(f"(.//a[{_has_class('clicktitle')}])[1]")
+_JOB_COUNT = etree.XPath(f"(.//input[{_has_class('knowledgeJobCount')}])[1]")
+_HOVER_TIPS = etree.XPath(f"(.//span[{_has_class('bntHoverTips')}])[1]")
+
+# 题目
+_FORM = etree.XPath("(//form)[1]")
+_FORM_INPUTS = etree.XPath(".//input")
+_SECRET_STYLE = etree.XPath("(//style[@id='cxSecretStyle'])[1]")
+_QUESTIONS = etree.XPath(f".//div[{_has_class('singleQuesId')}]")
+_TIMU = etree.XPath(f"(.//div[{_has_class('TiMu')}])[1]")
+_TITLE_DIV = etree.XPath(f"(.//div[{_has_class('Zy_TItle')}])[1]")
+_FIRST_UL = etree.XPath("(.//ul)[1]")
+_OPTIONS = etree.XPath(".//li")
+_CONTENT_NODES = etree.XPath(".//text() | .//comment() | .//img")
+
+# 与BeautifulSoup的get_text一致, 不包含脚本/样式/模板中的文本
+_VISIBLE_TEXT = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+
+# BeautifulSoup会把只含ASCII空白的文本节点折叠为单个换行或空格, pre/textarea中除外
+_ASCII_SPACES = frozenset("\x20\x0a\x09\x0c\x0d")
+_PRESERVE_WHITESPACE = etree.XPath("ancestor-or-self::pre | ancestor-or-self::textarea")
+
+
+def _parse_html(html_text: str):
+    """解析HTML文本, 返回根节点, 空文档返回None"""
+    try:
+        return etree.HTML(html_text)
+    except ValueError:
+        # 带有编码声明的文本需要以字节形式解析
+        return etree.HTML(html_text.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+
+
+def _first(xpath, node):
+    """返回XPath查询的第一个结果, 没有结果时返回None"""
+    result = xpath(node)
+    return result[0] if result else None
+
+
+def _string(text) -> str:
+    """按BeautifulSoup的规则处理XPath返回的文本节点"""
+    if not text or not _ASCII_SPACES.issuperset(text):
+        return text
+    parent = text.getparent()
+    if text.is_tail:
+        parent = parent.getparent()
+    if parent is not None and _PRESERVE_WHITESPACE(parent):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _text(node) -> str:
+    return "".join(_string(text) for text in _VISIBLE_TEXT(node))
+
+
+def decode_course_list(html_text: str) -> List[Dict[str, str]]:
+    """
+    解析课程列表页面，提取课程信息
+
+    Args:
+        html_text: 课程列表页面的HTML内容
+
+    Returns:
+        课程信息列表，每个课程包含id、title、teacher等信息
+    """
+    logger.trace("开始解码课程列表...")
+    root = _parse_html(html_text)
+    if root is None:
+        return []
+    course_list = []
+
+    for course in _COURSES(root):
+        # 跳过未开放课程
+        if _NOT_OPEN_TIP(course):
+            continue
+
+        desc = _first(_COURSE_DESC, course)
+        course_detail = {
+            "id": course.attrib["id"],
+            "info": course.attrib["info"],
+            "roleid": course.attrib["roleid"],
+            "clazzId": _first(_CLAZZ_ID, course).attrib["value"],
+            "courseId": _first(_COURSE_ID, course).attrib["value"],
+            "cpi": re.findall(r"cpi=(.*?)&", _first(_FIRST_LINK, course).attrib["href"])[0],
+            "title": _first(_COURSE_NAME, course).attrib["title"],
+            "desc": desc.attrib["title"] if desc is not None else "",
+            "teacher": _first(_COURSE_TEACHER, course).attrib["title"]
+        }
+        course_list.append(course_detail)
+
+    return course_list
+
+
+def decode_course_folder(html_text: str) -> List[Dict[str, str]]:
+    """
+    解析二级课程列表页面，提取文件夹信息
+
+    Args:
+        html_text: 二级课程列表页面的HTML内容
+
+    Returns:
+        课程文件夹信息列表
+    """
+    logger.trace("开始解码二级课程列表...")
+    root = _parse_html(html_text)
+    if root is None:
+        return []
+    course_folder_list = []
+
+    for course in _FOLDERS(root):
+        if not course.get("fileid"):
+            continue
+
+        course_folder_detail = {
+            "id": course.attrib["fileid"],
+            "rename": _first(_RENAME_INPUT, course).attrib["value"]
+        }
+        course_folder_list.append(course_folder_detail)
+
+    return course_folder_list
+
+
+def decode_course_point(html_text: str) -> Dict[str, Any]:
+    """
+    解析章节列表页面，提取章节点信息
+
+    Args:
+        html_text: 章节列表页面的HTML内容
+
+    Returns:
+        章节信息字典，包含是否锁定状态和章节点列表
+    """
+    logger.trace("开始解码章节列表...")
+    root = _parse_html(html_text)
+    course_point = {
+        "hasLocked": False,  # 用于判断该课程任务是否是需要解锁
+        "points": [],
+    }
+    if root is None:
+        return course_point
+
+    for chapter_unit in _CHAPTER_UNITS(root):
+        points = _extract_points_from_chapter(chapter_unit)
+        # 检查是否有锁定内容
+        for point in points:
+            if point.get("need_unlock", False):
+                course_point["hasLocked"] = True
+
+        course_point["points"].extend(points)
+
+    return course_point
+
+
+def _extract_points_from_chapter(chapter_unit) -> List[Dict[str, Any]]:
+    """
+    从章节单元中提取章节点信息
+
+    Args:
+        chapter_unit: lxml元素，表示一个章节单元
+
+    Returns:
+        章节点信息列表
+    """
+    point_list = []
+
+    for raw_point in _CHAPTER_ITEMS(chapter_unit):
+        point = _first(_FIRST_DIV, raw_point)
+        if point is None or "id" not in point.attrib:
+            continue
+
+        point_id = re.findall(r"^cur(\d{1,20})$", point.attrib["id"])[0]
+        point_title = _text(_first(_CLICK_TITLE, point)).replace("\n", "").strip()
+
+        # 每个章节点只查询一次提示信息
+        job_count_input = _first(_JOB_COUNT, point)
+        hover_tips = _first(_HOVER_TIPS, point)
+        hover_text = _text(hover_tips) if hover_tips is not None else ""
+
+        # 提取任务数量
+        job_count = 1  # 默认为1
+        need_unlock = False
+        if job_count_input is not None:
+            job_count = job_count_input.attrib["value"]
+        elif "解锁" in hover_text:
+            need_unlock = True
+
+        # 判断是否已完成
+        is_finished = "已完成" in hover_text
+
+        point_detail = {
+            "id": point_id,
+            "title": point_title,
+            "jobCount": job_count,
+            "has_finished": is_finished,
+            "need_unlock": need_unlock
+        }
+        point_list.append(point_detail)
+
+    return point_list
+
+
+def decode_questions_info(html_content: str) -> Dict[str, Any]:
+    """
+    解析题目信息，提取表单数据和问题列表
+
+    Args:
+        html_content: 题目页面HTML内容
+
+    Returns:
+        包含表单数据和问题列表的字典
+    """
+    root = _parse_html(html_content)
+    form_tag = _first(_FORM, root) if root is not None else None
+    form_data = _extract_form_data(form_tag)
+
+    # 检查是否存在字体加密
+    style_tag = _first(_SECRET_STYLE, root) if root is not None else None
+    font_decoder = None
+
+    if style_tag is not None:
+        font_decoder = FontDecoder(style_text=style_tag.text or "")
+    else:
+        logger.warning("未找到字体文件，可能是未加密的题目不进行解密")
+
+    # 处理所有问题
+    questions = []
+    if form_tag is not None:
+        for div_tag in _QUESTIONS(form_tag):
+            question = _process_question(div_tag, font_decoder)
+            if question:
+                questions.append(question)
+
+    # 更新表单数据
+    form_data["questions"] = questions
+    form_data["answerwqbid"] = ",".join([q["id"] for q in questions]) + ","
+
+    return form_data
+
+
+def _extract_form_data(form_tag) -> Dict[str, Any]:
+    """从表单元素中提取表单数据"""
+    form_data = {}
+    if form_tag is None:
+        return form_data
+
+    # 提取所有非答案字段的input
+    for input_tag in _FORM_INPUTS(form_tag):
+        name = input_tag.get("name")
+        if name is None or "answer" in name:
+            continue
+        form_data[name] = input_tag.get("value", "")
+
+    return form_data
+
+
+def _process_question(div_tag, font_decoder=None) -> Dict[str, Any]:
+    """处理单个问题"""
+    # 提取问题ID和题目类型
+    question_id = div_tag.get("data", "")
+    timu = _first(_TIMU, div_tag)
+    q_type_code = timu.get("data", "") if timu is not None else ""
+    q_type = _get_question_type(q_type_code)
+
+    # 提取题目内容和选项
+    title_div = _first(_TITLE_DIV, div_tag)
+    options_ul = _first(_FIRST_UL, div_tag)
+    options_list = _OPTIONS(options_ul) if options_ul is not None else []
+
+    # 解析题目和选项
+    q_title = _extract_content(title_div, font_decoder)
+    q_options = "\n".join([_extract_content(li, font_decoder) for li in options_list])
+
+    return {
+        "id": question_id,
+        "title": q_title,
+        "options": q_options,
+        "type": q_type,
+        "answerField": {
+            f"answer{question_id}": "",
+            f"answertype{question_id}": q_type_code,
+        },
+    }
+
+
+def _extract_content(element, font_decoder=None) -> str:
+    """提取元素内容，支持解码加密字体"""
+    if element is None:
+        return ""
+
+    # 按文档顺序收集元素中的所有文本(含注释)和图片
+    content = []
+    for item in _CONTENT_NODES(element):
+        if isinstance(item, str):
+            content.append(_string(item))
+        elif item.tag is etree.Comment:
+            content.append(item.text or "")
+        else:
+            content.append(f'<img src="{item.get("src", "")}">')
+
+    raw_content = "".join(content)
+    cleaned_content = raw_content.replace("\r", "").replace("\t", "").replace("\n", "")
+
+    # 如果有字体解码器，进行解码
+    if font_decoder:
+        return font_decoder.decode(cleaned_content)
+
+    return cleaned_content
@@ -27,3 +27,8 @@ class MaxRetryExceeded(Exception):
 class FontDecodeError(Exception):
     def __init__(self, *args: object):
         super().__init__(*args)
+
+
+class CacheClosedError(Exception):
+    def __init__(self, *args: object):
+        super().__init__(*args)
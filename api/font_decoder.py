@@ -1,4 +1,3 @@
-from bs4 import BeautifulSoup
 import re
 from typing import Dict, Optional
 
@@ -16,42 +15,71 @@ class FontDecoder:
     # 正则表达式常量
     FONT_BASE64_PATTERN = r"base64,([\w\W]+?)\'"
     FONT_DATA_URL_PREFIX = "data:application/font-ttf;charset=utf-8;base64,"
+    STYLE_TAG_PATTERN = re.compile(
+        r"<style[^>]*\bid=[\"']?cxSecretStyle\b[^>]*>(.*?)</style>", re.S | re.I
+    )
     
-    def __init__(self, html_content: Optional[str] = None):
+    def __init__(
+        self,
+        html_content: Optional[str] = None,
+        style_text: Optional[str] = None,
+        font_base64: Optional[str] = None,
+    ):
         """初始化字体解码器。
+
+        三个参数任选其一。已经解析过页面时应传入style_text或font_base64，
+        避免为了查找字体再次解析整个页面。
         
         Args:
             html_content: 包含加密字体信息的HTML内容
+            style_text: cxSecretStyle样式标签的文本内容
+            font_base64: Base64编码的字体数据
         """
         self.html_content = html_content
         self.__font_map: Optional[Dict] = None
+        self.__translate_table: Optional[Dict[int, int]] = None
         
-        if html_content:
-            self.__init_font_map(html_content)
+        if font_base64:
+            self.__init_font_map(font_base64)
+        elif style_text:
+            self.__init_font_map(self.__extract_font_base64(style_text))
+        elif html_content:
+            self.__init_font_map(self.__extract_font_base64(self.__find_style_text(html_content)))
+
+    def __find_style_text(self, html_content: str) -> Optional[str]:
+        """在HTML内容中直接定位cxSecretStyle样式标签, 不构建文档树。"""
+        match = self.STYLE_TAG_PATTERN.search(html_content)
+        return match.group(1) if match else None
+
+    def __extract_font_base64(self, style_text: Optional[str]) -> Optional[str]:
+        """从样式文本中提取Base64编码的字体数据。"""
+        if not style_text:
+            logger.warning("初始化字体映射失败: 未找到加密字体样式标签")
+            return None
+
+        match = re.search(self.FONT_BASE64_PATTERN, style_text)
+        if not match:
+            logger.warning("初始化字体映射失败: 无法从样式标签中提取字体数据")
+            return None
+        return match.group(1)
     
-    def __init_font_map(self, html_content: str) -> None:
-        """从HTML内容中提取字体信息并初始化字体映射。
+    def __init_font_map(self, font_base64: Optional[str]) -> None:
+        """根据字体数据初始化字体映射。
         
         Args:
-            html_content: 包含加密字体信息的HTML内容
+            font_base64: Base64编码的字体数据
         """
+        self.__font_map = None
+        self.__translate_table = None
+        if not font_base64:
+            return
         try:
-            soup = BeautifulSoup(html_content, "lxml")
-            style_tag = soup.find("style", id="cxSecretStyle")
-            
-            if not style_tag or not style_tag.text:
-                raise FontDecodeError("未找到加密字体样式标签")
-
-            match = re.search(self.FONT_BASE64_PATTERN, style_tag.text)
-            if not match:
-                raise FontDecodeError("无法从样式标签中提取字体数据")
-
-            font_base64 = match.group(1)
-            font_data_url = self.FONT_DATA_URL_PREFIX + font_base64
-            self.__font_map = cxfont.font2map(font_data_url)
+            # 已解析过的字体直接从缓存获取, 每个字体只构建一次转换表
+            self.__font_map, self.__translate_table = cxfont.font_map_cache.get(font_base64)
         except Exception as e:
             logger.warning(f"初始化字体映射失败: {e}")
             self.__font_map = None
+            self.__translate_table = None
     
     def decode(self, target_str: str) -> str:
         """解码加密字符串。
@@ -68,7 +96,7 @@ class FontDecoder:
         if not self.__font_map:
             raise FontDecodeError("字体映射未初始化，无法解码")
 
-        return cxfont.decrypt(self.__font_map, target_str)
+        return target_str.translate(self.__translate_table)
     
     def set_html_content(self, html_content: str) -> None:
         """设置新的HTML内容并重新初始化字体映射。
@@ -77,4 +105,4 @@ class FontDecoder:
             html_content: 包含加密字体信息的HTML内容
         """
         self.html_content = html_content
-        self.__init_font_map(html_content)
+        self.__init_font_map(self.__extract_font_base64(self.__find_style_text(html_content)))
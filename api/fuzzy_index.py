@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+答案缓存的相似题目索引
+
+缓存未命中的题目中, 有不少与已缓存的题目只差个别错字、语序或题号。这里对缓存键中的规范化标题
+按字符二元组计算MinHash签名, 分段(band)后存入SQLite, 查询时只需按段哈希查找候选题目,
+再计算候选与当前题目的Jaccard相似度, 超过阈值且题型与选项一致时使用其答案。
+
+只差一个"不"字的两道题答案往往相反, 因此判断题与填空题不参与匹配, 题干的差异部分含有否定/判断词时
+也不使用候选题目。
+
+索引完全离线, 查询耗时与索引规模基本无关。首次使用时在后台线程中为已有缓存建立索引。
+"""
+import hashlib
+import random
+import sqlite3
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from api.logger import logger
+from api.question_key import KEY_VERSION, parse_cache_key
+
+DEFAULT_INDEX_FILE = "cache_fuzzy.db"
+DEFAULT_THRESHOLD = 0.8
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+# 每个段最多取出的候选数, 避免极短标题等热点段拖慢查询
+MAX_BUCKET_CANDIDATES = 64
+# 答案取决于题干细节的题型, 不使用相似题目的答案
+EXCLUDED_TYPES = frozenset(("judgement", "completion"))
+# 出现在题干差异部分时会改变题意的否定/判断词
+POLARITY_TOKENS = ("不", "非", "没", "无", "未", "否", "错误", "正确")
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+# 固定种子, 保证不同进程和多次运行得到相同的签名
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str) -> set:
+    """字符二元组集合, 过短的文本整体作为一个元素"""
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def polarity_changed(a: set, b: set) -> bool:
+    """两个二元组集合的差异部分是否含有否定/判断词"""
+    return any(token in item for item in a ^ b for token in POLARITY_TOKENS)
+
+
+def minhash(items: set) -> List[int]:
+    hashes = [zlib.crc32(item.encode("utf-8")) for item in items]
+    return [min(((a * h + b) % _PRIME) & _MASK for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_hashes(signature: List[int]) -> List[int]:
+    """每段签名的64位哈希, 作为SQLite中的整数键"""
+    result = []
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS])
+        result.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "little", signed=True))
+    return result
+
+
+class FuzzyIndex:
+    """
+    基于MinHash/LSH的相似题目索引
+
+    Args:
+        path: 索引文件路径
+        threshold: 标题的最低Jaccard相似度
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_FILE, threshold: float = DEFAULT_THRESHOLD):
+        self.path = Path(path)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fuzzy_entries ("
+            "id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, q_type TEXT NOT NULL, "
+            "title TEXT NOT NULL, fingerprint TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fuzzy_bands ("
+            "band INTEGER NOT NULL, hash INTEGER NOT NULL, entry_id INTEGER NOT NULL, "
+            "PRIMARY KEY (band, hash, entry_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._closed = False
+
+    def add(self, key: str) -> None:
+        self.add_many([key])
+
+    def add_many(self, keys: Iterable[str]) -> int:
+        """将缓存键加入索引, 已存在、非当前版本或不参与匹配的题型的键会被忽略, 返回新加入的条目数"""
+        rows = []
+        for key in keys:
+            parsed = parse_cache_key(key)
+            if parsed is None or parsed[0] in EXCLUDED_TYPES:
+                continue
+            q_type, title, fingerprint = parsed
+            items = shingles(title)
+            if items:
+                rows.append((key, q_type, title, fingerprint, band_hashes(minhash(items))))
+        if not rows:
+            return 0
+        added = 0
+        with self._lock:
+            if self._closed:
+                return 0
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for key, q_type, title, fingerprint, bands in rows:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO fuzzy_entries (key, q_type, title, fingerprint) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, q_type, title, fingerprint),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO fuzzy_bands (band, hash, entry_id) VALUES (?, ?, ?)",
+                        ((band, value, cursor.lastrowid) for band, value in enumerate(bands)),
+                    )
+                    added += 1
+        return added
+
+    def lookup(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        查找与缓存键对应题目最相似的已索引题目
+
+        Returns:
+            (已索引题目的缓存键, 标题相似度), 没有题型与选项一致且相似度达到阈值的题目时返回None
+        """
+        parsed = parse_cache_key(key)
+        if parsed is None or parsed[0] in EXCLUDED_TYPES:
+            return None
+        q_type, title, fingerprint = parsed
+        items = shingles(title)
+        if not items:
+            return None
+        bands = band_hashes(minhash(items))
+        with self._lock:
+            if self._closed:
+                return None
+            ids = set()
+            for band, value in enumerate(bands):
+                ids.update(row[0] for row in self._conn.execute(
+                    "SELECT entry_id FROM fuzzy_bands WHERE band = ? AND hash = ? LIMIT ?",
+                    (band, value, MAX_BUCKET_CANDIDATES),
+                ))
+            if not ids:
+                return None
+            candidates = self._conn.execute(
+                f"SELECT key, title FROM fuzzy_entries WHERE id IN ({','.join('?' * len(ids))}) "
+                "AND q_type = ? AND fingerprint = ? AND key != ?",
+                (*ids, q_type, fingerprint, key),
+            ).fetchall()
+
+        best = None
+        for candidate_key, candidate_title in candidates:
+            candidate_items = shingles(candidate_title)
+            similarity = jaccard(items, candidate_items)
+            if similarity < self.threshold or (best is not None and similarity <= best[1]):
+                continue
+            if polarity_changed(items, candidate_items):
+                continue
+            best = (candidate_key, similarity)
+        return best
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fuzzy_entries").fetchone()[0]
+
+    def build_from(self, items: Iterable[Tuple[str, str]], batch_size: int = 1000) -> None:
+        """
+        为已有的缓存建立索引, 每个索引文件只执行一次
+
+        Args:
+            items: 缓存后端的(缓存键, 答案)迭代器
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        if row:
+            return
+        total = 0
+        batch = []
+        for key, _ in items:
+            if not key.startswith(f"{KEY_VERSION}|"):
+                continue
+            batch.append(key)
+            if len(batch) >= batch_size:
+                total += self.add_many(batch)
+                batch = []
+                if self._closed:
+                    return
+        total += self.add_many(batch)
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', ?)", (str(total),))
+        if total:
+            logger.info(f"已为 {total} 条缓存答案建立相似题目索引")
+
+    def build_in_background(self, items: Callable[[], Iterable[Tuple[str, str]]]) -> threading.Thread:
+        """在后台线程中为已有缓存建立索引, 期间的查询只能找到已索引的题目"""
+        def run():
+            try:
+                self.build_from(items())
+            except Exception as e:
+                logger.error(f"建立相似题目索引失败: {type(e).__name__}: {e}")
+
+        thread = threading.Thread(target=run, name="fuzzy-index", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._conn.close()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+视频心跳上报调度
+
+上报间隔取自章节卡片的reportTimeInterval(视频时间, 秒), 按播放倍速折算为实际等待时间。
+最后一次常规上报与"已看完"上报合并为一次, 在视频播放到结尾时以总时长上报。
+
+所有视频的心跳共用一个调度线程计时, 到期的上报交给线程池执行, 不再需要每个视频占用一个线程等待,
+个别上报请求阻塞也不会拖住其他视频的心跳。异步客户端使用run_async在事件循环中上报。
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Optional, Tuple
+
+from api.logger import logger
+
+# 章节卡片未提供上报间隔时使用的默认值, 与decode中的默认值一致
+DEFAULT_REPORT_INTERVAL = 60
+# 视频已播放到结尾但服务器仍未判定完成时, 最多额外上报的次数
+MAX_FINAL_REPORTS = 3
+# 单次上报请求的超时时间(秒)
+REPORT_TIMEOUT = 30
+
+
+class HeartbeatResult(Enum):
+    PASSED = 0  # 服务器判定视频已完成
+    FORBIDDEN = 1  # 403
+    ERROR = 2
+
+
+def get_report_interval(job_info: dict) -> int:
+    """从章节任务信息中读取上报间隔(视频时间, 秒)"""
+    try:
+        interval = int(job_info.get("reportTimeInterval") or DEFAULT_REPORT_INTERVAL)
+    except (TypeError, ValueError):
+        interval = DEFAULT_REPORT_INTERVAL
+    return interval if interval > 0 else DEFAULT_REPORT_INTERVAL
+
+
+class HeartbeatScheduler:
+    """
+    定时调度器, 调度线程按到期时间依次将回调提交到线程池执行
+
+    需要周期执行的任务在回调中再次调用call_later即可。
+
+    Args:
+        max_workers: 同时执行回调的最大线程数
+    """
+
+    def __init__(self, max_workers: int = 16):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="heartbeat-report")
+
+    def call_later(self, delay: float, callback: Callable[[], None]):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, callback = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+            self._executor.submit(self._call, callback)
+
+    @staticmethod
+    def _call(callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"心跳任务执行出错: {type(e).__name__}: {e}")
+
+
+# 全局心跳调度器, 所有视频共用
+scheduler = HeartbeatScheduler()
+
+
+class VideoHeartbeat:
+    """
+    单个视频的心跳上报状态
+
+    Args:
+        report: 上报函数, 参数为当前播放位置(秒), 返回(响应数据, 状态码), 使用run_async时为协程函数
+        duration: 视频总时长(秒)
+        interval: 上报间隔(视频时间, 秒)
+        speed: 播放倍速
+        on_progress: 每次上报后调用, 参数为当前播放位置
+    """
+
+    def __init__(
+        self,
+        report: Callable[[int], Tuple[dict, int]],
+        duration: int,
+        interval: int = DEFAULT_REPORT_INTERVAL,
+        speed: float = 1.0,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ):
+        self.report = report
+        self.duration = int(duration)
+        self.interval = interval
+        self.speed = speed
+        self.on_progress = on_progress
+        self.position = 0
+        self.reports = 0
+        self._final_reports = 0
+        self.result: Optional[HeartbeatResult] = None
+        self._done = threading.Event()
+        self._cancelled = False
+
+    def handle(self, resp: dict, state: int) -> Optional[HeartbeatResult]:
+        """处理一次上报的响应, 任务结束时返回结果, 否则返回None"""
+        self.reports += 1
+        if not resp or resp.get("isPassed"):
+            return HeartbeatResult.PASSED
+        if state == 403:
+            return HeartbeatResult.FORBIDDEN
+        if self.position >= self.duration:
+            self._final_reports += 1
+            if self._final_reports > MAX_FINAL_REPORTS:
+                logger.warning(f"视频已播放完毕, 但{MAX_FINAL_REPORTS}次上报后仍未判定完成")
+                return HeartbeatResult.ERROR
+        return None
+
+    def advance(self) -> float:
+        """推进到下一个上报位置, 返回需要等待的实际时间(秒)"""
+        remaining = self.duration - self.position
+        if remaining <= 0:
+            # 已播放到结尾, 按间隔重试最终上报
+            return self.interval / self.speed
+        step = min(self.interval, remaining)
+        self.position += step
+        return step / self.speed
+
+    def max_wait(self) -> float:
+        """
+        等待上报结束的最长时间(秒)
+
+        包括按倍速播放完整个视频、播放结束后的额外上报, 以及每次上报请求(两种rt参数各一次)的超时时间
+        """
+        reports = math.ceil(self.duration / self.interval) + 1 + MAX_FINAL_REPORTS
+        return (
+            self.duration / self.speed
+            + (MAX_FINAL_REPORTS + 1) * self.interval / self.speed
+            + reports * 2 * REPORT_TIMEOUT
+        )
+
+    def start(self, _scheduler: HeartbeatScheduler = None):
+        """在调度器中开始上报, 第一次上报立即执行"""
+        (_scheduler or scheduler).call_later(0, lambda: self._tick(_scheduler or scheduler))
+
+    def _tick(self, _scheduler: HeartbeatScheduler):
+        if self._cancelled:
+            return self._finish(HeartbeatResult.ERROR)
+        try:
+            resp, state = self.report(self.position)
+            result = self.handle(resp, state)
+        except Exception as e:
+            logger.error(f"视频进度上报失败: {type(e).__name__}: {e}")
+            result = HeartbeatResult.ERROR
+        if self.on_progress:
+            self.on_progress(self.position)
+        if result is not None:
+            return self._finish(result)
+        _scheduler.call_later(self.advance(), lambda: self._tick(_scheduler))
+
+    async def run_async(self) -> HeartbeatResult:
+        """在当前事件循环中上报直到任务结束, 等待期间不占用线程"""
+        while True:
+            try:
+                resp, state = await self.report(self.position)
+                result = self.handle(resp, state)
+            except Exception as e:
+                logger.error(f"视频进度上报失败: {type(e).__name__}: {e}")
+                result = HeartbeatResult.ERROR
+            if self.on_progress:
+                self.on_progress(self.position)
+            if result is not None:
+                self._finish(result)
+                return result
+            await asyncio.sleep(self.advance())
+
+    def _finish(self, result: HeartbeatResult):
+        self.result = result
+        self._done.set()
+
+    def cancel(self):
+        """取消上报, 在下一次到期时结束"""
+        self._cancelled = True
+
+    def wait(self, timeout: float = None) -> Optional[HeartbeatResult]:
+        self._done.wait(timeout)
+        return self.result
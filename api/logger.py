@@ -1,3 +1,72 @@
+import sys
+import threading
+
 from loguru import logger
 
+ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+
+
+def enable_vt_mode(stream) -> bool:
+    """
+    为Windows控制台开启虚拟终端模式, 使其能够解析ANSI转义序列
+
+    loguru只会为sys.stderr等标准流做转换, 不会处理函数形式的输出, 未开启时颜色与进度行的光标控制
+    会原样显示为乱码。非Windows平台直接返回True, 开启失败(旧版本Windows或输出被重定向)时返回False
+    """
+    if sys.platform != "win32":
+        return True
+    try:
+        import ctypes
+        import msvcrt
+
+        kernel32 = ctypes.windll.kernel32
+        handle = msvcrt.get_osfhandle(stream.fileno())
+        mode = ctypes.c_ulong()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        if mode.value & ENABLE_VIRTUAL_TERMINAL_PROCESSING:
+            return True
+        return bool(kernel32.SetConsoleMode(handle, mode.value | ENABLE_VIRTUAL_TERMINAL_PROCESSING))
+    except Exception:
+        return False
+
+
+class Console:
+    """
+    控制台输出, 日志与进度显示共用同一个输出流
+
+    进度显示注册为overlay后, 每条日志输出前先擦除进度行, 输出后再重绘, 两者不会互相覆盖
+    """
+
+    def __init__(self, stream=None):
+        self._stream = stream
+        self.lock = threading.RLock()
+        self.overlay = None
+
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    def isatty(self) -> bool:
+        """是否为能够解析ANSI转义序列的终端, 否则不使用颜色与进度行"""
+        try:
+            return self.stream.isatty() and enable_vt_mode(self.stream)
+        except (AttributeError, ValueError, OSError):
+            return False
+
+    def write(self, message: str):
+        with self.lock:
+            if self.overlay:
+                self.overlay.clear()
+            self.stream.write(message)
+            if self.overlay:
+                self.overlay.redraw()
+            self.stream.flush()
+
+
+console = Console()
+
+# 替换loguru默认的stderr输出, 保持默认的日志级别与格式
+logger.remove()
+logger.add(console.write, level="DEBUG", colorize=console.isatty())
 logger.add("chaoxing.log", rotation="10 MB", level="TRACE")
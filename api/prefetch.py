@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+章节预取
+
+学习当前章节(视频播放等)期间, 在后台提前读取后续章节的任务点列表与章节检测页面, 并预先查询题库,
+轮到该章节时直接使用预取结果。
+
+以下情况预取结果会失效, 届时重新读取:
+    - 章节未开放(前一章节完成后可能开放)
+    - 课程发生回滚
+    - 预取时间超过max_age
+"""
+import copy
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from api.logger import logger
+
+# 预取结果的最长有效时间, 单位秒, 章节检测页面中的参数可能会过期
+DEFAULT_MAX_AGE = 600
+
+
+class PrefetchedChapter:
+    """单个章节的预取结果"""
+
+    def __init__(self, jobs, job_info, works: Dict[str, tuple]):
+        self.jobs = jobs
+        self.job_info = job_info
+        # 章节检测任务ID -> (页面源码, 题目信息)
+        self.works = works
+        self.created = time.monotonic()
+
+
+class ChapterPrefetcher:
+    """
+    课程章节预取器, 每个课程一个实例, 随课程学习结束关闭
+
+    Args:
+        chaoxing: 超星实例
+        course: 课程信息
+        points: 课程的章节列表
+        depth: 向后预取的章节数
+        max_age: 预取结果的最长有效时间(秒)
+    """
+
+    def __init__(self, chaoxing, course, points, depth: int = 1, max_age: float = DEFAULT_MAX_AGE):
+        self.chaoxing = chaoxing
+        self.course = course
+        self.points = points
+        self.depth = depth
+        self.max_age = max_age
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # 独立的线程池, 避免与get_job_list内部使用的读取线程池互相等待
+        self._executor = ThreadPoolExecutor(max_workers=max(1, depth), thread_name_prefix="prefetch")
+
+    def schedule(self, index: int):
+        """预取index之后depth个未完成的章节"""
+        with self._lock:
+            for point in self.points[index + 1: index + 1 + self.depth]:
+                if point["has_finished"] or point["id"] in self._futures:
+                    continue
+                self._futures[point["id"]] = self._executor.submit(self._prefetch, point)
+
+    def take(self, point) -> Optional[PrefetchedChapter]:
+        """取出章节的预取结果, 没有预取或结果已失效时返回None"""
+        with self._lock:
+            future = self._futures.pop(point["id"], None)
+        if future is None:
+            return None
+        try:
+            # 预取中的章节等待其完成, 通常比重新读取更快
+            chapter = future.result()
+        except Exception as e:
+            logger.debug(f"章节预取失败: {point['title']} -> {type(e).__name__}: {e}")
+            return None
+        if chapter is None or time.monotonic() - chapter.created > self.max_age:
+            return None
+        logger.debug(f"使用预取的章节数据: {point['title']}")
+        return chapter
+
+    def invalidate(self):
+        """清除所有预取结果, 课程回滚时调用"""
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.cancel()
+
+    def close(self):
+        self.invalidate()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prefetch(self, point) -> Optional[PrefetchedChapter]:
+        course = self.course
+        jobs, job_info = self.chaoxing.get_job_list(
+            course["clazzId"], course["courseId"], course["cpi"], point["id"]
+        )
+        # 未开放的章节可能在当前章节完成后开放, 不保留结果
+        if job_info.get("notOpen", False):
+            return None
+
+        works = {}
+        tiku = self.chaoxing.tiku
+        if tiku and not tiku.DISABLE:
+            for job in jobs:
+                if job["type"] != "workid":
+                    continue
+                _html, questions = self.chaoxing.fetch_work(course, job, job_info)
+                works[job["jobid"]] = (_html, questions)
+                self._warm_answers(questions)
+        logger.debug(f"章节预取完成: {point['title']}, 任务点数量: {len(jobs)}")
+        return PrefetchedChapter(jobs, job_info, works)
+
+    def _warm_answers(self, questions: dict):
+        """预先查询题库, 答案写入缓存, 章节检测答题时直接命中"""
+        # query会修改题目标题, 使用副本避免影响提交时的题目信息
+        self.chaoxing.tiku.query_many(copy.deepcopy(questions["questions"]))
@@ -1,22 +1,28 @@
+import itertools
+import queue
+import shutil
+import threading
 import time
+import unicodedata
 from typing import Union
 from api.config import GlobalConst as gc
+from api.logger import console, logger
 
 
 def sec2time(seconds: int) -> str:
     """
     将秒数转换为时分秒格式的字符串。
-    
+
     Args:
         seconds: 要转换的秒数
-        
+
     Returns:
         格式化的时间字符串，格式为 "h:mm:ss" 或 "mm:ss"，如果秒数为0则返回"--:--"
     """
     hours = int(seconds / 3600)
     minutes = int(seconds % 3600 / 60)
     secs = int(seconds % 60)
-    
+
     if hours > 0:
         return f"{hours}:{minutes:02}:{secs:02}"
     if seconds > 0:
@@ -24,39 +30,212 @@ def sec2time(seconds: int) -> str:
     return "--:--"
 
 
-def show_progress(task_name: str, start_position: int, duration: int, 
+def _display_width(text: str) -> int:
+    """计算文本在终端中的显示宽度, 中文等全角字符占两列"""
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+
+def _truncate(text: str, width: int) -> str:
+    """按显示宽度截断文本"""
+    if _display_width(text) <= width:
+        return text
+    result = []
+    used = 0
+    for c in text:
+        used += _display_width(c)
+        if used > width - 2:
+            break
+        result.append(c)
+    return "".join(result) + ".."
+
+
+class ProgressTask:
+    """单个任务的进度状态, 两次事件之间按播放倍速推算当前位置"""
+
+    __slots__ = ("name", "total", "position", "speed", "updated", "logged")
+
+    def __init__(self, name: str, total: int, position: int, speed: float):
+        self.name = name
+        self.total = max(int(total), 0)
+        self.position = position
+        self.speed = speed
+        self.updated = time.monotonic()
+        self.logged = 0.0
+
+    def current(self, now: float) -> int:
+        position = self.position + int((now - self.updated) * self.speed)
+        return min(position, self.total)
+
+
+class ProgressRenderer:
+    """
+    进度显示, 各任务通过start/advance/finish推送事件, 由单独的渲染线程统一输出
+
+    终端中以多行进度条显示所有进行中的任务, 刷新频率不超过refresh_interval;
+    非终端环境(如Docker)下改为输出日志, 同一任务每log_interval秒最多输出一条。
+    """
+
+    BAR_LENGTH = 40
+
+    def __init__(
+        self,
+        refresh_interval: float = gc.PROGRESS_REFRESH_INTERVAL,
+        log_interval: float = gc.PROGRESS_LOG_INTERVAL,
+        tty: bool = None,
+    ):
+        self.refresh_interval = refresh_interval
+        self.log_interval = log_interval
+        self.tty = tty
+        self._ids = itertools.count(1)
+        self._tasks = {}
+        self._events = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # 当前终端上已绘制的进度行
+        self._lines = []
+        self._drawn = 0
+
+    def start(self, name: str, total: int, position: int = 0, speed: float = 1.0) -> int:
+        """
+        开始一个任务
+
+        Args:
+            name: 任务名称
+            total: 任务总长度(秒)
+            position: 起始位置(秒)
+            speed: 播放倍速
+
+        Returns:
+            任务ID, 用于后续的advance/finish
+        """
+        task_id = next(self._ids)
+        self._push(("start", task_id, ProgressTask(name, total, position, speed)))
+        return task_id
+
+    def advance(self, task_id: int, position: int):
+        """更新任务的当前位置"""
+        self._push(("advance", task_id, position))
+
+    def finish(self, task_id: int):
+        """结束任务, 任务从进度显示中移除"""
+        self._push(("finish", task_id, None))
+
+    def _push(self, event):
+        self._events.put(event)
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="progress", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        if self.tty is None:
+            self.tty = console.isatty()
+        if self.tty:
+            console.overlay = self
+        while True:
+            # 没有进行中的任务时阻塞等待事件
+            self._drain(block=not self._tasks)
+            try:
+                self._render()
+            except Exception as e:
+                logger.debug(f"进度显示出错: {e}")
+            time.sleep(self.refresh_interval)
+
+    def _drain(self, block: bool):
+        try:
+            event = self._events.get(block=block)
+            while True:
+                self._apply(*event)
+                event = self._events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _apply(self, kind: str, task_id: int, value):
+        now = time.monotonic()
+        if kind == "start":
+            self._tasks[task_id] = value
+            if not self.tty:
+                self._log(value, now)
+        elif kind == "advance":
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.position = min(value, task.total)
+                task.updated = now
+        elif kind == "finish":
+            task = self._tasks.pop(task_id, None)
+            if task is not None and not self.tty:
+                task.position = task.current(now)
+                task.updated = now
+                self._log(task, now)
+
+    def _format(self, task: ProgressTask, now: float, width: int = None) -> str:
+        position = task.current(now)
+        percent = min(int(position / task.total * 100), 100) if task.total else 100
+        filled_length = int(percent * self.BAR_LENGTH // 100)
+        progress_bar = ("#" * filled_length).ljust(self.BAR_LENGTH, " ")
+        suffix = f" |{progress_bar}| {percent}%  {sec2time(position)}/{sec2time(task.total)}"
+        name = task.name
+        if width is not None:
+            name = _truncate(name, max(width - len(suffix) - 6, 8))
+        return f"当前任务: {name}{suffix}"
+
+    def _log(self, task: ProgressTask, now: float):
+        task.logged = now
+        logger.info(self._format(task, now))
+
+    def _render(self):
+        now = time.monotonic()
+        if not self.tty:
+            for task in self._tasks.values():
+                if now - task.logged >= self.log_interval:
+                    self._log(task, now)
+            return
+
+        width = shutil.get_terminal_size().columns - 1
+        with console.lock:
+            self.clear()
+            self._lines = [self._format(task, now, width) for task in self._tasks.values()]
+            self.redraw()
+            console.stream.flush()
+
+    def clear(self):
+        """擦除已绘制的进度行, 由Console在输出日志前调用"""
+        if self._drawn:
+            console.stream.write(f"\x1b[{self._drawn}F\x1b[J")
+            self._drawn = 0
+
+    def redraw(self):
+        """重新绘制进度行, 由Console在输出日志后调用"""
+        for line in self._lines:
+            console.stream.write(line + "\n")
+        self._drawn = len(self._lines)
+
+
+# 全局进度显示, 所有任务共用
+progress = ProgressRenderer()
+
+
+def show_progress(task_name: str, start_position: int, duration: int,
                  total_length: int, speed: float) -> None:
     """
-    显示任务进度条，模拟任务进度。
-    
+    显示任务进度条，并等待任务执行duration秒(按倍速折算)。
+
+    兼容旧接口, 新代码请直接使用progress.start/advance/finish推送进度事件。
+
     Args:
         task_name: 当前执行的任务名称
         start_position: 起始位置（以秒为单位）
         duration: 任务持续时间（以秒为单位）
         total_length: 任务总长度（以秒为单位）
         speed: 任务执行速度
-        
+
     Returns:
         None
     """
-    start_time = time.time()
-    expected_end_time = start_time + (duration / speed)
-    
-    while time.time() < expected_end_time:
-        # 计算当前进度
-        current_position = start_position + int((time.time() - start_time) * speed)
-        percent_complete = min(int(current_position / total_length * 100), 100)
-        
-        # 生成进度条
-        bar_length = 40
-        filled_length = int(percent_complete * bar_length // 100)
-        progress_bar = ("#" * filled_length).ljust(bar_length, " ")
-        
-        # 格式化输出进度信息
-        progress_text = (
-            f"\r当前任务: {task_name} |{progress_bar}| {percent_complete}%  "
-            f"{sec2time(current_position)}/{sec2time(total_length)}"
-        )
-        
-        print(progress_text, end="", flush=True)
-        time.sleep(gc.THRESHOLD)
+    task_id = progress.start(task_name, total_length, start_position, speed)
+    try:
+        time.sleep(duration / speed)
+    finally:
+        progress.finish(task_id)
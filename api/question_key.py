@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+题目缓存键
+
+同一道题在不同页面中可能存在全角/半角标点、多余空白、图片地址不同、字体解密残留康熙部首等差异,
+直接以标题作为缓存键会导致缓存未命中。这里将标题规范化后与题型、选项指纹一起组成缓存键。
+
+规范化步骤:
+    1. 图片标签只保留文件名, 去除域名与签名参数
+    2. 康熙部首替换为对应汉字
+    3. NFKC规范化(全角字母数字与标点转为半角)
+    4. 中文标点折叠为对应的英文标点
+    5. 合并空白, 仅保留英文单词之间的空格
+"""
+import hashlib
+import re
+import unicodedata
+from typing import Iterable, Optional, Tuple, Union
+
+from api.cxsecret_font import KX_RADICALS_TAB
+
+# 缓存键版本, 规范化规则变化时修改, 避免与旧键冲突
+KEY_VERSION = "v1"
+
+_IMG_PATTERN = re.compile(r'<img\b[^>]*?src="([^"]*)"[^>]*>', re.IGNORECASE)
+# NFKC不会处理的中文标点
+_PUNCT_TAB = str.maketrans({
+    "。": ".", "、": ",", "“": '"', "”": '"', "‘": "'", "’": "'",
+    "【": "[", "】": "]", "《": "<", "》": ">", "「": '"', "」": '"',
+    "『": '"', "』": '"', "〔": "(", "〕": ")", "—": "-", "–": "-",
+    "～": "~", "·": ".", "…": "...",
+})
+_SPACE_PATTERN = re.compile(r"\s+")
+# 不在两个英文字母/数字之间的空格
+_LOOSE_SPACE_PATTERN = re.compile(r"(?<![A-Za-z0-9]) | (?![A-Za-z0-9])")
+# 选项前的序号, 例如 "A."、"B、"
+_OPTION_LABEL_PATTERN = re.compile(r"^[A-Za-z][.、:\s]\s*")
+
+
+def _image_name(match: re.Match) -> str:
+    src = match.group(1).split("?", 1)[0].rstrip("/")
+    return f"[img:{src.rsplit('/', 1)[-1]}]" if src else ""
+
+
+def normalize_text(text: str) -> str:
+    """规范化题目或选项文本"""
+    if not text:
+        return ""
+    text = _IMG_PATTERN.sub(_image_name, text)
+    text = text.translate(KX_RADICALS_TAB)
+    text = unicodedata.normalize("NFKC", text)
+    text = text.translate(_PUNCT_TAB)
+    text = _SPACE_PATTERN.sub(" ", text).strip()
+    return _LOOSE_SPACE_PATTERN.sub("", text)
+
+
+def options_fingerprint(options: Union[str, Iterable[str], None]) -> str:
+    """选项指纹, 与选项顺序和序号无关, 没有选项时返回空字符串"""
+    if not options:
+        return ""
+    if isinstance(options, str):
+        options = options.split("\n")
+    normalized = sorted(
+        filter(None, (normalize_text(_OPTION_LABEL_PATTERN.sub("", option.strip())) for option in options))
+    )
+    if not normalized:
+        return ""
+    return hashlib.sha1("\n".join(normalized).encode("utf-8")).hexdigest()[:12]
+
+
+def make_cache_key(title: str, q_type: str = "", options: Union[str, Iterable[str], None] = None) -> str:
+    """
+    生成题目的缓存键
+
+    Args:
+        title: 题目标题(已去除题号与分值)
+        q_type: 题型
+        options: 选项, 换行分隔的字符串或列表
+
+    Returns:
+        形如 "v1|single|规范化标题|选项指纹" 的缓存键
+    """
+    return "|".join((KEY_VERSION, q_type or "", normalize_text(title), options_fingerprint(options)))
+
+
+def parse_cache_key(key: str) -> Optional[Tuple[str, str, str]]:
+    """解析make_cache_key生成的缓存键, 返回(题型, 规范化标题, 选项指纹), 旧版缓存键返回None"""
+    parts = key.split("|")
+    if len(parts) < 4 or parts[0] != KEY_VERSION:
+        return None
+    # 标题中可能含有分隔符
+    return parts[1], "|".join(parts[2:-1]), parts[-1]
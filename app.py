@@ -1,27 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+多账号任务服务
+
+Flask负责接收账号并查询学习状态, Celery worker负责登录、读取课程和按课程学习。
+同一个worker进程内的所有任务共用题库实例(包括答案缓存), 每个账号的会话连接池在任务之间复用。
+
+账号密码用[worker]中的credential_key加密后保存在服务端的状态数据库中, broker中的任务消息只携带账号ID。
+所有接口都需要在请求头中携带[worker]中配置的api_token: Authorization: Bearer <api_token>。
+导入本模块不会读取配置或创建目录, 配置在worker或Flask启动后首次使用时才加载。
+
+本地运行(默认使用SQLite作为broker和结果存储):
+    celery -A app:celery_app worker --loglevel=INFO
+    flask --app "app:create_app()" run    # 或 python app.py
+
+提交账号:
+    curl -X POST http://127.0.0.1:5000/accounts -H "Authorization: Bearer <api_token>" \\
+         -H "Content-Type: application/json" \\
+         -d '{"username": "手机号", "password": "密码", "course_list": ["课程ID"]}'
+查询状态(account_id由提交接口返回):
+    curl http://127.0.0.1:5000/accounts/<account_id> -H "Authorization: Bearer <api_token>"
+"""
+import configparser
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
 from celery import Celery, Task
-from flask import Flask
+from flask import Flask, jsonify, request
+
+from api.answer import Tiku
+from api.base import Account, Chaoxing
+from api.cipher import CredentialCipher
+from api.cxsecret_font import font_map_cache
+from api.decode import set_parser_backend
+from api.logger import logger
+from main import load_config_from_file, process_course
+
+CONFIG_PATH = os.environ.get("CHAOXING_CONFIG", "config.ini")
+NOTOPEN_ACTIONS = ("retry", "ask", "continue")
+
+
+def load_worker_config(config_path):
+    """读取配置文件中的worker节"""
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding="utf8")
+    return dict(config.items("worker")) if config.has_section("worker") else {}
+
+
+def load_celery_config(config_path: str = CONFIG_PATH) -> dict:
+    worker_config = load_worker_config(config_path)
+    return dict(
+        broker_url=worker_config.get("broker_url") or "sqla+sqlite:///celerybroker.sqlite3",
+        result_backend=worker_config.get("result_backend") or "db+sqlite:///celeryresults.sqlite3",
+        task_ignore_result=True,
+        # 默认使用线程池, 同一进程内的任务共用题库、答案缓存与会话连接池
+        worker_pool=worker_config.get("pool") or "threads",
+        worker_concurrency=int(worker_config.get("concurrency") or 8),
+        # 课程任务耗时很长, 每次只预取一个任务, 避免任务堆积在繁忙的worker上
+        worker_prefetch_multiplier=1,
+    )
+
+
+class FlaskTask(Task):
+    """在Flask应用上下文中执行任务, worker进程在执行第一个任务时才创建Flask应用"""
+
+    def __call__(self, *args: object, **kwargs: object) -> object:
+        with get_flask_app().app_context():
+            return self.run(*args, **kwargs)
+
+
+celery_app = Celery("app", task_cls=FlaskTask)
+# 配置在首次访问时才读取
+celery_app.add_defaults(load_celery_config)
 
 
 def celery_init_app(app: Flask) -> Celery:
-    class FlaskTask(Task):
-        def __call__(self, *args: object, **kwargs: object) -> object:
-            with app.app_context():
-                return self.run(*args, **kwargs)
-
-    celery_app = Celery(app.name, task_cls=FlaskTask)
-    celery_app.config_from_object(app.config["CELERY"])
-    celery_app.set_default()
+    celery_app.conf.update(app.config["CELERY"])
     app.extensions["celery"] = celery_app
     return celery_app
 
 
-if __name__ == "__main__":
+class AccountStatusStore:
+    """
+    账号学习状态存储, Flask与worker进程通过同一个SQLite文件共享状态
+
+    每个账号有一条key为account的记录表示登录/读取课程的状态, 每个课程各有一条key为课程ID的记录。
+    账号密码使用cipher加密后保存, 状态数据库中不出现明文密码
+    """
+
+    ACCOUNT_KEY = "account"
+
+    def __init__(self, path: str, cipher: CredentialCipher):
+        self.path = path
+        self.cipher = cipher
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS account_status ("
+            "account_id TEXT NOT NULL, key TEXT NOT NULL, title TEXT NOT NULL DEFAULT '', "
+            "state TEXT NOT NULL, detail TEXT NOT NULL DEFAULT '', updated REAL NOT NULL, "
+            "PRIMARY KEY (account_id, key))"
+        )
+        # 加密的账号密码与学习选项, 任务消息中只传递账号ID
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS accounts ("
+            "account_id TEXT PRIMARY KEY, credentials TEXT NOT NULL, "
+            "options TEXT NOT NULL DEFAULT '{}', updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def set_account(self, account_id: str, account: dict):
+        """保存账号, account中除username与password外的字段作为学习选项保存"""
+        options = {k: v for k, v in account.items() if k not in ("username", "password")}
+        credentials = self.cipher.encrypt(
+            json.dumps({"username": account["username"], "password": account["password"]}, ensure_ascii=False)
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO accounts "
+                "(account_id, credentials, options, updated) VALUES (?, ?, ?, ?)",
+                (account_id, credentials, json.dumps(options, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def get_account(self, account_id: str):
+        """读取set_account保存的账号, 不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT credentials, options FROM accounts WHERE account_id = ?",
+                (account_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        account = json.loads(row[1])
+        account.update(json.loads(self.cipher.decrypt(row[0])))
+        return account
+
+    def set(self, account_id: str, key: str, state: str, detail: str = "", title: str = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO account_status (account_id, key, title, state, detail, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(account_id, key) DO UPDATE SET "
+                "title = COALESCE(?, title), state = excluded.state, "
+                "detail = excluded.detail, updated = excluded.updated",
+                (account_id, key, title or "", state, detail, time.time(), title),
+            )
+            self._conn.commit()
+
+    def get(self, account_id: str):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, title, state, detail, updated FROM account_status "
+                "WHERE account_id = ? ORDER BY key = ? DESC, key",
+                (account_id, self.ACCOUNT_KEY),
+            ).fetchall()
+        return [
+            dict(zip(("key", "title", "state", "detail", "updated"), row)) for row in rows
+        ]
+
+
+class StatusProgress:
+    """将process_course的章节进度写入状态存储"""
+
+    def __init__(self, store: AccountStatusStore, account_id: str):
+        self.store = store
+        self.account_id = account_id
+        self.total = 0
+        self.stop_event = threading.Event()
+
+    def start(self, course, total: int):
+        self.total = total
+        self.store.set(self.account_id, course["courseId"], "running", f"0/{total}")
+
+    def advance(self, course, index: int):
+        self.store.set(self.account_id, course["courseId"], "running", f"{index}/{self.total}")
+
+
+def new_account_id() -> str:
+    """随机生成账号ID, 账号ID只返回给提交者, 无法由手机号推算"""
+    return secrets.token_hex(16)
+
+
+def mask_username(username: str) -> str:
+    """状态记录中只显示手机号的前3位与后4位"""
+    if len(username) <= 7:
+        return "*" * len(username)
+    return f"{username[:3]}{'*' * (len(username) - 7)}{username[-4:]}"
+
+
+def parse_account_options(data: dict, common_config) -> dict:
+    """校验提交的学习选项, 不合法时抛出ValueError"""
+    course_list = data.get("course_list") or []
+    if isinstance(course_list, str):
+        course_list = course_list.split(",")
+    if not isinstance(course_list, list):
+        raise ValueError("course_list应为课程ID列表或英文逗号分隔的字符串")
+
+    try:
+        speed = float(data.get("speed", common_config.get("speed", 1.0)))
+    except (TypeError, ValueError):
+        raise ValueError("speed应为数字") from None
+    if not 1.0 <= speed <= 2.0:
+        raise ValueError("speed的取值范围为1~2")
+
+    notopen_action = data.get("notopen_action", common_config.get("notopen_action", "retry"))
+    if notopen_action not in NOTOPEN_ACTIONS:
+        raise ValueError(f"notopen_action只能为{', '.join(NOTOPEN_ACTIONS)}之一")
+    # worker中无法等待用户输入
+    if notopen_action == "ask":
+        notopen_action = "continue"
+
+    return {
+        "course_list": [str(course_id) for course_id in course_list],
+        "speed": speed,
+        "notopen_action": notopen_action,
+    }
+
+
+def create_app(config_path: str = CONFIG_PATH) -> Flask:
+    common_config, tiku_config, _ = load_config_from_file(config_path)
+    worker_config = load_worker_config(config_path)
+
     app = Flask(__name__)
     app.config.from_mapping(
-        CELERY=dict(
-            broker_url="db+sqlite:///celeryresults.sqlite3",
-            result_backend="sqlite:///celeryresults.sqlite3",
-            task_ignore_result=True,
+        CHAOXING=dict(
+            common=common_config,
+            tiku=tiku_config,
+            cookies_dir=worker_config.get("cookies_dir") or "cookies",
+            status_db=worker_config.get("status_db") or "accounts.sqlite3",
+            api_token=worker_config.get("api_token") or "",
+            credential_key=worker_config.get("credential_key") or "",
         ),
+        CELERY=load_celery_config(config_path),
     )
-    celery_app = celery_init_app(app)
+    # worker与Flask都需要解密账号密码, 未配置密钥时不启动
+    if not app.config["CHAOXING"]["credential_key"]:
+        raise ValueError("未配置[worker]中的credential_key, 无法加密保存账号密码")
+    os.makedirs(app.config["CHAOXING"]["cookies_dir"], exist_ok=True)
+
+    # 与main.py一致的全局设置
+    if common_config.get("parser_backend"):
+        set_parser_backend(common_config["parser_backend"])
+    if common_config.get("font_cache_dir"):
+        font_map_cache.set_cache_dir(common_config["font_cache_dir"])
+
+    celery_init_app(app)
+    register_routes(app)
+    return app
+
+
+# worker进程内共享的对象
+_shared_lock = threading.Lock()
+_flask_app = None
+_tiku = None
+_status_store = None
+_clients = {}
+
+
+def get_flask_app() -> Flask:
+    global _flask_app
+    with _shared_lock:
+        if _flask_app is None:
+            _flask_app = create_app()
+        return _flask_app
+
+
+def get_status_store() -> AccountStatusStore:
+    global _status_store
+    with _shared_lock:
+        if _status_store is None:
+            from flask import current_app
+            conf = current_app.config["CHAOXING"]
+            _status_store = AccountStatusStore(
+                conf["status_db"], CredentialCipher(conf["credential_key"])
+            )
+        return _status_store
+
+
+def get_tiku() -> Tiku:
+    """进程内所有账号共用一个题库实例"""
+    global _tiku
+    with _shared_lock:
+        if _tiku is None:
+            from flask import current_app
+            tiku = Tiku()
+            tiku.config_set(current_app.config["CHAOXING"]["tiku"])
+            tiku = tiku.get_tiku_from_config()
+            tiku.init_tiku()
+            _tiku = tiku
+        return _tiku
+
+
+def load_account(account_id: str) -> dict:
+    account = get_status_store().get_account(account_id)
+    if account is None:
+        raise LookupError(f"账号不存在: {account_id}")
+    return account
+
+
+def get_chaoxing(account_id: str) -> Chaoxing:
+    """
+    获取账号对应的超星实例, 同一账号的任务复用会话连接池
+
+    每次提交账号都会生成新的账号ID, 同一账号ID的账号密码不会变化
+    """
+    from flask import current_app
+    tiku = get_tiku()
+    with _shared_lock:
+        chaoxing = _clients.get(account_id)
+    if chaoxing is not None:
+        return chaoxing
+
+    account = load_account(account_id)
+    conf = current_app.config["CHAOXING"]
+    with _shared_lock:
+        # 其他线程可能已经创建了同一账号的实例
+        if account_id not in _clients:
+            _clients[account_id] = Chaoxing(
+                account=Account(account["username"], account["password"]),
+                tiku=tiku,
+                fetch_workers=int(conf["common"].get("fetch_workers", 4)),
+                prefetch_depth=int(conf["common"].get("prefetch_depth", 0)),
+                cookies_path=os.path.join(conf["cookies_dir"], f"{account_id}.txt"),
+            )
+        return _clients[account_id]
+
+
+@celery_app.task(ignore_result=True)
+def login_account(account_id: str) -> str:
+    """登录账号, 成功后返回账号ID供后续任务使用"""
+    store = get_status_store()
+    store.set(account_id, AccountStatusStore.ACCOUNT_KEY, "login")
+    try:
+        _login_state = get_chaoxing(account_id).login()
+    except Exception as e:
+        _login_state = {"status": False, "msg": f"{type(e).__name__}: {e}"}
+    if not _login_state["status"]:
+        store.set(account_id, AccountStatusStore.ACCOUNT_KEY, "failed", _login_state["msg"])
+        raise RuntimeError(f"登录失败: {_login_state['msg']}")
+    return account_id
+
+
+@celery_app.task(ignore_result=True)
+def discover_courses(account_id: str) -> int:
+    """读取课程列表, 为每个需要学习的课程提交一个学习任务"""
+    store = get_status_store()
+    store.set(account_id, AccountStatusStore.ACCOUNT_KEY, "discovering")
+
+    all_course = get_chaoxing(account_id).get_course_list()
+    course_list = load_account(account_id).get("course_list") or []
+    course_task = [course for course in all_course if course["courseId"] in course_list]
+    # 没有指定课程或指定的课程都不存在时学习所有课程, 与main.py一致
+    if not course_task:
+        course_task = all_course
+
+    for course in course_task:
+        store.set(account_id, course["courseId"], "queued", title=course["title"])
+        process_account_course.delay(account_id, course)
+    store.set(account_id, AccountStatusStore.ACCOUNT_KEY, "running", f"{len(course_task)}个课程")
+    return len(course_task)
+
+
+@celery_app.task(ignore_result=True)
+def process_account_course(account_id: str, course: dict):
+    """学习单个课程, 课程内的章节按顺序进行"""
+    store = get_status_store()
+    account = load_account(account_id)
+    chaoxing = get_chaoxing(account_id)
+
+    # 学习选项已在提交时校验
+    try:
+        process_course(
+            chaoxing, course, account["notopen_action"], account["speed"],
+            StatusProgress(store, account_id)
+        )
+    except Exception as e:
+        logger.error(f"课程 {course['title']} 学习出错: {type(e).__name__}: {e}")
+        store.set(account_id, course["courseId"], "failed", f"{type(e).__name__}: {e}")
+        raise
+    store.set(account_id, course["courseId"], "finished")
+
+
+def register_routes(app: Flask):
+    @app.before_request
+    def check_api_token():
+        api_token = app.config["CHAOXING"]["api_token"]
+        # 未配置api_token时拒绝所有请求, 避免接口在无认证的情况下对外开放
+        if not api_token:
+            return jsonify({"error": "服务端未配置api_token"}), 503
+        auth = request.headers.get("Authorization", "")
+        scheme, _, token = auth.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.strip().encode("utf-8"), api_token.encode("utf-8")
+        ):
+            return jsonify({"error": "api_token错误"}), 401
+
+    @app.post("/accounts")
+    def submit_account():
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get("username") or not data.get("password"):
+            return jsonify({"error": "username和password为必填项"}), 400
+        try:
+            options = parse_account_options(data, app.config["CHAOXING"]["common"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        account = {"username": str(data["username"]), "password": str(data["password"]), **options}
+        account_id = new_account_id()
+        store = get_status_store()
+        store.set_account(account_id, account)
+        store.set(account_id, AccountStatusStore.ACCOUNT_KEY, "queued", title=mask_username(account["username"]))
+        result = (login_account.s(account_id) | discover_courses.s()).delay()
+        return jsonify({"account_id": account_id, "task_id": result.id}), 202
+
+    @app.get("/accounts/<account_id>")
+    def account_status(account_id):
+        status = get_status_store().get(account_id)
+        if not status:
+            return jsonify({"error": "账号不存在"}), 404
+        # 所有课程结束后账号状态记为finished
+        account, courses = status[0], status[1:]
+        if account["state"] == "running" and courses and all(
+            course["state"] in ("finished", "failed") for course in courses
+        ):
+            account["state"] = "finished"
+        return jsonify({"account_id": account_id, "status": status})
+
+
+if __name__ == "__main__":
+    create_app().run()
@@ -1,18 +1,25 @@
 # -*- coding: utf-8 -*-
 import argparse
+import asyncio
 import configparser
 import random
 import time
 import sys
 import os
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib3 import disable_warnings, exceptions
 
 from api.logger import logger
 from api.base import Chaoxing, Account
+from api.async_base import AsyncChaoxing
 from api.exceptions import LoginError, InputFormatError, MaxRollBackExceeded
 from api.answer import Tiku
+from api.cxsecret_font import font_map_cache
+from api.decode import set_parser_backend
 from api.notification import Notification
+from api.prefetch import ChapterPrefetcher
 
 # 关闭警告
 disable_warnings(exceptions.InsecureRequestWarning)
@@ -48,6 +55,15 @@ def parse_args():
         choices=["retry", "ask", "continue"],
         help="遇到关闭任务点时的行为: retry-重试, ask-询问, continue-继续"
     )
+    parser.add_argument(
+        "-w", "--course-workers", type=int, default=1,
+        help="同时学习的课程数量 (默认1, 即逐个课程学习)"
+    )
+    parser.add_argument(
+        "-e", "--engine", type=str, default="thread",
+        choices=["thread", "async"],
+        help="运行方式: thread-每个课程一个线程, async-所有课程在同一个事件循环中学习"
+    )
 
     # 在解析之前捕获 -h 的行为
     if len(sys.argv) == 2 and sys.argv[1] in {"-h", "--help"}:
@@ -78,6 +94,9 @@ def load_config_from_file(config_path):
         # 处理notopen_action，设置默认值为retry
         if "notopen_action" not in common_config:
             common_config["notopen_action"] = "retry"
+        # 处理course_workers，将字符串转换为整数
+        if common_config.get("course_workers"):
+            common_config["course_workers"] = int(common_config["course_workers"])
     
     # 检查并读取tiku节
     if config.has_section("tiku"):
@@ -101,7 +120,9 @@ def build_config_from_args(args):
         "password": args.password,
         "course_list": args.list.split(",") if args.list else None,
         "speed": args.speed if args.speed else 1.0,
-        "notopen_action": args.notopen_action if args.notopen_action else "retry"
+        "notopen_action": args.notopen_action if args.notopen_action else "retry",
+        "course_workers": args.course_workers if args.course_workers else 1,
+        "engine": args.engine if args.engine else "thread",
     }
     return common_config, {}, {}
 
@@ -136,6 +157,65 @@ class RollBackManager:
             self.rollback_times = 0
 
 
+class CourseProgress:
+    """课程进度汇总，多个课程同时学习时集中输出各课程的章节进度"""
+    WAITING = "等待中"
+    RUNNING = "学习中"
+    FINISHED = "已完成"
+    FAILED = "出错"
+
+    def __init__(self, course_task):
+        self._lock = threading.Lock()
+        self._state = {
+            course["courseId"]: {
+                "title": course["title"],
+                "status": self.WAITING,
+                "current": 0,
+                "total": 0,
+            }
+            for course in course_task
+        }
+        # 收到停止信号后，各课程在当前章节结束后退出
+        self.stop_event = threading.Event()
+
+    def start(self, course, total: int):
+        with self._lock:
+            self._state[course["courseId"]].update(status=self.RUNNING, total=total)
+        self.report()
+
+    def advance(self, course, index: int):
+        with self._lock:
+            state = self._state[course["courseId"]]
+            if state["current"] == index:
+                return
+            state["current"] = index
+        self.report()
+
+    def finish(self, course, failed: bool = False):
+        with self._lock:
+            state = self._state[course["courseId"]]
+            state["status"] = self.FAILED if failed else self.FINISHED
+            if not failed:
+                state["current"] = state["total"]
+        self.report()
+
+    def summary(self) -> str:
+        """生成所有课程的进度摘要"""
+        with self._lock:
+            parts = []
+            for state in self._state.values():
+                if state["status"] == self.RUNNING:
+                    parts.append(f"{state['title']} {state['current']}/{state['total']}")
+                else:
+                    parts.append(f"{state['title']} {state['status']}")
+        return " | ".join(parts)
+
+    def report(self):
+        # 仅有一个课程时每个章节都会单独输出日志，无需汇总
+        if len(self._state) > 1:
+            logger.info(f"课程进度: {self.summary()}")
+
+
 def init_chaoxing(common_config, tiku_config):
     """初始化超星实例"""
     username = common_config.get("username", "")
@@ -154,15 +234,35 @@ def init_chaoxing(common_config, tiku_config):
     tiku = tiku.get_tiku_from_config()  # 载入题库
     tiku.init_tiku()  # 初始化题库
     
-    # 获取查询延迟设置
-    query_delay = tiku_config.get("delay", 0)
+    # 并发读取页面的线程数
+    fetch_workers = int(common_config.get("fetch_workers", 4))
+
+    # 向后预取的章节数
+    prefetch_depth = int(common_config.get("prefetch_depth", 0))
+
+    # async模式下课程在事件循环中学习, 预取依赖线程池中的同步接口, 不可用
+    chaoxing_cls = Chaoxing
+    if common_config.get("engine", "thread") == "async":
+        chaoxing_cls = AsyncChaoxing
+        if prefetch_depth > 0:
+            logger.warning("async模式不支持章节预取, 已忽略prefetch_depth")
+            prefetch_depth = 0
     
     # 实例化超星API
-    chaoxing = Chaoxing(account=account, tiku=tiku, query_delay=query_delay)
+    chaoxing = chaoxing_cls(
+        account=account,
+        tiku=tiku,
+        fetch_workers=fetch_workers,
+        prefetch_depth=prefetch_depth,
+    )
     
     return chaoxing
 
 
+# 多个课程同时学习时，保证同一时间只有一个课程在等待用户输入
+_input_lock = threading.Lock()
+
+
 def handle_not_open_chapter(notopen_action, point, tiku, RB, auto_skip_notopen=False):
     """处理未开放章节"""
     if notopen_action == "retry":
@@ -181,7 +281,8 @@ def handle_not_open_chapter(notopen_action, point, tiku, RB, auto_skip_notopen=F
     elif notopen_action == "ask":
         # 询问模式 - 判断是否需要询问
         if not auto_skip_notopen:
-            user_choice = input(f"章节 {point['title']} 未开放，是否继续检查后续章节？(y/n): ")
+            with _input_lock:
+                user_choice = input(f"章节 {point['title']} 未开放，是否继续检查后续章节？(y/n): ")
             if user_choice.lower() != 'y':
                 # 用户选择停止
                 logger.info("根据用户选择停止检查后续章节")
@@ -199,8 +300,35 @@ def handle_not_open_chapter(notopen_action, point, tiku, RB, auto_skip_notopen=F
         return 1  # 继续下一章节
 
 
-def process_job(chaoxing, course, job, job_info, speed):
-    """处理单个任务点"""
+def resolve_chapter_state(chaoxing, point, job_info, RB, notopen_action, auto_skip_notopen=False):
+    """
+    根据章节是否开放决定后续操作
+
+    Returns:
+        章节开放时返回None, 否则返回(继续标志, auto_skip_notopen)
+    """
+    try:
+        if job_info.get("notOpen", False):
+            result = handle_not_open_chapter(
+                notopen_action, point, chaoxing.tiku, RB, auto_skip_notopen
+            )
+            
+            if isinstance(result, tuple):
+                return result  # 返回继续标志和更新后的auto_skip_notopen
+            else:
+                return result, auto_skip_notopen
+        
+        RB.new_job(point["id"])
+
+    except MaxRollBackExceeded:
+        logger.error("回滚次数已达3次, 请手动检查学习通任务点完成情况")
+        # 跳过该课程
+        return -1, auto_skip_notopen  # 退出标记
+    return None
+
+
+def process_job(chaoxing, course, job, job_info, speed, works=None):
+    """处理单个任务点, works为预取的章节检测页面"""
     # 视频任务
     if job["type"] == "video":
         logger.trace(f"识别到视频任务, 任务章节: {course['title']} 任务ID: {job['jobid']}")
@@ -223,14 +351,15 @@ def process_job(chaoxing, course, job, job_info, speed):
     # 测验任务
     elif job["type"] == "workid":
         logger.trace(f"识别到章节检测任务, 任务章节: {course['title']}")
-        chaoxing.study_work(course, job, job_info)
+        chaoxing.study_work(course, job, job_info, (works or {}).get(job["jobid"]))
     # 阅读任务
     elif job["type"] == "read":
         logger.trace(f"识别到阅读任务, 任务章节: {course['title']}")
         chaoxing.strdy_read(course, job, job_info)
 
 
-def process_chapter(chaoxing, course, point, RB, notopen_action, speed, auto_skip_notopen=False):
+def process_chapter(chaoxing, course, point, RB, notopen_action, speed, auto_skip_notopen=False,
+                    prefetcher=None):
     """处理单个章节"""
     logger.info(f'当前章节: {point["title"]}')
     
@@ -238,38 +367,28 @@ def process_chapter(chaoxing, course, point, RB, notopen_action, speed, auto_ski
         logger.info(f'章节：{point["title"]} 已完成所有任务点')
         return 1, auto_skip_notopen  # 继续下一章节
     
-    # 随机等待，避免请求过快
-    sleep_duration = random.uniform(1, 3)
-    logger.debug(f"本次随机等待时间: {sleep_duration:.3f}s")
-    time.sleep(sleep_duration)
-    
-    # 获取当前章节的所有任务点
-    jobs = []
-    job_info = None
-    jobs, job_info = chaoxing.get_job_list(
-        course["clazzId"], course["courseId"], course["cpi"], point["id"]
-    )
+    # 优先使用后台预取的章节数据
+    prefetched = prefetcher.take(point) if prefetcher else None
+    works = None
+    if prefetched:
+        jobs, job_info, works = prefetched.jobs, prefetched.job_info, prefetched.works
+    else:
+        # 随机等待，避免请求过快
+        sleep_duration = random.uniform(1, 3)
+        logger.debug(f"本次随机等待时间: {sleep_duration:.3f}s")
+        time.sleep(sleep_duration)
+
+        # 获取当前章节的所有任务点
+        jobs, job_info = chaoxing.get_job_list(
+            course["clazzId"], course["courseId"], course["cpi"], point["id"]
+        )
 
     # 发现未开放章节, 根据配置处理
-    try:
-        if job_info.get("notOpen", False):
-            result = handle_not_open_chapter(
-                notopen_action, point, chaoxing.tiku, RB, auto_skip_notopen
-            )
-            
-            if isinstance(result, tuple):
-                return result  # 返回继续标志和更新后的auto_skip_notopen
-            else:
-                return result, auto_skip_notopen
-        
-        # 遇到开放的章节，重置自动跳过状态
-        auto_skip_notopen = False
-        RB.new_job(point["id"])
-
-    except MaxRollBackExceeded:
-        logger.error("回滚次数已达3次, 请手动检查学习通任务点完成情况")
-        # 跳过该课程
-        return -1, auto_skip_notopen  # 退出标记
+    state = resolve_chapter_state(chaoxing, point, job_info, RB, notopen_action, auto_skip_notopen)
+    if state is not None:
+        return state
+    # 遇到开放的章节，重置自动跳过状态
+    auto_skip_notopen = False
     
     chaoxing.rollback_times = RB.rollback_times
     
@@ -282,13 +401,13 @@ def process_chapter(chaoxing, course, point, RB, notopen_action, speed, auto_ski
     
     # 遍历所有任务点
     for job in jobs:
-        process_job(chaoxing, course, job, job_info, speed)
+        process_job(chaoxing, course, job, job_info, speed, works)
     
     return 1, auto_skip_notopen  # 继续下一章节
 
 
-def process_course(chaoxing, course, notopen_action, speed):
-    """处理单个课程"""
+def process_course(chaoxing, course, notopen_action, speed, progress=None):
+    """处理单个课程, 课程内的章节严格按顺序学习"""
     logger.info(f"开始学习课程: {course['title']}")
     
     # 获取当前课程的所有章节
@@ -302,15 +421,202 @@ def process_course(chaoxing, course, notopen_action, speed):
     auto_skip_notopen = False
     # 初始化回滚管理器
     RB = RollBackManager()
+    # 回滚次数按线程记录, 开始新课程时重置
+    chaoxing.rollback_times = 0
+    if progress:
+        progress.start(course, len(point_list["points"]))
+    # 学习当前章节时在后台预取后续章节
+    prefetcher = None
+    if chaoxing.prefetch_depth > 0:
+        prefetcher = ChapterPrefetcher(
+            chaoxing, course, point_list["points"], chaoxing.prefetch_depth
+        )
     
+    try:
+        while __point_index < len(point_list["points"]):
+            if progress:
+                if progress.stop_event.is_set():
+                    logger.info(f"课程 {course['title']} 已停止学习")
+                    break
+                progress.advance(course, __point_index)
+            point = point_list["points"][__point_index]
+            logger.debug(f"当前章节 __point_index: {__point_index}")
+            if prefetcher:
+                prefetcher.schedule(__point_index)
+            
+            result, auto_skip_notopen = process_chapter(
+                chaoxing, course, point, RB, notopen_action, speed, auto_skip_notopen, prefetcher
+            )
+            
+            if result == -1:  # 退出当前课程
+                break
+            elif result == 0:  # 重试前一章节
+                __point_index -= 1  # 默认第一个任务总是开放的
+                # 回滚后章节状态可能变化, 之前的预取结果全部作废
+                if prefetcher:
+                    prefetcher.invalidate()
+            else:  # 继续下一章节
+                __point_index += 1
+    finally:
+        if prefetcher:
+            prefetcher.close()
+
+
+def run_course(chaoxing, course, notopen_action, speed, progress):
+    """学习单个课程并记录进度, 异常会在标记课程出错后继续抛出"""
+    try:
+        process_course(chaoxing, course, notopen_action, speed, progress)
+    except BaseException:
+        progress.finish(course, failed=True)
+        raise
+    progress.finish(course)
+
+
+def run_courses(chaoxing, course_task, notopen_action, speed, course_workers=1):
+    """
+    学习所有课程任务
+
+    course_workers大于1时, 多个课程在独立线程中同时学习, 每个课程内部的章节仍按顺序进行。
+    某个课程出错不影响其他课程, 全部课程结束后再抛出第一个异常。
+    """
+    progress = CourseProgress(course_task)
+    course_workers = min(max(1, course_workers), len(course_task))
+
+    if course_workers <= 1:
+        for course in course_task:
+            run_course(chaoxing, course, notopen_action, speed, progress)
+        return progress
+
+    logger.info(f"同时学习的课程数量: {course_workers}")
+    executor = ThreadPoolExecutor(max_workers=course_workers, thread_name_prefix="course")
+    futures = {
+        executor.submit(run_course, chaoxing, course, notopen_action, speed, progress): course
+        for course in course_task
+    }
+    first_error = None
+    try:
+        for future in as_completed(futures):
+            course = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"课程 {course['title']} 学习出错: {type(e).__name__}: {e}")
+                if first_error is None:
+                    first_error = e
+    except KeyboardInterrupt:
+        # 通知正在学习的课程在当前章节结束后退出, 并取消尚未开始的课程
+        progress.stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    if first_error is not None:
+        raise first_error
+    return progress
+
+
+async def process_job_async(chaoxing, course, job, job_info, speed):
+    """process_job的协程版本"""
+    # 视频任务
+    if job["type"] == "video":
+        logger.trace(f"识别到视频任务, 任务章节: {course['title']} 任务ID: {job['jobid']}")
+        video_result = await chaoxing.study_video(
+            course, job, job_info, _speed=speed, _type="Video"
+        )
+        if chaoxing.StudyResult.is_failure(video_result):
+            logger.warning("当前任务非视频任务, 正在尝试音频任务解码")
+            video_result = await chaoxing.study_video(
+                course, job, job_info, _speed=speed, _type="Audio")
+        if chaoxing.StudyResult.is_failure(video_result):
+            logger.warning(
+                f"出现异常任务 -> 任务章节: {course['title']} 任务ID: {job['jobid']}, 已跳过"
+            )
+    # 文档任务
+    elif job["type"] == "document":
+        logger.trace(f"识别到文档任务, 任务章节: {course['title']} 任务ID: {job['jobid']}")
+        await chaoxing.study_document(course, job)
+    # 测验任务
+    elif job["type"] == "workid":
+        logger.trace(f"识别到章节检测任务, 任务章节: {course['title']}")
+        await chaoxing.study_work(course, job, job_info)
+    # 阅读任务
+    elif job["type"] == "read":
+        logger.trace(f"识别到阅读任务, 任务章节: {course['title']}")
+        await chaoxing.strdy_read(course, job, job_info)
+
+
+async def process_chapter_async(chaoxing, course, point, RB, notopen_action, speed, auto_skip_notopen=False):
+    """process_chapter的协程版本"""
+    logger.info(f'当前章节: {point["title"]}')
+    
+    if point["has_finished"]:
+        logger.info(f'章节：{point["title"]} 已完成所有任务点')
+        return 1, auto_skip_notopen  # 继续下一章节
+
+    # 随机等待，避免请求过快
+    sleep_duration = random.uniform(1, 3)
+    logger.debug(f"本次随机等待时间: {sleep_duration:.3f}s")
+    await asyncio.sleep(sleep_duration)
+
+    # 获取当前章节的所有任务点
+    jobs, job_info = await chaoxing.get_job_list(
+        course["clazzId"], course["courseId"], course["cpi"], point["id"]
+    )
+
+    # 发现未开放章节, 根据配置处理, ask模式需要等待用户输入, 在线程中执行
+    if job_info.get("notOpen", False):
+        return await asyncio.to_thread(
+            resolve_chapter_state, chaoxing, point, job_info, RB, notopen_action, auto_skip_notopen
+        )
+    resolve_chapter_state(chaoxing, point, job_info, RB, notopen_action, auto_skip_notopen)
+    # 遇到开放的章节，重置自动跳过状态
+    auto_skip_notopen = False
+    
+    chaoxing.rollback_times = RB.rollback_times
+    
+    # 可能存在章节无任何内容的情况
+    if not jobs:
+        if RB.rollback_times > 0:
+            logger.trace(f"回滚中 尝试空页面任务, 任务章节: {course['title']}")
+            await chaoxing.study_emptypage(course, point)
+        return 1, auto_skip_notopen  # 继续下一章节
+    
+    # 遍历所有任务点
+    for job in jobs:
+        await process_job_async(chaoxing, course, job, job_info, speed)
+    
+    return 1, auto_skip_notopen  # 继续下一章节
+
+
+async def process_course_async(chaoxing, course, notopen_action, speed, progress=None):
+    """process_course的协程版本, 课程内的章节严格按顺序学习"""
+    logger.info(f"开始学习课程: {course['title']}")
+    
+    point_list = await chaoxing.get_course_point(
+        course["courseId"], course["clazzId"], course["cpi"]
+    )
+
+    __point_index = 0
+    auto_skip_notopen = False
+    RB = RollBackManager()
+    # 每个课程是独立的协程任务, 回滚次数互不影响
+    chaoxing.rollback_times = 0
+    if progress:
+        progress.start(course, len(point_list["points"]))
+
     while __point_index < len(point_list["points"]):
+        if progress:
+            if progress.stop_event.is_set():
+                logger.info(f"课程 {course['title']} 已停止学习")
+                break
+            progress.advance(course, __point_index)
         point = point_list["points"][__point_index]
         logger.debug(f"当前章节 __point_index: {__point_index}")
-        
-        result, auto_skip_notopen = process_chapter(
+
+        result, auto_skip_notopen = await process_chapter_async(
             chaoxing, course, point, RB, notopen_action, speed, auto_skip_notopen
         )
-        
+
         if result == -1:  # 退出当前课程
             break
         elif result == 0:  # 重试前一章节
@@ -319,6 +625,54 @@ def process_course(chaoxing, course, notopen_action, speed):
             __point_index += 1
 
 
+async def run_courses_async(chaoxing, course_task, notopen_action, speed, course_workers=1):
+    """
+    run_courses的协程版本, 所有课程在同一个事件循环中学习, 同时学习的课程数不超过course_workers
+
+    某个课程出错不影响其他课程, 全部课程结束后再抛出第一个异常。
+    """
+    progress = CourseProgress(course_task)
+    course_workers = min(max(1, course_workers), len(course_task))
+    if course_workers > 1:
+        logger.info(f"同时学习的课程数量: {course_workers}")
+    semaphore = asyncio.Semaphore(course_workers)
+
+    async def run_course_async(course):
+        async with semaphore:
+            try:
+                await process_course_async(chaoxing, course, notopen_action, speed, progress)
+            except BaseException:
+                progress.finish(course, failed=True)
+                raise
+            progress.finish(course)
+
+    results = await asyncio.gather(
+        *(run_course_async(course) for course in course_task), return_exceptions=True
+    )
+
+    first_error = None
+    for course, result in zip(course_task, results):
+        if isinstance(result, Exception):
+            logger.error(f"课程 {course['title']} 学习出错: {type(result).__name__}: {result}")
+            if first_error is None:
+                first_error = result
+    if first_error is not None:
+        raise first_error
+    return progress
+
+
+async def run_async(chaoxing, course_list, notopen_action, speed, course_workers=1):
+    """async模式入口, 读取并过滤课程后学习所有课程, 异步客户端绑定在当前事件循环上, 结束时关闭"""
+    try:
+        all_course = await chaoxing.get_course_list()
+        # 未指定课程时需要等待用户输入
+        course_task = await asyncio.to_thread(filter_courses, all_course, course_list)
+        logger.info(f"课程列表过滤完毕, 当前课程任务数量: {len(course_task)}")
+        await run_courses_async(chaoxing, course_task, notopen_action, speed, course_workers)
+    finally:
+        await chaoxing.aclose()
+
+
 def filter_courses(all_course, course_list):
     """过滤要学习的课程"""
     if not course_list:
@@ -349,10 +703,19 @@ def filter_courses(all_course, course_list):
 
 def main():
     """主程序入口"""
+    chaoxing = None
     try:
         # 初始化配置
         common_config, tiku_config, notification_config = init_config()
         
+        # 设置页面解析后端
+        if common_config.get("parser_backend"):
+            set_parser_backend(common_config["parser_backend"])
+
+        # 设置加密字体解析结果的磁盘缓存目录
+        if common_config.get("font_cache_dir"):
+            font_map_cache.set_cache_dir(common_config["font_cache_dir"])
+
         # 规范化播放速度
         speed = min(2.0, max(1.0, common_config.get("speed", 1.0)))
         notopen_action = common_config.get("notopen_action", "retry")
@@ -371,16 +734,21 @@ def main():
         if not _login_state["status"]:
             raise LoginError(_login_state["msg"])
         
-        # 获取所有的课程列表
-        all_course = chaoxing.get_course_list()
-        
-        # 过滤要学习的课程
-        course_task = filter_courses(all_course, common_config.get("course_list"))
-        
-        # 开始学习
-        logger.info(f"课程列表过滤完毕, 当前课程任务数量: {len(course_task)}")
-        for course in course_task:
-            process_course(chaoxing, course, notopen_action, speed)
+        course_workers = int(common_config.get("course_workers", 1))
+        if isinstance(chaoxing, AsyncChaoxing):
+            asyncio.run(run_async(
+                chaoxing, common_config.get("course_list"), notopen_action, speed, course_workers
+            ))
+        else:
+            # 获取所有的课程列表
+            all_course = chaoxing.get_course_list()
+            
+            # 过滤要学习的课程
+            course_task = filter_courses(all_course, common_config.get("course_list"))
+            
+            # 开始学习
+            logger.info(f"课程列表过滤完毕, 当前课程任务数量: {len(course_task)}")
+            run_courses(chaoxing, course_task, notopen_action, speed, course_workers)
         
         logger.info("所有课程学习任务已完成")
         notification.send("chaoxing : 所有课程学习任务已完成")
@@ -399,6 +767,12 @@ def main():
         except Exception:
             pass  # 如果通知发送失败，忽略异常
         raise e
+    finally:
+        # 关闭题库与超星会话持有的连接
+        if chaoxing is not None:
+            if chaoxing.tiku:
+                chaoxing.tiku.close()
+            chaoxing.close()
 
 
 if __name__ == "__main__":
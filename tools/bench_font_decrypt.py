@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+加密字体解密性能对比: 逐字符查表 (旧实现) 与按字体构建一次转换表后translate
+
+用法: python tools/bench_font_decrypt.py [题目数] [重复次数]
+
+测试数据模拟一份章节检测页面: 从字体映射表中随机抽取字形构造加密字体,
+每道题包含约60字的题干与4个约15字的选项。
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.cxsecret_font as cxfont  # noqa: E402
+
+
+def legacy_decrypt(dst_fontmap, encrypted_text):
+    """旧版逐字符解密实现, 仅用于对比"""
+    fonthash_dao = cxfont.get_fonthash_dao()
+    result = []
+    for char in encrypted_text:
+        char_code = f"uni{ord(char):X}"
+        if char_code in dst_fontmap:
+            original_char_code = fonthash_dao.find_char(dst_fontmap[char_code])
+            if original_char_code:
+                try:
+                    result.append(chr(int(original_char_code[3:], 16)))
+                    continue
+                except (ValueError, IndexError):
+                    pass
+        result.append(char)
+    return "".join(result).translate(cxfont.KX_RADICALS_TAB)
+
+
+def build_quiz(num_questions, glyphs=600, seed=0):
+    """构造加密字体映射表与题目文本"""
+    rng = random.Random(seed)
+    with open(cxfont.resource_path("resource/font_map_table.json"), "r", encoding="utf-8") as fp:
+        char_map = json.load(fp)
+    candidates = [(name, h) for name, h in char_map.items() if name.startswith("uni4") or name.startswith("uni5")]
+    picked = rng.sample(candidates, glyphs)
+
+    # 加密字体把常用汉字的码位映射到其他汉字的字形上
+    encrypted_codes = [name for name, _ in picked]
+    shuffled = [h for _, h in picked]
+    rng.shuffle(shuffled)
+    dst_fontmap = dict(zip(encrypted_codes, shuffled))
+
+    alphabet = [chr(int(name[3:], 16)) for name in encrypted_codes] + list("，。（）ABCD 12")
+
+    def text(n):
+        return "".join(rng.choice(alphabet) for _ in range(n))
+
+    texts = []
+    for _ in range(num_questions):
+        texts.append(text(60))
+        texts.extend(text(15) for _ in range(4))
+    return dst_fontmap, texts
+
+
+def main():
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    dst_fontmap, texts = build_quiz(num_questions)
+    cxfont.get_fonthash_dao()
+
+    def run_legacy():
+        return [legacy_decrypt(dst_fontmap, t) for t in texts]
+
+    def run_table():
+        table = cxfont.build_translate_table(dst_fontmap)
+        return [t.translate(table) for t in texts]
+
+    assert run_legacy() == run_table(), "两种实现的解密结果不一致"
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=repeat))
+    table = min(timeit.repeat(run_table, number=1, repeat=repeat))
+    print(f"题目数: {num_questions}, 文本段数: {len(texts)}, 字符数: {sum(map(len, texts))}")
+    print(f"逐字符查表: {legacy * 1000:.2f} ms/页")
+    print(f"转换表(含构建): {table * 1000:.2f} ms/页")
+    print(f"加速比: {legacy / table:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
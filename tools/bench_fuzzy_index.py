@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+相似题目索引性能测试: 建立索引与查询耗时、近似重复题目的命中率
+
+用法: python tools/bench_fuzzy_index.py [索引条目数] [查询次数] [索引文件]
+
+测试数据为随机汉字组成的约30字题干, 查询的题目从已索引的题目中抽取, 替换其中一个字(模拟错别字)
+或交换前后两个分句, 另外查询同样数量的全新题目以统计误命中。
+指定已存在的索引文件时跳过建立索引, 可用于反复测试大规模索引的查询耗时。
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.fuzzy_index import DEFAULT_THRESHOLD, FuzzyIndex  # noqa: E402
+from api.question_key import make_cache_key  # noqa: E402
+
+CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+OPTIONS = "A. 选项一\nB. 选项二\nC. 选项三\nD. 选项四"
+
+
+def random_title(rng):
+    return "".join(rng.choices(CHARS, k=14)) + "，" + "".join(rng.choices(CHARS, k=14)) + "（ ）"
+
+
+def make_typo(rng, title):
+    i = rng.randrange(len(title) - 4)
+    return title[:i] + rng.choice(CHARS) + title[i + 1:]
+
+
+def swap_clauses(title):
+    first, rest = title.split("，", 1)
+    return rest[:-3] + "，" + first + "（ ）"
+
+
+def main():
+    num_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    path = sys.argv[3] if len(sys.argv) > 3 else os.path.join(tempfile.mkdtemp(), "fuzzy.db")
+    rng = random.Random(0)
+    titles = [random_title(rng) for _ in range(num_entries)]
+
+    index = FuzzyIndex(path, threshold=DEFAULT_THRESHOLD)
+    if not len(index):
+        start = time.perf_counter()
+        batch = 5000
+        for i in range(0, num_entries, batch):
+            index.add_many(make_cache_key(t, "single", OPTIONS) for t in titles[i:i + batch])
+        print(f"建立索引: {num_entries} 条, 耗时 {time.perf_counter() - start:.1f}s")
+    print(f"索引条目数: {len(index)}, 文件大小: {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+
+    samples = rng.sample(titles[:len(index)], num_queries)
+    for label, queries in (
+        ("错别字", [make_typo(rng, t) for t in samples]),
+        ("分句换序", [swap_clauses(t) for t in samples]),
+        ("全新题目", [random_title(rng) for _ in range(num_queries)]),
+    ):
+        latencies = []
+        hits = 0
+        for title in queries:
+            start = time.perf_counter()
+            match = index.lookup(make_cache_key(title, "single", OPTIONS))
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += match is not None
+        p99 = sorted(latencies)[int(len(latencies) * 0.99) - 1]
+        print(f"{label}: 命中率 {hits / num_queries:.1%}, 平均 {statistics.mean(latencies):.2f}ms, "
+              f"P99 {p99:.2f}ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
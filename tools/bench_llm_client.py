@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+大模型题库请求性能对比: 每题新建客户端 (旧实现) 与复用题库实例持有的连接池客户端
+
+用法: python tools/bench_llm_client.py [题目数] [握手延迟毫秒]
+
+在本地启动一个兼容openai格式的模拟接口, 分别以AI与硅基流动题库逐题查询, 输出每题平均耗时。
+模拟接口在每个新连接建立时等待握手延迟, 用于近似公网接口的TCP与TLS握手耗时,
+复用连接时只有第一题需要等待。
+"""
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import requests
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.answer import AI, SiliconFlow  # noqa: E402
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟chat/completions接口, 所有题目都回答同一个选项"""
+
+    protocol_version = "HTTP/1.1"
+    handshake_delay = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        # 响应头与响应体分两次写出, 关闭Nagle算法避免复用连接时等待延迟确认
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        MockHandler.connections += 1
+        time.sleep(self.handshake_delay)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        content = json.dumps({"Answer": ["选项甲"]}, ensure_ascii=False)
+        body = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(handshake_delay):
+    MockHandler.handshake_delay = handshake_delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_tiku(cls, endpoint):
+    tiku = cls()
+    tiku.config_set({
+        "submit": "false", "cover_rate": "0.9", "true_list": "正确", "false_list": "错误",
+        "delay": "0", "min_interval_seconds": "0", "cache_backend": "json",
+        "endpoint": endpoint, "key": "bench", "model": "bench", "http_proxy": "",
+        "siliconflow_endpoint": f"{endpoint}/chat/completions",
+        "siliconflow_key": "bench", "siliconflow_model": "bench",
+    })
+    tiku.init_tiku()
+    return tiku
+
+
+class LegacyAI(AI):
+    """旧版实现: 每道题新建httpx与OpenAI客户端"""
+
+    def _query(self, q_info):
+        self._client = OpenAI(http_client=httpx.Client(), base_url=self.endpoint, api_key=self.key)
+        try:
+            return super()._query(q_info)
+        finally:
+            self._client.close()
+
+
+class LegacySiliconFlow(SiliconFlow):
+    """旧版实现: 每道题直接调用requests.post, 不复用连接"""
+
+    def _query(self, q_info):
+        self._session = requests
+        return super()._query(q_info)
+
+
+def run(tiku, questions):
+    """逐题查询(不经过缓存), 返回每题耗时(毫秒)"""
+    MockHandler.connections = 0
+    latencies = []
+    for q_info in questions:
+        start = time.perf_counter()
+        assert tiku._query(dict(q_info)) == "选项甲"
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    server = start_server(handshake_ms / 1000)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    questions = [
+        {"title": f"第{i}题", "type": "single", "options": "选项甲\n选项乙\n选项丙\n选项丁"}
+        for i in range(num_questions)
+    ]
+
+    print(f"题目数: {num_questions}, 模拟握手延迟: {handshake_ms:.0f}ms")
+    print(f"{'实现':<24}{'平均(ms)':>10}{'中位数(ms)':>12}{'P95(ms)':>10}{'新建连接':>10}")
+    for label, cls in (
+        ("AI 每题新建客户端", LegacyAI),
+        ("AI 复用客户端", AI),
+        ("硅基流动 requests.post", LegacySiliconFlow),
+        ("硅基流动 复用Session", SiliconFlow),
+    ):
+        tiku = make_tiku(cls, endpoint)
+        latencies = run(tiku, questions)
+        connections = MockHandler.connections
+        if not isinstance(tiku, (LegacyAI, LegacySiliconFlow)):
+            tiku.close()
+        p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+        print(f"{label:<20}{statistics.mean(latencies):>12.2f}{statistics.median(latencies):>12.2f}"
+              f"{p95:>10.2f}{connections:>10}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
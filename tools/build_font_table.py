@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+由字体映射表JSON重新生成二进制映射表
+
+用法: python tools/build_font_table.py [JSON路径] [输出路径]
+默认读取 resource/font_map_table.json, 输出到 resource/font_map_table.bin
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.cxsecret_font import FontHashDAO, build_font_table  # noqa: E402
+
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "resource/font_map_table.json"
+    bin_path = sys.argv[2] if len(sys.argv) > 2 else "resource/font_map_table.bin"
+
+    data = build_font_table(json_path)
+    with open(bin_path, "wb") as fp:
+        fp.write(data)
+
+    count = (len(data) - FontHashDAO.HEADER.size) // FontHashDAO.RECORD.size
+    print(f"已生成 {bin_path}: {count} 条记录, {len(data)} 字节")
+
+
+if __name__ == "__main__":
+    main()
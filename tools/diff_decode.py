@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+对比BeautifulSoup与lxml两种解析后端的输出, 并统计解析耗时
+
+用法: python tools/diff_decode.py [页面目录] [--update]
+
+不指定目录时使用 tools/fixtures/decode 中已脱敏的页面。目录中保存从学习通下载的原始页面,
+按文件名前缀选择解析函数:
+    course_list*.html    -> decode_course_list
+    course_folder*.html  -> decode_course_folder
+    course_point*.html   -> decode_course_point
+    questions*.html      -> decode_questions_info
+页面旁存在同名的 .json 文件时, 两种后端的输出还需与其中保存的预期结果一致。
+--update 以BeautifulSoup后端的输出重新生成预期结果。
+任意页面两种后端输出不一致或与预期结果不一致时以非0状态码退出。
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.decode as decode  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "decode"
+
+DECODERS = {
+    "course_list": decode.decode_course_list,
+    "course_folder": decode.decode_course_folder,
+    "course_point": decode.decode_course_point,
+    "questions": decode.decode_questions_info,
+}
+
+
+def run(func, html_text, backend):
+    decode.set_parser_backend(backend)
+    start = time.perf_counter()
+    try:
+        result = func(html_text)
+    except Exception as e:
+        result = f"{type(e).__name__}: {e}"
+    return result, time.perf_counter() - start
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--update"]
+    update = len(args) < len(sys.argv) - 1
+    if args and args[0] in ("-h", "--help"):
+        print(__doc__)
+        sys.exit(2)
+    page_dir = Path(args[0]) if args else FIXTURE_DIR
+    if not page_dir.is_dir():
+        print(f"页面目录不存在: {page_dir}")
+        sys.exit(2)
+
+    mismatches = 0
+    elapsed = {"bs4": 0.0, "lxml": 0.0}
+    for path in sorted(page_dir.glob("*.htm*")):
+        prefix = next((p for p in DECODERS if path.name.startswith(p)), None)
+        if prefix is None:
+            continue
+        html_text = path.read_text(encoding="utf-8")
+        expected, t_bs4 = run(DECODERS[prefix], html_text, "bs4")
+        actual, t_lxml = run(DECODERS[prefix], html_text, "lxml")
+        elapsed["bs4"] += t_bs4
+        elapsed["lxml"] += t_lxml
+        if expected != actual:
+            mismatches += 1
+            print(f"[不一致] {path.name}\n  bs4:  {expected}\n  lxml: {actual}")
+            continue
+
+        golden_path = path.with_suffix(".json")
+        if update:
+            golden_path.write_text(json.dumps(expected, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        elif golden_path.exists():
+            golden = json.loads(golden_path.read_text(encoding="utf-8"))
+            if golden != expected:
+                mismatches += 1
+                print(f"[与预期不一致] {path.name}\n  预期: {golden}\n  实际: {expected}")
+                continue
+        print(f"[一致] {path.name}  bs4 {t_bs4 * 1000:.1f}ms  lxml {t_lxml * 1000:.1f}ms")
+
+    print(f"总耗时 bs4 {elapsed['bs4'] * 1000:.1f}ms, lxml {elapsed['lxml'] * 1000:.1f}ms, 不一致 {mismatches} 个")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()